@@ -1,4 +1,10 @@
+import logging
+from typing import Dict
+from app.core.config import settings
 from app.core.llm import llm_client
+from app.services.context_packer import pack_context
+
+logger = logging.getLogger("uvicorn")
 
 class AnalyzerAgent:
     """
@@ -21,10 +27,34 @@ class AnalyzerAgent:
     Task: Write a comprehensive, detailed answer (200-300 words) that thoroughly addresses the question. Use simple language that anyone can understand.
     """
 
+    def __init__(self):
+        # Context packing totals, across calls
+        self.calls = 0
+        self.tokens_before = 0
+        self.tokens_saved = 0
+        self.tokens_truncated = 0
+
     async def analyze(self, sub_question: str, context_chunks: list[str]) -> str:
         """
         Synthesizes an answer from the retrieved chunks.
         """
+        if settings.CONTEXT_PACKING_ENABLED and context_chunks:
+            # Overlapping/duplicate chunks merged, trimmed to the token budget
+            context_chunks, packing = pack_context(
+                context_chunks,
+                max_tokens=settings.CONTEXT_TOKEN_BUDGET,
+                min_overlap=settings.CONTEXT_MIN_OVERLAP
+            )
+            self.calls += 1
+            self.tokens_before += packing["tokens_before"]
+            self.tokens_saved += packing["tokens_saved"]
+            self.tokens_truncated += packing["tokens_truncated"]
+            logger.info(
+                f"Context packed: {packing['chunks']} chunks -> {packing['blocks']} blocks, "
+                f"~{packing['tokens_saved']} of {packing['tokens_before']} prompt tokens deduplicated, "
+                f"~{packing['tokens_truncated']} cut by the budget"
+            )
+
         context_str = "\n\n".join([f"[Chunk {i+1}]: {chunk}" for i, chunk in enumerate(context_chunks)])
         
         user_prompt = f"""
@@ -52,5 +82,16 @@ class AnalyzerAgent:
         
         return response.strip()
 
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "context_tokens_before": self.tokens_before,
+            # Redundancy removed without losing content
+            "context_tokens_saved": self.tokens_saved,
+            "saved_ratio": round(self.tokens_saved / self.tokens_before, 3) if self.tokens_before else 0.0,
+            # Content dropped to fit CONTEXT_TOKEN_BUDGET
+            "context_tokens_truncated": self.tokens_truncated,
+        }
+
 # Singleton
 analyzer = AnalyzerAgent()
@@ -1,6 +1,8 @@
 import logging
 import asyncio
-from typing import Callable, Awaitable
+from typing import Callable, Awaitable, List, Optional
+from app.core.config import settings
+from app.core.rate_limit import RateLimiter
 from app.agents.planner import planner
 from app.agents.researcher import researcher
 from app.agents.analyzer import analyzer
@@ -8,13 +10,17 @@ from app.agents.writer import writer
 
 logger = logging.getLogger("uvicorn")
 
+# Shared by every workflow so parallel sub-questions don't burst the provider
+subquestion_limiter = RateLimiter(settings.SUBQUESTION_MIN_INTERVAL)
+
 class Orchestrator:
     """
     The conductor of the agent workflow.
     Manages the state and transition between agents.
     """
     
-    async def run_workflow(self, task_id: str, topic: str, log_callback: Callable[[str, str, str], Awaitable[None]]):
+    async def run_workflow(self, task_id: str, topic: str, log_callback: Callable[[str, str, str], Awaitable[None]],
+                           report_callback: Optional[Callable[[str, str], Awaitable[None]]] = None):
         """
         Executes the full research workflow.
         
@@ -22,6 +28,8 @@ class Orchestrator:
             task_id: Unique ID for the job.
             topic: The user's query.
             log_callback: Async function to send logs back to the user (task_id, status, details).
+            report_callback: Optional async function (task_id, html_delta) that receives
+                the report as it is written. Enables streaming in the writer.
         """
         try:
             # 1. PLANNING
@@ -29,27 +37,22 @@ class Orchestrator:
             plan = await planner.plan(topic)
             await log_callback(task_id, "Planning", f"Plan created with {len(plan)} steps.", "planning")
             
-            insights = []
+            # 2. RETRIEVAL for the whole plan in one batched round-trip
+            retrieved = None
+            if settings.RESEARCH_PREFETCH:
+                await log_callback(task_id, "Exec: Research", f"Searching documents for all {len(plan)} sub-questions...", "researching")
+                retrieved = await researcher.research_many(plan)
             
-            # 2. EXECUTION LOOP
-            for i, sub_question in enumerate(plan):
-                step_log = f"Step {i+1}/{len(plan)}: {sub_question}"
-                await log_callback(task_id, "Exec: Research", f"Searching documents for: {sub_question}", "researching")
-                
-                # A. Research (RAG)
-                chunks = await researcher.research(sub_question)
-                
-                # B. Analyze (LLM)
-                await log_callback(task_id, "Exec: Analyze", f"Synthesizing findings for: {sub_question}", "analyzing")
-                insight = await analyzer.analyze(sub_question, chunks)
-                insights.append(insight)
-                
-                # Small delay to prevent rate limits and give "vibe"
-                await asyncio.sleep(0.5)
-
-            # 3. WRITING
+            # 3. EXECUTION (bounded fan-out, results kept in plan order)
+            insights = await self._execute_plan(task_id, plan, log_callback, retrieved)
+
+            # 4. WRITING
             await log_callback(task_id, "Writing", "Compiling final report...", "writing")
-            final_report_html = await writer.write_report(topic, insights)
+            on_delta = None
+            if report_callback is not None:
+                async def on_delta(delta: str):
+                    await report_callback(task_id, delta)
+            final_report_html = await writer.write_report(topic, insights, on_delta=on_delta)
             
             return final_report_html
 
@@ -58,5 +61,43 @@ class Orchestrator:
             await log_callback(task_id, "Error", f"Workflow aborted: {str(e)}", "error")
             raise e
 
+    async def _execute_plan(self, task_id: str, plan: List[str], log_callback,
+                            retrieved: Optional[List[List[str]]] = None) -> List[str]:
+        """
+        Runs research + analysis for every sub-question with at most
+        RESEARCH_CONCURRENCY in flight. Insights are returned in plan order.
+        `retrieved` holds prefetched chunks per sub-question, if any.
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.RESEARCH_CONCURRENCY))
+
+        async def bounded(i: int, sub_question: str) -> str:
+            async with semaphore:
+                chunks = retrieved[i] if retrieved is not None else None
+                return await self._process_sub_question(task_id, i, len(plan), sub_question, log_callback, chunks)
+
+        tasks = [asyncio.create_task(bounded(i, q)) for i, q in enumerate(plan)]
+        try:
+            return await asyncio.gather(*tasks)
+        except Exception:
+            # Don't leave sibling sub-questions running after one fails
+            for t in tasks:
+                t.cancel()
+            raise
+
+    async def _process_sub_question(self, task_id: str, i: int, total: int, sub_question: str, log_callback,
+                                    chunks: Optional[List[str]] = None) -> str:
+        await subquestion_limiter.acquire()
+
+        step = f"Step {i+1}/{total}"
+
+        # A. Research (RAG), unless prefetched for the whole plan
+        if chunks is None:
+            await log_callback(task_id, "Exec: Research", f"{step}: Searching documents for: {sub_question}", "researching")
+            chunks = await researcher.research(sub_question)
+
+        # B. Analyze (LLM)
+        await log_callback(task_id, "Exec: Analyze", f"{step}: Synthesizing findings for: {sub_question}", "analyzing")
+        return await analyzer.analyze(sub_question, chunks)
+
 # Singleton
 orchestrator = Orchestrator()
@@ -6,6 +6,8 @@ class ResearchAgent:
     Agent responsible for gathering information using the RAG Service.
     Unlike other agents, this relies more on deterministic retrieval tools than LLM reasoning.
     """
+
+    NO_RESULTS = "No specific internal documents found for this sub-question."
     
     async def research(self, sub_question: str) -> List[str]:
         """
@@ -15,9 +17,17 @@ class ResearchAgent:
         chunks = await rag_service.search(query=sub_question, k=5)
         
         if not chunks:
-            return ["No specific internal documents found for this sub-question."]
+            return [self.NO_RESULTS]
             
         return chunks
 
+    async def research_many(self, sub_questions: List[str]) -> List[List[str]]:
+        """
+        Retrieves context for a whole plan in one batched round-trip.
+        Returns one chunk list per sub-question, in order.
+        """
+        results = await rag_service.search_many(queries=sub_questions, k=5)
+        return [chunks or [self.NO_RESULTS] for chunks in results]
+
 # Singleton
 researcher = ResearchAgent()
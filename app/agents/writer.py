@@ -1,5 +1,45 @@
-from typing import List
-from app.core.llm import llm_client
+import logging
+from typing import Awaitable, Callable, List, Optional
+from app.core.llm import StreamInterruptedError, llm_client
+
+logger = logging.getLogger("uvicorn")
+
+
+class FenceStripper:
+    """
+    Incremental version of the writer's markdown-fence cleanup.
+    Removes ```html and ``` from a stream of deltas, holding back any tail
+    that could be the start of a fence split across two deltas.
+    """
+
+    OPEN_FENCE = "```html"
+
+    def __init__(self):
+        self._pending = ""
+        self._started = False
+
+    def feed(self, delta: str) -> str:
+        text = self._pending + delta
+        hold = 0
+        for n in range(len(self.OPEN_FENCE) - 1, 0, -1):
+            if text.endswith(self.OPEN_FENCE[:n]):
+                hold = n
+                break
+        self._pending = text[len(text) - hold:] if hold else ""
+        return self._clean(text[:len(text) - hold])
+
+    def flush(self) -> str:
+        text, self._pending = self._pending, ""
+        return self._clean(text)
+
+    def _clean(self, text: str) -> str:
+        text = text.replace("```html", "").replace("```", "")
+        if not self._started:
+            # Same as the leading half of .strip() on the full response
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
 
 class WriterAgent:
     """
@@ -41,9 +81,12 @@ class WriterAgent:
     The output should be the raw HTML body content (no <html> or <body> tags needed, just the content).
     """
 
-    async def write_report(self, topic: str, insights: List[str]) -> str:
+    async def write_report(self, topic: str, insights: List[str],
+                           on_delta: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
         """
         Generates the final HTML report.
+        If `on_delta` is given, the report is streamed and each cleaned
+        piece of partial HTML is forwarded to it as it arrives.
         """
         insights_str = "\n\n".join([f"Research Finding {i+1}:\n{insight}\n" for i, insight in enumerate(insights)])
         
@@ -72,6 +115,31 @@ class WriterAgent:
         Write the complete, detailed HTML report now:
         """
         
+        if on_delta is not None:
+            stripper = FenceStripper()
+            parts = []
+            try:
+                async for delta in llm_client.stream_text(self.SYSTEM_PROMPT, user_prompt):
+                    clean = stripper.feed(delta)
+                    if clean:
+                        parts.append(clean)
+                        await on_delta(clean)
+            except StreamInterruptedError as e:
+                # Never store a truncated report: regenerate it whole (the result replaces the draft)
+                logger.warning(f"Report stream interrupted, regenerating without streaming: {e}")
+                response = await llm_client.generate_text(
+                    system_prompt=self.SYSTEM_PROMPT,
+                    user_prompt=user_prompt
+                )
+                if response.startswith("Error"):
+                    raise RuntimeError(response) from e
+                return response.replace("```html", "").replace("```", "").strip()
+            tail = stripper.flush()
+            if tail:
+                parts.append(tail)
+                await on_delta(tail)
+            return "".join(parts).strip()
+        
         response = await llm_client.generate_text(
             system_prompt=self.SYSTEM_PROMPT,
             user_prompt=user_prompt
@@ -12,7 +12,8 @@ class StreamLog(BaseModel):
     task_id: str
     status: str
     details: Optional[str] = None
-    step: str # "planning", "researching", "writing"
+    step: str # "queued", "planning", "researching", "writing"
+    queue_position: Optional[int] = None  # Set while waiting for a free worker
 
 class FinalReportRepsonse(BaseModel):
     task_id: str
@@ -1,72 +1,248 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, HTTPException, UploadFile, File, Form, Header, Query, Request
+from fastapi.responses import StreamingResponse
 from app.api.models import (
     ResearchRequest, ResearchResponse, StreamLog, FinalReportRepsonse,
     DocumentUploadResponse, DocumentQnARequest, DocumentQnAResponse
 )
+from app.core.config import settings
+from app.core.rate_limit import PRIORITY_INTERACTIVE, embedding_limiter, generation_limiter, request_priority
+from app.api.streaming import LogNotifier, format_sse, parse_last_event_id
+from app.api.task_store import task_store
+from app.api.scheduler import QueueFullError, WorkflowScheduler
+from app.api.topic_registry import TopicRegistry
+import asyncio
+import logging
 import uuid
-from typing import Dict, List, Optional
+from typing import List, Optional
+
+logger = logging.getLogger("uvicorn")
 
 router = APIRouter()
 
-# In-memory store for task status (replace with proper DB/Redis in prod)
-# task_id -> List[StreamLog]
-task_logs: Dict[str, List[StreamLog]] = {}
-# task_id -> FinalReportRepsonse
-task_results: Dict[str, FinalReportRepsonse] = {}
+# Task logs, report drafts and results live in task_store (memory, SQLite or
+# Redis, see TASK_STORE), so any worker can serve /stream and /result.
+
+# Wakes SSE watchers in this process as soon as a task logs something;
+# watchers in other workers pick the change up on their next poll
+log_notifier = LogNotifier()
+TERMINAL_STATUSES = {"Completed", "Error"}
+
+# Duplicate topics attach to the running (or recently finished) task
+topic_registry = TopicRegistry(freshness_seconds=settings.RESEARCH_REUSE_SECONDS)
+
+# Bounded workers + bounded queue: overload becomes queueing delay, then 429
+scheduler = WorkflowScheduler(
+    max_concurrent=settings.WORKFLOW_CONCURRENCY,
+    max_queue=settings.WORKFLOW_QUEUE_SIZE,
+    default_retry_after=settings.WORKFLOW_RETRY_AFTER,
+    start_timeout=settings.WORKFLOW_START_TIMEOUT
+)
 
 from app.agents.orchestrator import orchestrator
+from app.agents.analyzer import analyzer
 from app.services.document_manager import document_manager
 from app.core.llm import llm_client
+from app.core.llm_router import LLMRouter
+from app.services.embeddings import embedding_service
 
 async def run_agent_workflow(task_id: str, topic: str):
     """
-    Wrapper to run the orchestrator and handle result storage.
+    Wrapper to run the orchestrator (once the scheduler gives it a slot)
+    and handle result storage.
     """
-    async def log_callback(t_id, status, details, step):
-        task_logs[t_id].append(StreamLog(task_id=t_id, status=status, details=details, step=step))
+    async def log_callback(t_id, status, details, step, queue_position=None):
+        log = StreamLog(task_id=t_id, status=status, details=details, step=step, queue_position=queue_position)
+        await task_store.append_log(t_id, log.model_dump())
+        log_notifier.notify(t_id)
     
-    try:
+    async def report_callback(t_id, delta):
+        await task_store.append_draft(t_id, delta)
+        log_notifier.notify(t_id)
+    
+    async def on_position(position):
+        await log_callback(task_id, "Queued", f"Waiting for a free worker: position {position} in queue.", "queued",
+                           queue_position=position)
+    
+    success = False
+    
+    async def execute():
+        nonlocal success
         # Initial Log
         await log_callback(task_id, "Started", f"Researching: {topic}", "planning")
         
         # Run the Brain
-        report_html = await orchestrator.run_workflow(task_id, topic, log_callback)
+        report_html = await orchestrator.run_workflow(
+            task_id, topic, log_callback,
+            report_callback=report_callback if settings.WRITER_STREAMING else None
+        )
         
         # Store Result
-        task_results[task_id] = FinalReportRepsonse(
+        result = FinalReportRepsonse(
             task_id=task_id,
             topic=topic,
             content_html=report_html
         )
+        await task_store.set_result(task_id, result.model_dump())
+        await task_store.clear_drafts(task_id)
         
         # Final Log
         await log_callback(task_id, "Completed", "Report ready.", "completed")
-        
+        success = True
+    
+    try:
+        await scheduler.run(task_id, execute, on_position)
+    except Exception as e:
+        # Error logging handled inside orchestrator; a partial report draft must not linger
+        await task_store.clear_drafts(task_id)
+    finally:
+        topic_registry.finish(topic, task_id, success)
+
+# Close-out logs for workflows dropped before they started (kept referenced until written)
+_cancel_logs = set()
+
+def _workflow_cancelled(topic: str):
+    """
+    Scheduler on_cancel callback: run_agent_workflow never ran for the task,
+    so release its topic and give it a terminal log for pollers and SSE.
+    """
+    def on_cancel(task_id: str):
+        topic_registry.finish(topic, task_id, success=False)
+        task = asyncio.create_task(_log_cancelled(task_id))
+        _cancel_logs.add(task)
+        task.add_done_callback(_cancel_logs.discard)
+    return on_cancel
+
+async def _log_cancelled(task_id: str):
+    log = StreamLog(task_id=task_id, status="Error", details="Research could not be started. Please try again.",
+                    step="error")
+    try:
+        await task_store.append_log(task_id, log.model_dump())
+        log_notifier.notify(task_id)
     except Exception as e:
-        # Error logging handled inside orchestrator, but we ensure status is updated here too
-        pass
+        logger.error(f"Could not record cancellation of task {task_id}: {e}")
 
 @router.post("/research", response_model=ResearchResponse)
 async def start_research(request: ResearchRequest, background_tasks: BackgroundTasks):
+    if settings.RESEARCH_DEDUP_ENABLED:
+        existing_id, state = topic_registry.lookup(request.topic)
+        if state == "running" and await task_store.exists(existing_id):
+            topic_registry.coalesced += 1
+            return ResearchResponse(task_id=existing_id, message="Joined research already in progress for this topic.")
+        if state == "completed":
+            if await task_store.has_result(existing_id):
+                topic_registry.reused += 1
+                return ResearchResponse(task_id=existing_id, message="A recent report for this topic is ready.")
+            topic_registry.forget(request.topic)
+
     task_id = str(uuid.uuid4())
-    task_logs[task_id] = []
+    try:
+        position = scheduler.admit(task_id, on_cancel=_workflow_cancelled(request.topic))
+    except QueueFullError:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many research tasks are queued. Please try again later.",
+            headers={"Retry-After": str(scheduler.retry_after())}
+        )
+    try:
+        await task_store.create(task_id)
+    except Exception:
+        # The workflow will never run, so its slot must not stay reserved
+        scheduler.cancel(task_id)
+        raise
+    topic_registry.start(request.topic, task_id)
     
-    # Start the real agent in the background
+    # Start the real agent in the background; it waits for its scheduler slot
     background_tasks.add_task(run_agent_workflow, task_id, request.topic)
     
+    if position:
+        return ResearchResponse(task_id=task_id, message=f"Research queued (position {position}).")
     return ResearchResponse(task_id=task_id, message="Research started successfully.")
 
 @router.get("/stream/{task_id}", response_model=List[StreamLog])
-async def get_stream(task_id: str):
-    if task_id not in task_logs:
+async def get_stream(task_id: str, since: int = Query(0, ge=0)):
+    """
+    Polling endpoint. `since` is the number of logs the client already has;
+    only newer entries are returned.
+    """
+    logs = await task_store.get_logs(task_id, since)
+    if logs is None:
         return [] # Or 404, but empty list is safer for polling
-    return task_logs[task_id]
+    return logs
+
+@router.get("/stream/{task_id}/events")
+async def stream_events(
+    task_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    since: Optional[int] = Query(None, ge=0)
+):
+    """
+    Server-Sent Events: pushes each StreamLog as it is emitted.
+    Event ids are log indexes, so a reconnecting EventSource resumes from
+    Last-Event-ID automatically (`since` does the same for other clients).
+    While the report is being written, `report` events carry HTML deltas;
+    the first one on each connection has "replace": true and the whole
+    draft so far. The stream ends after a Completed/Error log, or when
+    the task is evicted. Unknown tasks get a 404.
+    """
+    if not await task_store.exists(task_id):
+        raise HTTPException(status_code=404, detail="Task not found")
+    cursor = since if since is not None else parse_last_event_id(last_event_id)
+
+    async def event_generator():
+        nonlocal cursor
+        idle = 0.0
+        draft_cursor = 0
+        last_status = None
+        while True:
+            # Re-read the log before the cursor too, to know the latest status when resuming
+            start = max(cursor - 1, 0)
+            logs = await task_store.get_logs(task_id, start)
+            if logs is None:
+                # Evicted (or expired) while streaming: nothing more will arrive here
+                yield format_sse({"task_id": task_id}, event="end")
+                return
+            for i, log in enumerate(logs, start=start):
+                if i >= cursor:
+                    yield format_sse(log, event_id=i, event="log")
+                last_status = log["status"]
+            cursor = max(cursor, start + len(logs))
+
+            drafts = await task_store.get_drafts(task_id, draft_cursor)
+            if drafts:
+                yield format_sse(
+                    {"delta": "".join(drafts), "replace": draft_cursor == 0},
+                    event="report"
+                )
+                draft_cursor += len(drafts)
+
+            if last_status in TERMINAL_STATUSES:
+                yield format_sse({"task_id": task_id}, event="end")
+                return
+            if await request.is_disconnected():
+                return
+
+            if await log_notifier.wait(task_id, settings.SSE_POLL_INTERVAL):
+                idle = 0.0
+            else:
+                idle += settings.SSE_POLL_INTERVAL
+                if idle >= settings.SSE_KEEPALIVE_SECONDS:
+                    # Comment line: keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    idle = 0.0
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/result/{task_id}", response_model=FinalReportRepsonse)
 async def get_result(task_id: str):
-    if task_id not in task_results:
+    result = await task_store.get_result(task_id)
+    if result is None:
         raise HTTPException(status_code=404, detail="Result not ready or task not found")
-    return task_results[task_id]
+    return result
 
 # Document Upload Endpoints
 @router.post("/documents/upload", response_model=DocumentUploadResponse)
@@ -81,8 +257,10 @@ async def upload_documents(
         raise HTTPException(status_code=400, detail="No files provided")
     
     try:
-        session_id, uploaded_files = await document_manager.upload_documents(files, session_id)
-        session_info = document_manager.get_session_info(session_id)
+        # A user is waiting on this, so its embedding calls go ahead of background research
+        with request_priority(PRIORITY_INTERACTIVE):
+            session_id, uploaded_files = await document_manager.upload_documents(files, session_id)
+        session_info = await document_manager.get_session_info(session_id)
         
         return DocumentUploadResponse(
             session_id=session_id,
@@ -98,12 +276,16 @@ async def ask_question(request: DocumentQnARequest):
     """
     Ask a question about uploaded documents using RAG.
     """
-    if not request.session_id or request.session_id not in document_manager.sessions:
+    session = await document_manager.get_session(request.session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found. Please upload documents first.")
     
     try:
-        # Search documents
-        chunks, sources = await document_manager.search_documents(request.session_id, request.question, k=5)
+        # Search documents (interactive: provider calls go ahead of background research)
+        with request_priority(PRIORITY_INTERACTIVE):
+            chunks, sources = await document_manager.search_documents(
+                request.session_id, request.question, k=5, session=session
+            )
         
         if not chunks:
             return DocumentQnAResponse(
@@ -126,10 +308,11 @@ Document Excerpts:
 
 Answer the question based on the document excerpts above:"""
         
-        answer = await llm_client.generate_text(
-            system_prompt=system_prompt,
-            user_prompt=user_prompt
-        )
+        with request_priority(PRIORITY_INTERACTIVE):
+            answer = await llm_client.generate_text(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt
+            )
         
         return DocumentQnAResponse(
             answer=answer.strip(),
@@ -142,7 +325,7 @@ Answer the question based on the document excerpts above:"""
 @router.get("/documents/session/{session_id}")
 async def get_session_info(session_id: str):
     """Get information about a document session."""
-    info = document_manager.get_session_info(session_id)
+    info = await document_manager.get_session_info(session_id)
     if not info:
         raise HTTPException(status_code=404, detail="Session not found")
     return info
@@ -153,7 +336,28 @@ async def delete_session(session_id: str):
     Delete a session and all its documents.
     This removes all uploaded files, vector data, and session information.
     """
-    success = document_manager.delete_session(session_id)
+    success = await document_manager.delete_session(session_id)
     if not success:
         raise HTTPException(status_code=404, detail="Session not found")
     return {"message": "Session and all documents deleted successfully", "session_id": session_id}
+
+@router.get("/metrics")
+async def get_metrics():
+    """Runtime counters for caches and other shared resources."""
+    cache = embedding_service.cache
+    return {
+        # SQLite (lazy open, lock, COUNT): keep it off the event loop
+        "embedding_cache": await asyncio.to_thread(cache.stats) if cache else None,
+        "query_embedding_cache": embedding_service.query_cache_stats(),
+        "llm_cache": llm_client.cache.stats() if llm_client.cache else None,
+        "llm_router": llm_client.stats() if isinstance(llm_client, LLMRouter) else None,
+        "sessions": document_manager.sessions.stats(),
+        "task_state": await task_store.stats(),
+        "scheduler": scheduler.stats(),
+        "rate_limits": {
+            "generation": generation_limiter.stats(),
+            "embedding": embedding_limiter.stats()
+        },
+        "research_dedup": topic_registry.stats(),
+        "context_packing": analyzer.stats()
+    }
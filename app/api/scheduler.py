@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger("uvicorn")
+
+
+class QueueFullError(Exception):
+    """Raised by WorkflowScheduler.admit when no queue slot is free."""
+
+
+class TicketCancelledError(Exception):
+    """Raised by WorkflowScheduler.run for a task whose place was cancelled or reclaimed."""
+
+
+class _Ticket:
+    __slots__ = ("task_id", "enqueued", "granted", "started", "wake", "on_cancel")
+
+    def __init__(self, task_id: str, on_cancel: Optional[Callable[[str], None]] = None):
+        self.task_id = task_id
+        self.on_cancel = on_cancel
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.started = False  # run() picked the ticket up
+        self.wake: Optional[asyncio.Future] = None
+
+
+class WorkflowScheduler:
+    """
+    Admission control for research workflows.
+    At most `max_concurrent` workflows run at once; up to `max_queue` more
+    wait in FIFO order, and anything beyond that is rejected at admission
+    (the API turns it into 429 + Retry-After). Waiting jobs are told their
+    queue position whenever it changes. Queue wait and run times are kept
+    for metrics and for the Retry-After estimate.
+
+    A place reserved by `admit()` is given back by `cancel()` if the task
+    can't be started, and reclaimed automatically if its `run()` hasn't
+    begun `start_timeout` seconds after admission (0 = never). Either way
+    the ticket's `on_cancel(task_id)` is called, so the owner can close the
+    task out, and a late `run()` for it raises TicketCancelledError.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, default_retry_after: int = 30,
+                 history: int = 1000, start_timeout: float = 0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.default_retry_after = default_retry_after
+        self.start_timeout = start_timeout
+
+        self._tickets: Dict[str, _Ticket] = {}
+        self._waiting: Deque[_Ticket] = deque()
+        self._running = 0
+
+        self._wait_times: Deque[float] = deque(maxlen=history)
+        self._run_times: Deque[float] = deque(maxlen=history)
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.reclaimed = 0
+        # Recently cancelled task ids, so a run() that shows up late is refused
+        self._cancelled: "OrderedDict[str, None]" = OrderedDict()
+        self._history = history
+
+    def admit(self, task_id: str, on_cancel: Optional[Callable[[str], None]] = None) -> int:
+        """
+        Reserves a place for the task. Returns its queue position
+        (0 = starts right away). Raises QueueFullError if none is free.
+        `on_cancel(task_id)` is called if the place is given up before run().
+        """
+        self._reclaim_stale()
+        ticket = _Ticket(task_id, on_cancel)
+        if self._running < self.max_concurrent and not self._waiting:
+            ticket.granted = True
+            self._running += 1
+        elif len(self._waiting) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(task_id)
+        else:
+            self._waiting.append(ticket)
+
+        self._tickets[task_id] = ticket
+        self.admitted += 1
+        return self.position(task_id)
+
+    def cancel(self, task_id: str) -> bool:
+        """
+        Gives back the place of an admitted task whose run() hasn't started
+        (e.g. its setup failed). Returns False if there was nothing to free.
+        """
+        ticket = self._tickets.get(task_id)
+        if ticket is None or ticket.started:
+            return False
+        del self._tickets[task_id]
+        if ticket.granted:
+            self._release()
+        else:
+            self._waiting.remove(ticket)
+            self._notify_waiting()
+
+        self._cancelled[task_id] = None
+        while len(self._cancelled) > self._history:
+            self._cancelled.popitem(last=False)
+        if ticket.on_cancel is not None:
+            try:
+                ticket.on_cancel(task_id)
+            except Exception as e:
+                logger.error(f"on_cancel failed for task {task_id}: {e}")
+        return True
+
+    def _reclaim_stale(self):
+        if not self.start_timeout:
+            return
+        cutoff = time.monotonic() - self.start_timeout
+        for ticket in [t for t in self._tickets.values() if not t.started and t.enqueued < cutoff]:
+            logger.warning(f"Reclaiming scheduler slot of task {ticket.task_id}: admitted but never started")
+            self.cancel(ticket.task_id)
+            self.reclaimed += 1
+
+    def position(self, task_id: str) -> int:
+        ticket = self._tickets.get(task_id)
+        if ticket is None or ticket.granted:
+            return 0
+        return self._waiting.index(ticket) + 1
+
+    async def run(self, task_id: str, job: Callable[[], Awaitable],
+                  on_position: Optional[Callable[[int], Awaitable]] = None):
+        """
+        Waits for the admitted task's turn, then runs `job()`.
+        `on_position(n)` is awaited each time the queue position changes.
+        """
+        ticket = self._tickets.get(task_id)
+        if ticket is None and task_id in self._cancelled:
+            raise TicketCancelledError(task_id)
+        if ticket is None:
+            # Not admitted first (e.g. called directly): queue it now, no limit
+            ticket = _Ticket(task_id)
+            self._tickets[task_id] = ticket
+            self._waiting.append(ticket)
+            self._dispatch()
+        ticket.started = True
+
+        try:
+            last_position = None
+            while not ticket.granted:
+                position = self.position(task_id)
+                if position != last_position and on_position is not None:
+                    last_position = position
+                    await on_position(position)
+                    continue  # The queue may have moved while we were reporting
+                ticket.wake = asyncio.get_running_loop().create_future()
+                await ticket.wake
+        except BaseException:
+            if ticket.granted:
+                self._release()
+            else:
+                self._waiting.remove(ticket)
+                self._notify_waiting()
+            self._tickets.pop(task_id, None)
+            raise
+
+        self._wait_times.append(time.monotonic() - ticket.enqueued)
+        started = time.monotonic()
+        try:
+            return await job()
+        finally:
+            self._run_times.append(time.monotonic() - started)
+            self.completed += 1
+            self._tickets.pop(task_id, None)
+            self._release()
+
+    def _release(self):
+        self._running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._waiting and self._running < self.max_concurrent:
+            ticket = self._waiting.popleft()
+            ticket.granted = True
+            self._running += 1
+        self._notify_waiting()
+
+    def _notify_waiting(self):
+        for ticket in list(self._tickets.values()):
+            if ticket.wake is not None and not ticket.wake.done():
+                ticket.wake.set_result(None)
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely to free up."""
+        if not self._run_times:
+            return self.default_retry_after
+        avg_run = sum(self._run_times) / len(self._run_times)
+        return max(1, math.ceil(avg_run / max(self.max_concurrent, 1)))
+
+    def stats(self) -> Dict:
+        self._reclaim_stale()
+        waits = sorted(self._wait_times)
+        return {
+            "running": self._running,
+            "queued": len(self._waiting),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "reclaimed": self.reclaimed,
+            "queue_wait_avg_seconds": round(sum(waits) / len(waits), 3) if waits else 0.0,
+            "queue_wait_p95_seconds": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+            "queue_wait_max_seconds": round(waits[-1], 3) if waits else 0.0,
+        }
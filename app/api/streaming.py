@@ -0,0 +1,58 @@
+import asyncio
+import json
+from typing import Dict, Optional
+
+
+class LogNotifier:
+    """
+    Wakes up stream watchers when a task gets a new log entry.
+    Watchers also wake on a timeout, so they stay correct even when the
+    log was written somewhere that didn't notify this process.
+    """
+
+    def __init__(self):
+        self._events: Dict[str, asyncio.Event] = {}
+        # Waiters per task; the event is dropped when the last one leaves
+        self._waiters: Dict[str, int] = {}
+
+    def notify(self, task_id: str):
+        event = self._events.pop(task_id, None)
+        if event:
+            event.set()
+
+    async def wait(self, task_id: str, timeout: float) -> bool:
+        """Waits for the next notify(task_id). Returns False on timeout."""
+        event = self._events.get(task_id)
+        if event is None:
+            event = self._events[task_id] = asyncio.Event()
+        self._waiters[task_id] = self._waiters.get(task_id, 0) + 1
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            remaining = self._waiters.pop(task_id) - 1
+            if remaining:
+                self._waiters[task_id] = remaining
+            else:
+                self._events.pop(task_id, None)
+
+
+def format_sse(data: Dict, event_id: Optional[int] = None, event: Optional[str] = None) -> str:
+    """Encodes one Server-Sent Events message."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def parse_last_event_id(value: Optional[str]) -> int:
+    """Returns the cursor to resume from: the log index after Last-Event-ID."""
+    try:
+        return int(value) + 1 if value is not None else 0
+    except ValueError:
+        return 0
@@ -0,0 +1,378 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.memory_budget import BudgetedLRU
+from app.core.resp import RespClient
+
+logger = logging.getLogger("uvicorn")
+
+# Rough per-entry cost of a StreamLog besides its details text
+_STREAM_LOG_OVERHEAD = 200
+
+
+class TaskStore(ABC):
+    """
+    Interface for research task state: an append-only log per task, the
+    report draft streamed while writing, and the final result.
+    Logs and drafts are read with a cursor (`since` = entries already seen),
+    so pollers only transfer what is new. Logs and results are plain dicts
+    (StreamLog / FinalReportRepsonse dumps).
+    """
+
+    @abstractmethod
+    async def create(self, task_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def exists(self, task_id: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def append_log(self, task_id: str, log: Dict[str, Any]):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_logs(self, task_id: str, since: int = 0) -> Optional[List[Dict[str, Any]]]:
+        """Logs from index `since` on, or None for an unknown task."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def append_draft(self, task_id: str, delta: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_drafts(self, task_id: str, since: int = 0) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def clear_drafts(self, task_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_result(self, task_id: str, result: Dict[str, Any]):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def has_result(self, task_id: str) -> bool:
+        return await self.get_result(task_id) is not None
+
+    @abstractmethod
+    async def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class MemoryTaskStore(TaskStore):
+    """
+    Process-local store (the default). Bounded by TTL + LRU eviction so
+    long-running workers don't grow forever. Only correct with one worker.
+    """
+
+    def __init__(self, logs_budget: int, results_budget: int, ttl: float):
+        # task_id -> List[log dict]
+        self.logs = BudgetedLRU(
+            name="task_logs",
+            max_bytes=logs_budget,
+            ttl=ttl,
+            sizeof=lambda logs: sum(_STREAM_LOG_OVERHEAD + len(log.get("details") or "") for log in logs)
+        )
+        # task_id -> result dict
+        self.results = BudgetedLRU(
+            name="task_results",
+            max_bytes=results_budget,
+            ttl=ttl,
+            sizeof=lambda result: len(result["content_html"]) + len(result["topic"])
+        )
+        # task_id -> List[str] of HTML deltas while the writer is streaming the report
+        self.drafts = BudgetedLRU(
+            name="task_drafts",
+            max_bytes=results_budget,
+            ttl=ttl,
+            sizeof=lambda deltas: sum(len(d) for d in deltas)
+        )
+
+    async def create(self, task_id: str):
+        self.logs[task_id] = []
+
+    async def exists(self, task_id: str) -> bool:
+        return task_id in self.logs
+
+    async def append_log(self, task_id: str, log: Dict[str, Any]):
+        logs = self.logs.get(task_id)
+        if logs is None:
+            # Evicted under memory pressure while running; keep logging from here
+            logs = []
+            self.logs[task_id] = logs
+        logs.append(log)
+        self.logs.touch(task_id)
+
+    async def get_logs(self, task_id: str, since: int = 0) -> Optional[List[Dict[str, Any]]]:
+        logs = self.logs.get(task_id)
+        return None if logs is None else logs[since:]
+
+    async def append_draft(self, task_id: str, delta: str):
+        drafts = self.drafts.get(task_id)
+        if drafts is None:
+            drafts = []
+            self.drafts[task_id] = drafts
+        drafts.append(delta)
+        self.drafts.touch(task_id)
+
+    async def get_drafts(self, task_id: str, since: int = 0) -> List[str]:
+        return (self.drafts.get(task_id) or [])[since:]
+
+    async def clear_drafts(self, task_id: str):
+        self.drafts.pop(task_id)
+
+    async def set_result(self, task_id: str, result: Dict[str, Any]):
+        self.results[task_id] = result
+
+    async def get_result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        return self.results.get(task_id)
+
+    async def has_result(self, task_id: str) -> bool:
+        return task_id in self.results
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "task_logs": self.logs.stats(),
+            "task_results": self.results.stats(),
+        }
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    Task state in a local SQLite database in WAL mode, shared by every
+    worker process on the host. Log and draft entries are append-only rows
+    keyed by (task_id, seq), so a cursor read is one index range scan.
+    Tasks older than `ttl` are purged at most once a minute.
+    """
+
+    PURGE_INTERVAL = 60.0
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._last_purge = 0.0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " task_id TEXT PRIMARY KEY, created REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks(created);"
+            "CREATE TABLE IF NOT EXISTS task_logs ("
+            " task_id TEXT NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL,"
+            " PRIMARY KEY (task_id, seq)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS task_drafts ("
+            " task_id TEXT NOT NULL, seq INTEGER NOT NULL, delta TEXT NOT NULL,"
+            " PRIMARY KEY (task_id, seq)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS task_results ("
+            " task_id TEXT PRIMARY KEY, data TEXT NOT NULL);"
+        )
+        self._conn.commit()
+
+    def _append(self, table: str, column: str, task_id: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO tasks VALUES (?, ?)", (task_id, time.time()))
+            # Next seq is computed inside the insert, which holds the write lock across processes
+            self._conn.execute(
+                f"INSERT INTO {table} (task_id, seq, {column}) "
+                f"SELECT ?, COALESCE(MAX(seq) + 1, 0), ? FROM {table} WHERE task_id = ?",
+                (task_id, value, task_id)
+            )
+
+    def _purge(self):
+        now = time.time()
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        cutoff = now - self.ttl
+        with self._lock, self._conn:
+            expired = "SELECT task_id FROM tasks WHERE created < ?"
+            for table in ("task_logs", "task_drafts", "task_results"):
+                self._conn.execute(f"DELETE FROM {table} WHERE task_id IN ({expired})", (cutoff,))
+            self._conn.execute("DELETE FROM tasks WHERE created < ?", (cutoff,))
+
+    def _create(self, task_id: str):
+        self._purge()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO tasks VALUES (?, ?)", (task_id, time.time()))
+
+    def _exists(self, task_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return row is not None
+
+    def _get_logs(self, task_id: str, since: int) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM tasks WHERE task_id = ?", (task_id,)).fetchone() is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT data FROM task_logs WHERE task_id = ? AND seq >= ? ORDER BY seq", (task_id, since)
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def _get_drafts(self, task_id: str, since: int) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT delta FROM task_drafts WHERE task_id = ? AND seq >= ? ORDER BY seq", (task_id, since)
+            ).fetchall()
+        return [delta for (delta,) in rows]
+
+    def _clear_drafts(self, task_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM task_drafts WHERE task_id = ?", (task_id,))
+
+    def _set_result(self, task_id: str, result: Dict[str, Any]):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO tasks VALUES (?, ?)", (task_id, time.time()))
+            self._conn.execute("INSERT OR REPLACE INTO task_results VALUES (?, ?)", (task_id, json.dumps(result)))
+
+    def _get_result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM task_results WHERE task_id = ?", (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _has_result(self, task_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM task_results WHERE task_id = ?", (task_id,)).fetchone()
+        return row is not None
+
+    def _stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tasks = self._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+            results = self._conn.execute("SELECT COUNT(*) FROM task_results").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "tasks": tasks, "results": results}
+
+    # SQLite calls block (disk, and up to `timeout` on another worker's write lock),
+    # so the async interface runs them in worker threads
+
+    async def create(self, task_id: str):
+        await asyncio.to_thread(self._create, task_id)
+
+    async def exists(self, task_id: str) -> bool:
+        return await asyncio.to_thread(self._exists, task_id)
+
+    async def append_log(self, task_id: str, log: Dict[str, Any]):
+        await asyncio.to_thread(self._append, "task_logs", "data", task_id, json.dumps(log))
+
+    async def get_logs(self, task_id: str, since: int = 0) -> Optional[List[Dict[str, Any]]]:
+        return await asyncio.to_thread(self._get_logs, task_id, since)
+
+    async def append_draft(self, task_id: str, delta: str):
+        await asyncio.to_thread(self._append, "task_drafts", "delta", task_id, delta)
+
+    async def get_drafts(self, task_id: str, since: int = 0) -> List[str]:
+        return await asyncio.to_thread(self._get_drafts, task_id, since)
+
+    async def clear_drafts(self, task_id: str):
+        await asyncio.to_thread(self._clear_drafts, task_id)
+
+    async def set_result(self, task_id: str, result: Dict[str, Any]):
+        await asyncio.to_thread(self._set_result, task_id, result)
+
+    async def get_result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get_result, task_id)
+
+    async def has_result(self, task_id: str) -> bool:
+        return await asyncio.to_thread(self._has_result, task_id)
+
+    async def stats(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._stats)
+
+
+class RedisTaskStore(TaskStore):
+    """
+    Task state on a Redis-protocol server, shared by workers and replicas
+    on any host. Logs and drafts are lists (RPUSH to append, LRANGE from
+    the cursor to read); every key expires `ttl` seconds after its last write.
+    """
+
+    def __init__(self, client: RespClient, ttl: float, prefix: str = "ragentic:task"):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def _key(self, task_id: str, kind: str) -> str:
+        return f"{self.prefix}:{task_id}:{kind}"
+
+    async def _push(self, task_id: str, kind: str, value: str):
+        key = self._key(task_id, kind)
+        await self.client.pipeline(
+            ("RPUSH", key, value),
+            ("EXPIRE", key, self.ttl),
+            ("SET", self._key(task_id, "meta"), 1, "EX", self.ttl),
+        )
+
+    async def create(self, task_id: str):
+        await self.client.execute("SET", self._key(task_id, "meta"), 1, "EX", self.ttl)
+
+    async def exists(self, task_id: str) -> bool:
+        return bool(await self.client.execute("EXISTS", self._key(task_id, "meta")))
+
+    async def append_log(self, task_id: str, log: Dict[str, Any]):
+        await self._push(task_id, "logs", json.dumps(log))
+
+    async def get_logs(self, task_id: str, since: int = 0) -> Optional[List[Dict[str, Any]]]:
+        known, entries = await self.client.pipeline(
+            ("EXISTS", self._key(task_id, "meta")),
+            ("LRANGE", self._key(task_id, "logs"), since, -1),
+        )
+        if not known:
+            return None
+        return [json.loads(entry) for entry in entries]
+
+    async def append_draft(self, task_id: str, delta: str):
+        await self._push(task_id, "drafts", delta)
+
+    async def get_drafts(self, task_id: str, since: int = 0) -> List[str]:
+        entries = await self.client.execute("LRANGE", self._key(task_id, "drafts"), since, -1)
+        return [entry.decode("utf-8") for entry in entries]
+
+    async def clear_drafts(self, task_id: str):
+        await self.client.execute("DEL", self._key(task_id, "drafts"))
+
+    async def set_result(self, task_id: str, result: Dict[str, Any]):
+        await self.client.execute("SET", self._key(task_id, "result"), json.dumps(result), "EX", self.ttl)
+
+    async def get_result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        data = await self.client.execute("GET", self._key(task_id, "result"))
+        return json.loads(data) if data is not None else None
+
+    async def has_result(self, task_id: str) -> bool:
+        return bool(await self.client.execute("EXISTS", self._key(task_id, "result")))
+
+    async def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "host": self.client.host, "port": self.client.port}
+
+
+def build_task_store() -> TaskStore:
+    backend = settings.TASK_STORE
+    if backend == "sqlite":
+        return SQLiteTaskStore(settings.TASK_STORE_PATH, ttl=settings.TASK_TTL_SECONDS)
+    if backend == "redis":
+        return RedisTaskStore(RespClient(settings.TASK_STORE_URL), ttl=settings.TASK_TTL_SECONDS)
+    if backend != "memory":
+        logger.warning(f"Unknown TASK_STORE {backend!r}; using in-memory task state.")
+    return MemoryTaskStore(
+        logs_budget=settings.TASK_LOGS_BUDGET_MB * 1024 * 1024,
+        results_budget=settings.TASK_RESULTS_BUDGET_MB * 1024 * 1024,
+        ttl=settings.TASK_TTL_SECONDS
+    )
+
+
+# Singleton
+task_store = build_task_store()
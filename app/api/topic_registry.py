@@ -0,0 +1,68 @@
+import re
+import time
+from typing import Dict, Optional, Tuple
+
+
+def normalize_topic(topic: str) -> str:
+    """Case, whitespace and trailing punctuation don't make a new topic."""
+    text = re.sub(r"\s+", " ", topic).strip().lower()
+    return text.rstrip("?!.,;: ")
+
+
+class TopicRegistry:
+    """
+    Single-flight bookkeeping for research topics.
+    Tracks which task is currently researching each normalized topic, and
+    which task finished it recently, so duplicate requests can attach to
+    that task instead of starting a new workflow.
+    """
+
+    def __init__(self, freshness_seconds: float):
+        self.freshness_seconds = freshness_seconds
+        self._inflight: Dict[str, str] = {}
+        # normalized topic -> (task_id, completed_at)
+        self._completed: Dict[str, Tuple[str, float]] = {}
+        self.coalesced = 0
+        self.reused = 0
+
+    def lookup(self, topic: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Returns (task_id, "running" | "completed") for a task that can serve
+        this topic, or (None, None).
+        """
+        key = normalize_topic(topic)
+        if key in self._inflight:
+            return self._inflight[key], "running"
+
+        done = self._completed.get(key)
+        if done and time.monotonic() - done[1] <= self.freshness_seconds:
+            return done[0], "completed"
+        return None, None
+
+    def start(self, topic: str, task_id: str):
+        self._inflight[normalize_topic(topic)] = task_id
+
+    def finish(self, topic: str, task_id: str, success: bool):
+        key = normalize_topic(topic)
+        if self._inflight.get(key) == task_id:
+            del self._inflight[key]
+        if success and self.freshness_seconds > 0:
+            self._completed[key] = (task_id, time.monotonic())
+        self._prune()
+
+    def forget(self, topic: str):
+        """Drops a completed entry whose result is no longer available."""
+        self._completed.pop(normalize_topic(topic), None)
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.freshness_seconds
+        for key in [k for k, (_, at) in self._completed.items() if at < cutoff]:
+            del self._completed[key]
+
+    def stats(self) -> Dict:
+        return {
+            "inflight": len(self._inflight),
+            "completed": len(self._completed),
+            "coalesced": self.coalesced,
+            "reused": self.reused,
+        }
@@ -9,13 +9,108 @@ class Settings(BaseSettings):
     # Configuration
     LLM_PROVIDER: str = "gemini"
     GEMINI_MODEL: str = "gemini-flash-latest"  # Using latest flash model (auto-updates to best available)
+    HF_MODEL: str = "mistralai/Mistral-7B-Instruct-v0.2"
+    HF_API_URL: str = "https://api-inference.huggingface.co/models/{model}"  # Point at a local stand-in for load tests
+    HF_MAX_NEW_TOKENS: int = 1024
+    HF_TIMEOUT_SECONDS: float = 120.0  # Read/write/pool timeout per request
+    HF_CONNECT_TIMEOUT_SECONDS: float = 10.0
+    HTTP_MAX_CONNECTIONS: int = 100  # Pooled keep-alive connections per provider client
+    HTTP2_ENABLED: bool = True  # Used only if the h2 package is installed (pip install "httpx[http2]")
     MAX_RETRIES: int = 3
+
+    # Multi-provider routing (empty LLM_FALLBACKS = single provider, no router)
+    LLM_FALLBACKS: str = ""  # Comma-separated "provider" or "provider:model", e.g. "gemini:gemini-2.0-flash-lite,huggingface"
+    LLM_HEDGE_ENABLED: bool = True  # Send a second request to the next backend when the first is slow
+    LLM_HEDGE_QUANTILE: float = 0.95  # Hedge after this latency quantile of the first backend
+    LLM_HEDGE_MIN_DELAY: float = 1.0  # Never hedge sooner than this (seconds)
+    LLM_HEDGE_DEFAULT_DELAY: float = 10.0  # Hedge delay until enough latencies are recorded
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_BREAKER_FAILURES: int = 5  # Consecutive failures that open a backend's circuit
+    LLM_BREAKER_RESET_SECONDS: float = 30.0  # Open circuit waits this long before a trial call
     LOG_LEVEL: str = "INFO"
+
+    # Client-side provider budgets, shared by all calls in the process (0 = unlimited)
+    LLM_RPM: int = 60
+    LLM_TPM: int = 1_000_000
+    EMBED_RPM: int = 1_500  # Embedding API calls (one per batch)
+    EMBED_TPM: int = 1_000_000
+
+    # Embeddings
+    EMBEDDING_MODEL: str = "models/text-embedding-004"
+    EMBED_BATCH_SIZE: int = 100  # Texts per embedding API call (Gemini max is 100)
+    EMBED_MAX_CONCURRENCY: int = 4  # Embedding batches in flight at once
+    EMBED_CACHE_ENABLED: bool = True
+    EMBED_CACHE_MAX_ENTRIES: int = 200_000  # ~600MB of 768-dim float32 vectors
+    QUERY_EMBED_CACHE_SIZE: int = 10_000  # In-process LRU of query embeddings (0 = off)
+    QUERY_EMBED_CACHE_PERSIST: bool = True  # Also keep query embeddings in the on-disk cache
+
+    # Progress streaming (SSE)
+    WRITER_STREAMING: bool = True  # Stream the report to clients while it is written
+    SSE_POLL_INTERVAL: float = 1.0  # Max seconds a watcher sleeps without a notification
+    SSE_KEEPALIVE_SECONDS: float = 15.0
+
+    # Memory budgets (TTL + LRU eviction)
+    SESSION_MEMORY_BUDGET_MB: int = 1024  # Vectors + chunk text across all upload sessions
+    SESSION_TTL_SECONDS: int = 4 * 3600  # Idle sessions are dropped (and their files deleted)
+    TASK_LOGS_BUDGET_MB: int = 32
+    TASK_RESULTS_BUDGET_MB: int = 256
+    TASK_TTL_SECONDS: int = 24 * 3600
+
+    # Task state (logs, drafts, results); use sqlite or redis with more than one worker
+    TASK_STORE: str = "memory"  # "memory", "sqlite" (WAL, one host) or "redis" (any Redis-protocol server)
+    TASK_STORE_URL: str = "redis://localhost:6379/0"
+
+    # Upload session search
+    SESSION_PERSIST: bool = True  # Keep session vectors in memory-mapped files that survive restarts
+    SESSION_VECTOR_DTYPE: str = "int8"  # In-memory rows: "float32", "float16" (2x smaller) or "int8" (4x smaller)
+    SESSION_RESCORE_FACTOR: int = 4  # Re-rank top k*factor from full-precision rows on disk (0 = off)
+    ANN_MIN_VECTORS: int = 20_000  # Build an IVF index once a session holds this many chunks (0 = always exact)
+    ANN_NPROBE: int = 10  # IVF lists scanned per query (higher = better recall, slower)
+    ANN_RECALL_SAMPLE_EVERY: int = 50  # Also run every Nth ANN query exactly to track recall@k (0 = off)
+
+    # Ingestion
+    CHUNK_SIZE: int = 1000
+    CHUNK_OVERLAP: int = 200
+    INGEST_WORKERS: int = os.cpu_count() or 1  # Processes for read + split (0 = one background thread)
+    INGEST_COMMIT_BATCH: int = 512  # Chunks embedded and committed to the vector DB per batch
+    INGEST_QUEUE_SIZE: int = 8  # Prepared files buffered ahead of the embed stage
+
+    # Retrieval
+    RETRIEVAL_MODE: str = "hybrid"  # "hybrid" (dense + BM25), "dense" or "lexical"
+    HYBRID_CANDIDATES_FACTOR: int = 4  # Each retriever contributes k * factor candidates to fusion
+    RRF_K: int = 60  # Reciprocal rank fusion constant
+    RETRIEVAL_EMBED_TIMEOUT: float = 5.0  # Seconds to wait for a query embedding before going lexical-only
+
+    # LLM response cache
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ENTRIES: int = 2000
+    LLM_CACHE_TTL_SECONDS: int = 3600
+    LLM_CACHE_SEMANTIC: bool = False  # Also reuse answers for near-duplicate prompts (costs one embedding per call)
+    LLM_CACHE_SIMILARITY: float = 0.97  # Cosine similarity needed for a semantic hit
+
+    # Workflow scheduling (admission control)
+    WORKFLOW_CONCURRENCY: int = 4  # Research workflows running at once
+    WORKFLOW_QUEUE_SIZE: int = 20  # Workflows waiting for a worker; beyond this /research returns 429
+    WORKFLOW_RETRY_AFTER: int = 30  # Retry-After seconds until run times are known
+    WORKFLOW_START_TIMEOUT: int = 60  # Free the slot of an admitted workflow that hasn't started after this long
+
+    # Workflow
+    RESEARCH_CONCURRENCY: int = 3  # Sub-questions researched/analyzed in parallel (1 = sequential)
+    SUBQUESTION_MIN_INTERVAL: float = 0.5  # Seconds between sub-question starts, shared across workflows
+    RESEARCH_PREFETCH: bool = True  # Retrieve context for the whole plan in one batched call
+    CONTEXT_PACKING_ENABLED: bool = True  # Merge/dedupe retrieved chunks before analysis
+    CONTEXT_TOKEN_BUDGET: int = 2000  # Max estimated tokens of context per analysis call (0 = no limit)
+    CONTEXT_MIN_OVERLAP: int = 50  # Shared edge (chars) for two chunks to be merged; splitter overlap is CHUNK_OVERLAP
+    RESEARCH_DEDUP_ENABLED: bool = True  # Duplicate topics attach to the running task
+    RESEARCH_REUSE_SECONDS: int = 900  # Reuse a finished report for the same topic this long (0 = never)
     
     # Project Paths
     BASE_DIR: str = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     DATA_DIR: str = os.path.join(BASE_DIR, "data")
     STATIC_DIR: str = os.path.join(BASE_DIR, "static")
+    EMBED_CACHE_PATH: str = os.path.join(DATA_DIR, "embedding_cache.sqlite3")
+    TASK_STORE_PATH: str = os.path.join(DATA_DIR, "task_state.sqlite3")
+    INGEST_MANIFEST_PATH: str = os.path.join(DATA_DIR, "vector_store", "ingest_manifest.json")
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
@@ -0,0 +1,67 @@
+import importlib.util
+from typing import Optional
+
+import httpx
+
+from app.core.config import settings
+
+
+class HuggingFaceProvider:
+    """
+    Text generation over the Hugging Face Inference API (or anything that
+    speaks the same protocol, e.g. a local stand-in server for load tests).
+    One httpx.AsyncClient is shared by all calls, so connections are kept
+    alive and reused instead of paying TCP/TLS setup on every request.
+    HTTP/2 is used when enabled and the `h2` package is installed.
+    """
+
+    def __init__(self, url: str = None, token: str = None, model: str = None,
+                 timeout: float = None, connect_timeout: float = None,
+                 max_connections: int = None, http2: bool = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.model = model or settings.HF_MODEL
+        self.url = (url or settings.HF_API_URL).format(model=self.model)
+        self.token = token if token is not None else settings.HF_TOKEN
+        self.timeout = httpx.Timeout(
+            timeout or settings.HF_TIMEOUT_SECONDS,
+            connect=connect_timeout or settings.HF_CONNECT_TIMEOUT_SECONDS
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections or settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=max_connections or settings.HTTP_MAX_CONNECTIONS
+        )
+        wants_http2 = settings.HTTP2_ENABLED if http2 is None else http2
+        self.http2 = wants_http2 and importlib.util.find_spec("h2") is not None
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use, inside the event loop that will drive it
+        if self._client is None or self._client.is_closed:
+            headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+            self._client = httpx.AsyncClient(
+                headers=headers,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                transport=self.transport
+            )
+        return self._client
+
+    async def generate(self, prompt: str, max_new_tokens: int = None) -> str:
+        payload = {
+            "inputs": prompt,
+            "parameters": {
+                "max_new_tokens": max_new_tokens or settings.HF_MAX_NEW_TOKENS,
+                "return_full_text": False
+            }
+        }
+        response = await self.client.post(self.url, json=payload)
+        response.raise_for_status()
+        return response.json()[0]["generated_text"]
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
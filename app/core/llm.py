@@ -1,15 +1,36 @@
 from google import genai
-import requests
 from app.core.config import settings
 import logging
 import asyncio
+import hashlib
 import time
+from typing import AsyncIterator, Optional
+from app.core.llm_cache import ResponseCache, InMemoryResponseCache, normalize_prompt
+from app.core.rate_limit import ProviderLimiter, estimate_tokens, generation_limiter, rate_limit_delay
+from app.core.hf_provider import HuggingFaceProvider
+from app.core.llm_router import Backend, CircuitBreaker, LLMRouter
 
 logger = logging.getLogger("uvicorn")
 
+
+class StreamInterruptedError(Exception):
+    """A streamed response failed after part of it was already yielded."""
+
+    def __init__(self, partial: str, cause: Exception):
+        super().__init__(f"Stream interrupted after {len(partial)} characters: {cause}")
+        self.partial = partial
+
+
 class LLMClient:
-    def __init__(self, provider: str = None):
+    def __init__(self, provider: str = None, cache: Optional[ResponseCache] = None,
+                 limiter: Optional[ProviderLimiter] = None, model: str = None):
         self.provider = provider or settings.LLM_PROVIDER
+        self.client = None
+        self.model_name = None
+        self.cache = cache
+        # Shared RPM/TPM budget; calls wait here instead of running into 429s
+        self.limiter = limiter
+        self.hf: Optional[HuggingFaceProvider] = None
         
         if self.provider == "gemini":
             if not settings.GEMINI_API_KEY:
@@ -21,15 +42,42 @@ class LLMClient:
             else:
                 self.client = None
                 
-            model_name = getattr(settings, 'GEMINI_MODEL', 'gemini-1.5-flash') # Default to 1.5-flash if not set
+            model_name = model or getattr(settings, 'GEMINI_MODEL', 'gemini-1.5-flash') # Default to 1.5-flash if not set
             self.model_name = model_name
             logger.info(f"Using Gemini model: {model_name}")
             
         elif self.provider == "huggingface":
              if not settings.HF_TOKEN:
                 logger.warning("HF_TOKEN not set. Hugging Face calls will fail.")
+             # Pooled async HTTP client; endpoint, timeouts and HTTP/2 come from settings
+             self.hf = HuggingFaceProvider(model=model)
+             self.model_name = self.hf.model
+
+    def _cache_namespace(self, system_prompt: str) -> str:
+        """Provider + model + system prompt: only prompts for the same agent share answers."""
+        system_hash = hashlib.sha256(normalize_prompt(system_prompt).encode("utf-8")).hexdigest()[:16]
+        return f"{self.provider}|{self.model_name or settings.HF_MODEL}|{system_hash}"
 
     async def generate_text(self, system_prompt: str, user_prompt: str) -> str:
+        """
+        Generates text using the configured provider, served from the
+        response cache when the same (or a near-identical) prompt was answered recently.
+        """
+        if self.cache is None:
+            return await self._generate_uncached(system_prompt, user_prompt)
+
+        namespace = self._cache_namespace(system_prompt)
+        cached = await self.cache.get(namespace, user_prompt)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        response = await self._generate_uncached(system_prompt, user_prompt)
+        if not response.startswith("Error"):
+            await self.cache.set(namespace, user_prompt, response, time.perf_counter() - start)
+        return response
+
+    async def _generate_uncached(self, system_prompt: str, user_prompt: str) -> str:
         """
         Generates text using the configured provider with retry logic for quota errors.
         """
@@ -41,25 +89,21 @@ class LLMClient:
                 if self.provider == "gemini":
                     if not self.client:
                         return "Error: GEMINI_API_KEY is not set."
-                        
-                    # specific to Gemini library (google-genai)
-                    response = self.client.models.generate_content(
+                    
+                    await self._acquire(full_prompt)
+                    # specific to Gemini library (google-genai), async surface
+                    response = await self.client.aio.models.generate_content(
                         model=self.model_name,
                         contents=full_prompt
                     )
+                    self._settle(response.text)
                     return response.text
                     
                 elif self.provider == "huggingface":
-                    # Using inference API (Example URL - would likely need to be configurable in real prod)
-                    API_URL = "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.2"
-                    headers = {"Authorization": f"Bearer {settings.HF_TOKEN}"}
-                    payload = {
-                         "inputs": full_prompt,
-                         "parameters": {"max_new_tokens": 1024, "return_full_text": False}
-                    }
-                    response = requests.post(API_URL, headers=headers, json=payload)
-                    response.raise_for_status()
-                    return response.json()[0]["generated_text"]
+                    await self._acquire(full_prompt)
+                    text = await self.hf.generate(full_prompt)
+                    self._settle(text)
+                    return text
                     
                 else:
                     raise ValueError(f"Unsupported provider: {self.provider}")
@@ -67,24 +111,16 @@ class LLMClient:
             except Exception as e:
                 error_str = str(e)
                 
-                # Check if it's a quota/rate limit error (429)
-                if "429" in error_str or "quota" in error_str.lower() or "rate" in error_str.lower():
+                # Only a real 429 / RESOURCE_EXHAUSTED pauses the shared limiter
+                wait_time = rate_limit_delay(e)
+                if wait_time is not None:
                     if attempt < max_retries - 1:
-                        # Extract retry delay from error if available, otherwise use exponential backoff
-                        retry_delay = 60  # Default 60 seconds
-                        if "retry in" in error_str.lower():
-                            try:
-                                # Try to extract seconds from error message
-                                import re
-                                match = re.search(r'retry in ([\d.]+)s', error_str.lower())
-                                if match:
-                                    retry_delay = int(float(match.group(1))) + 5  # Add 5 seconds buffer
-                            except:
-                                pass
-                        
-                        wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
-                        logger.warning(f"Quota exceeded. Retrying in {wait_time} seconds (attempt {attempt + 1}/{max_retries})...")
-                        await asyncio.sleep(wait_time)
+                        logger.warning(f"Rate limited by {self.provider}. Retrying in {wait_time:.0f} seconds (attempt {attempt + 1}/{max_retries})...")
+                        if self.limiter is not None:
+                            # Back off every caller together; the retry waits in _acquire
+                            self.limiter.pause(wait_time)
+                        else:
+                            await asyncio.sleep(wait_time)
                         continue
                     else:
                         logger.error(f"LLM Generation Error (quota exceeded after {max_retries} retries): {error_str}")
@@ -97,5 +133,121 @@ class LLMClient:
         # Should not reach here, but just in case
         return "Error: Failed to generate response after retries."
 
+    async def aclose(self):
+        """Closes pooled provider connections (on app shutdown)."""
+        if self.hf is not None:
+            await self.hf.aclose()
+
+    async def _acquire(self, prompt: str):
+        if self.limiter is not None:
+            await self.limiter.acquire(estimate_tokens(prompt))
+
+    def _settle(self, output: Optional[str]):
+        # Output tokens also count against TPM, but are only known afterwards
+        if self.limiter is not None and output:
+            self.limiter.settle(estimate_tokens(output))
+
+    async def stream_text(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """
+        Yields the response as text deltas while the provider generates it.
+        Providers without streaming (or a failure before the first delta)
+        fall back to a single generate_text() call, which has the retry logic.
+        A failure after the first delta raises StreamInterruptedError.
+        """
+        if self.provider != "gemini" or not self.client:
+            yield await self.generate_text(system_prompt, user_prompt)
+            return
+
+        namespace = self._cache_namespace(system_prompt)
+        if self.cache is not None:
+            cached = await self.cache.get(namespace, user_prompt)
+            if cached is not None:
+                yield cached
+                return
+
+        full_prompt = f"{system_prompt}\n\nUser Input:\n{user_prompt}"
+        start = time.perf_counter()
+        parts = []
+        try:
+            await self._acquire(full_prompt)
+            stream = await self.client.aio.models.generate_content_stream(
+                model=self.model_name,
+                contents=full_prompt
+            )
+            async for chunk in stream:
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield chunk.text
+        except Exception as e:
+            if parts:
+                # Part of the answer is already out; can't restart cleanly, so the caller decides
+                logger.error(f"LLM Streaming Error (after partial output): {e}")
+                raise StreamInterruptedError("".join(parts), e) from e
+            logger.warning(f"LLM Streaming Error, falling back to non-streaming call: {e}")
+            yield await self.generate_text(system_prompt, user_prompt)
+            return
+
+        self._settle("".join(parts))
+        if self.cache is not None and parts:
+            await self.cache.set(namespace, user_prompt, "".join(parts), time.perf_counter() - start)
+
+def build_response_cache() -> Optional[ResponseCache]:
+    """Response cache from settings (None when disabled)."""
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+
+    embed = None
+    if settings.LLM_CACHE_SEMANTIC:
+        from app.services.embeddings import embedding_service
+
+        async def embed(text: str):
+            embeddings = await embedding_service.embed_documents([text], task_type="semantic_similarity")
+            return embeddings[0]
+
+    return InMemoryResponseCache(
+        max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+        ttl=settings.LLM_CACHE_TTL_SECONDS,
+        embed=embed,
+        similarity_threshold=settings.LLM_CACHE_SIMILARITY
+    )
+
+def build_llm_client(cache: Optional[ResponseCache] = None):
+    """
+    The configured provider on its own, or - when LLM_FALLBACKS lists
+    alternates - an LLMRouter that hedges and fails over across them.
+    """
+    fallbacks = [spec.strip() for spec in settings.LLM_FALLBACKS.split(",") if spec.strip()]
+    if not fallbacks:
+        return LLMClient(cache=cache, limiter=generation_limiter)
+
+    clients = [LLMClient(limiter=generation_limiter)]
+    for spec in fallbacks:
+        # "provider" or "provider:model"
+        provider, _, model = spec.partition(":")
+        clients.append(LLMClient(
+            provider=provider,
+            model=model or None,
+            # Alternates have quotas of their own
+            limiter=ProviderLimiter(f"generation:{spec}", rpm=settings.LLM_RPM, tpm=settings.LLM_TPM)
+        ))
+
+    backends = [
+        Backend(
+            f"{client.provider}:{client.model_name}",
+            client,
+            CircuitBreaker(settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET_SECONDS)
+        )
+        for client in clients
+    ]
+    return LLMRouter(
+        backends,
+        cache=cache,
+        hedge=settings.LLM_HEDGE_ENABLED,
+        hedge_quantile=settings.LLM_HEDGE_QUANTILE,
+        hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY,
+        hedge_default_delay=settings.LLM_HEDGE_DEFAULT_DELAY,
+        hedge_min_samples=settings.LLM_HEDGE_MIN_SAMPLES
+    )
+
 # Singleton instance
-llm_client = LLMClient()
+llm_client = build_llm_client(cache=build_response_cache())
@@ -0,0 +1,219 @@
+import hashlib
+import logging
+import re
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+import numpy as np
+
+logger = logging.getLogger("uvicorn")
+
+# text -> embedding (or None if it couldn't be embedded)
+EmbedFn = Callable[[str], Awaitable[Optional[List[float]]]]
+
+
+def normalize_prompt(text: str) -> str:
+    """Whitespace-insensitive form of a prompt (agents indent theirs freely)."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def prompt_hash(text: str) -> str:
+    return hashlib.sha256(normalize_prompt(text).encode("utf-8")).hexdigest()
+
+
+class ResponseCache(ABC):
+    """
+    Interface for LLM response caches.
+    `namespace` identifies provider, model and system prompt; only prompts
+    in the same namespace can share an answer.
+    """
+
+    @abstractmethod
+    async def get(self, namespace: str, prompt: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, namespace: str, prompt: str, response: str, latency: float):
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict:
+        ...
+
+
+class _NamespaceVectors:
+    """
+    Unit-normalized prompt embeddings of one namespace in a preallocated
+    matrix that grows by doubling. Freed rows are zeroed and reused.
+    """
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.keys: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self._free: List[int] = []
+
+    def add(self, key: str, embedding: List[float]):
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.shape != (self.matrix.shape[1],):
+            return
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return
+
+        row = self.rows.get(key)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+                self.keys[row] = key
+            else:
+                row = len(self.keys)
+                if row == len(self.matrix):
+                    grown = np.zeros((2 * len(self.matrix), self.matrix.shape[1]), dtype=np.float32)
+                    grown[:row] = self.matrix
+                    self.matrix = grown
+                self.keys.append(key)
+            self.rows[key] = row
+        self.matrix[row] = vector / norm
+
+    def remove(self, key: str):
+        row = self.rows.pop(key, None)
+        if row is not None:
+            self.matrix[row] = 0.0
+            self.keys[row] = None
+            self._free.append(row)
+
+    def best(self, query: np.ndarray):
+        """(key, cosine similarity) of the closest stored prompt, or (None, -1)."""
+        if not self.rows:
+            return None, -1.0
+        sims = self.matrix[:len(self.keys)] @ query
+        for row in self._free:
+            sims[row] = -np.inf
+        row = int(np.argmax(sims))
+        return self.keys[row], float(sims[row])
+
+
+class InMemoryResponseCache(ResponseCache):
+    """
+    Exact-match cache on the normalized prompt hash, with TTL and LRU
+    eviction past `max_entries`. If `embed` is given, a miss falls back to
+    semantic matching: the most similar cached prompt in the namespace is
+    reused when its cosine similarity is at least `similarity_threshold`.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, embed: Optional[EmbedFn] = None,
+                 similarity_threshold: float = 0.97):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+
+        # key -> {"namespace", "response", "created", "latency"}
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._vectors: Dict[str, _NamespaceVectors] = {}
+        # Prompt embeddings computed by a missed get(), reused by the set() that follows
+        self._query_embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_latency = 0.0
+
+    def _key(self, namespace: str, prompt: str) -> str:
+        return f"{namespace}|{prompt_hash(prompt)}"
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for key in [k for k, e in self._entries.items() if e["created"] < cutoff]:
+            self._drop(key)
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        vectors = self._vectors.get(entry["namespace"])
+        if vectors is not None:
+            vectors.remove(key)
+
+    def _hit(self, key: str, entry: Dict) -> str:
+        self._entries.move_to_end(key)
+        self.saved_latency += entry["latency"]
+        return entry["response"]
+
+    async def get(self, namespace: str, prompt: str) -> Optional[str]:
+        self._expire()
+        key = self._key(namespace, prompt)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.exact_hits += 1
+            return self._hit(key, entry)
+
+        if self.embed is not None:
+            match = await self._semantic_lookup(namespace, prompt)
+            if match is not None:
+                self.semantic_hits += 1
+                return self._hit(match, self._entries[match])
+
+        self.misses += 1
+        return None
+
+    async def _semantic_lookup(self, namespace: str, prompt: str) -> Optional[str]:
+        vectors = self._vectors.get(namespace)
+        if vectors is None or not vectors.rows:
+            return None
+
+        query = await self.embed(normalize_prompt(prompt))
+        if not query:
+            return None
+        self._remember_query(self._key(namespace, prompt), query)
+
+        q = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if q.shape != (vectors.matrix.shape[1],) or norm == 0:
+            return None
+        key, similarity = vectors.best(q / norm)
+        if key is not None and similarity >= self.similarity_threshold:
+            # The key may have expired while we were awaiting the embedding
+            return key if key in self._entries else None
+        return None
+
+    def _remember_query(self, key: str, embedding: List[float]):
+        self._query_embeddings[key] = embedding
+        while len(self._query_embeddings) > 256:
+            self._query_embeddings.popitem(last=False)
+
+    async def set(self, namespace: str, prompt: str, response: str, latency: float):
+        key = self._key(namespace, prompt)
+        embedding = self._query_embeddings.pop(key, None)
+        if self.embed is not None and embedding is None:
+            embedding = await self.embed(normalize_prompt(prompt))
+
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = {
+            "namespace": namespace,
+            "response": response,
+            "created": time.monotonic(),
+            "latency": latency,
+        }
+        if embedding:
+            if namespace not in self._vectors:
+                self._vectors[namespace] = _NamespaceVectors(len(embedding))
+            self._vectors[namespace].add(key, embedding)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def stats(self) -> Dict:
+        self._expire()
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "saved_latency_seconds": round(self.saved_latency, 3),
+        }
@@ -0,0 +1,331 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+from app.core.llm_cache import ResponseCache
+
+logger = logging.getLogger("uvicorn")
+
+
+class CircuitBreaker:
+    """
+    Per-backend circuit breaker.
+    After `failure_threshold` consecutive failures the circuit opens and the
+    backend gets no traffic for `reset_timeout` seconds. Then it is
+    half-open: a single trial call is let through, and its outcome closes
+    the circuit again or re-opens it for another `reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0  # Consecutive
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def available(self) -> bool:
+        """Whether a call would be let through right now (without reserving it)."""
+        state = self.state
+        return state == self.CLOSED or (state == self.HALF_OPEN and not self._trial_in_flight)
+
+    def allow(self) -> bool:
+        """Reserves a call. A half-open circuit lets one trial through at a time."""
+        if not self.available():
+            return False
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_in_flight:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def release(self):
+        """The reserved call ended without an outcome (e.g. a cancelled hedge)."""
+        self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """Latencies of the last `window` successful calls."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Backend:
+    """One LLM client in the router, with its breaker and latency history."""
+
+    def __init__(self, name: str, client, breaker: CircuitBreaker):
+        self.name = name
+        self.client = client
+        self.breaker = breaker
+        self.latency = LatencyTracker()
+
+        self.calls = 0
+        self.failures = 0
+        self.wins = 0
+        self.cancelled = 0
+
+    def stats(self) -> Dict:
+        p50, p95 = self.latency.quantile(0.5), self.latency.quantile(0.95)
+        limiter = getattr(self.client, "limiter", None)
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "trips": self.breaker.trips,
+            "calls": self.calls,
+            "failures": self.failures,
+            "wins": self.wins,
+            "cancelled": self.cancelled,
+            "latency_p50_seconds": round(p50, 3) if p50 is not None else None,
+            "latency_p95_seconds": round(p95, 3) if p95 is not None else None,
+            "rate_limit": limiter.stats() if limiter is not None else None,
+        }
+
+
+class LLMRouter:
+    """
+    Routes generation across several LLM clients (providers or models),
+    tried in the order given.
+
+    - Failover: a backend whose call fails (an "Error..." answer) is
+      followed straight away by the next one; backends with an open
+      circuit are skipped.
+    - Hedging: if the first backend has not answered after its recent
+      latency quantile (p95 by default), a second request goes to the next
+      backend. The first good answer wins and the other call is cancelled.
+
+    Same surface as LLMClient (generate_text / stream_text / cache / aclose),
+    so agents do not know whether they talk to one provider or several.
+    """
+
+    def __init__(self, backends: List[Backend], cache: Optional[ResponseCache] = None,
+                 hedge: bool = True, hedge_quantile: float = 0.95, hedge_min_delay: float = 1.0,
+                 hedge_default_delay: float = 10.0, hedge_min_samples: int = 20):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = backends
+        self.cache = cache
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_samples = hedge_min_samples
+
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.rejected = 0
+
+    @property
+    def primary(self) -> Backend:
+        return self.backends[0]
+
+    def _cache_namespace(self, system_prompt: str) -> str:
+        # Keyed on the primary backend, so answers are shared whichever backend produced them
+        return self.primary.client._cache_namespace(system_prompt)
+
+    def hedge_delay(self, backend: Backend) -> float:
+        """How long to wait on `backend` before hedging to the next one."""
+        if len(backend.latency) < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, backend.latency.quantile(self.hedge_quantile))
+
+    async def generate_text(self, system_prompt: str, user_prompt: str) -> str:
+        if self.cache is None:
+            return await self._generate_routed(system_prompt, user_prompt)
+
+        namespace = self._cache_namespace(system_prompt)
+        cached = await self.cache.get(namespace, user_prompt)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        response = await self._generate_routed(system_prompt, user_prompt)
+        if not response.startswith("Error"):
+            await self.cache.set(namespace, user_prompt, response, time.perf_counter() - start)
+        return response
+
+    async def _generate_routed(self, system_prompt: str, user_prompt: str,
+                               skip: Optional[Backend] = None) -> str:
+        candidates = (backend for backend in self.backends if backend is not skip)
+        pending: Dict[asyncio.Task, Backend] = {}
+        last_error = None
+        hedged = False
+        hedge_backend = None
+
+        def launch() -> bool:
+            for backend in candidates:
+                if backend.breaker.allow():
+                    task = asyncio.create_task(self._call(backend, system_prompt, user_prompt))
+                    pending[task] = backend
+                    return True
+            return False
+
+        if not launch():
+            self.rejected += 1
+            return "Error: No LLM provider available (all circuits open). Please try again shortly."
+
+        try:
+            while pending:
+                first = next(iter(pending.values()))
+                timeout = self.hedge_delay(first) if self.hedge and not hedged and len(pending) == 1 else None
+                done, _ = await asyncio.wait(list(pending), timeout=timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    if launch():
+                        self.hedges += 1
+                        hedge_backend = list(pending.values())[-1]
+                        logger.info(f"LLM hedge: {first.name} slower than {timeout:.1f}s, "
+                                    f"also asking {hedge_backend.name}")
+                    continue
+
+                for task in done:
+                    backend = pending.pop(task)
+                    response = task.result()
+                    if not response.startswith("Error"):
+                        backend.wins += 1
+                        if backend is hedge_backend:
+                            self.hedge_wins += 1
+                        return response
+                    last_error = response
+
+                if not pending and launch():
+                    self.failovers += 1
+                    logger.warning(f"LLM failover to {list(pending.values())[-1].name}: {last_error[:100]}")
+        finally:
+            # Losers (or everything, if we were cancelled ourselves)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        return last_error
+
+    async def _call(self, backend: Backend, system_prompt: str, user_prompt: str) -> str:
+        backend.calls += 1
+        start = time.perf_counter()
+        try:
+            response = await backend.client.generate_text(system_prompt, user_prompt)
+        except asyncio.CancelledError:
+            backend.cancelled += 1
+            backend.breaker.release()
+            raise
+        except Exception as e:
+            response = f"Error generating response: {str(e)[:200]}"
+
+        if response.startswith("Error"):
+            backend.failures += 1
+            backend.breaker.record_failure()
+        else:
+            backend.latency.add(time.perf_counter() - start)
+            backend.breaker.record_success()
+        return response
+
+    async def stream_text(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """
+        Streams from the first backend whose circuit lets it through. Streams are
+        not hedged (deltas are already out); if the backend fails before
+        its first delta, the routed non-streaming path takes over.
+        """
+        namespace = self._cache_namespace(system_prompt)
+        if self.cache is not None:
+            cached = await self.cache.get(namespace, user_prompt)
+            if cached is not None:
+                yield cached
+                return
+
+        backend = next((b for b in self.backends if b.breaker.allow()), None)
+        if backend is None:
+            yield await self.generate_text(system_prompt, user_prompt)
+            return
+
+        start = time.perf_counter()
+        parts = []
+        error = None
+        backend.calls += 1
+        try:
+            async for delta in backend.client.stream_text(system_prompt, user_prompt):
+                if not parts and delta.startswith("Error"):
+                    backend.failures += 1
+                    backend.breaker.record_failure()
+                    error = delta
+                    break
+                parts.append(delta)
+                yield delta
+        except Exception:
+            # Failed mid-stream (StreamInterruptedError): the caller handles the partial output
+            backend.failures += 1
+            backend.breaker.record_failure()
+            raise
+        finally:
+            # Consumer stopped early: no verdict on the backend
+            backend.breaker.release()
+
+        if parts:
+            backend.breaker.record_success()
+            backend.wins += 1
+            response = "".join(parts)
+        elif len(self.backends) > 1:
+            # Nothing streamed: the other backends get a (non-streamed) go
+            self.failovers += 1
+            response = await self._generate_routed(system_prompt, user_prompt, skip=backend)
+            yield response
+        else:
+            if error:
+                yield error
+            return
+        if self.cache is not None and not response.startswith("Error"):
+            await self.cache.set(namespace, user_prompt, response, time.perf_counter() - start)
+
+    async def aclose(self):
+        for backend in self.backends:
+            await backend.client.aclose()
+
+    def stats(self) -> Dict:
+        return {
+            "hedging": self.hedge,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "rejected": self.rejected,
+            "hedge_delay_seconds": round(self.hedge_delay(self.primary), 3),
+            "backends": {backend.name: backend.stats() for backend in self.backends},
+        }
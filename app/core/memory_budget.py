@@ -0,0 +1,129 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional
+
+logger = logging.getLogger("uvicorn")
+
+
+class BudgetedLRU:
+    """
+    Dict-like store with TTL + LRU eviction under a memory budget.
+
+    Each entry's size comes from `sizeof(value)` and is re-measured by
+    `touch()` after the value is mutated in place. Entries idle for longer
+    than `ttl` seconds expire; when the total size exceeds `max_bytes`,
+    the least recently used entries are evicted. `on_evict(key, value)` is
+    called for every eviction (not for explicit deletes).
+    """
+
+    def __init__(self, name: str, max_bytes: int, ttl: float,
+                 sizeof: Callable[[Any], int],
+                 on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+
+        # key -> [value, size, last_access]; order is least -> most recently used
+        self._entries: "OrderedDict[Hashable, list]" = OrderedDict()
+        self.total_bytes = 0
+        self.evictions_ttl = 0
+        self.evictions_budget = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        self._expire()
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._entries))
+
+    def __getitem__(self, key: Hashable) -> Any:
+        self._expire()
+        entry = self._entries[key]
+        entry[2] = time.monotonic()
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key: Hashable, value: Any):
+        if key in self._entries:
+            self.total_bytes -= self._entries[key][1]
+        size = self.sizeof(value)
+        self._entries[key] = [value, size, time.monotonic()]
+        self._entries.move_to_end(key)
+        self.total_bytes += size
+        self._enforce(keep=key)
+
+    def __delitem__(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self.total_bytes -= size
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._entries:
+            return default
+        value = self._entries[key][0]
+        del self[key]
+        return value
+
+    def touch(self, key: Hashable):
+        """Re-measures an entry after in-place changes and marks it as used."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        new_size = self.sizeof(entry[0])
+        self.total_bytes += new_size - entry[1]
+        entry[1] = new_size
+        entry[2] = time.monotonic()
+        self._entries.move_to_end(key)
+        self._enforce(keep=key)
+
+    def _evict(self, key: Hashable):
+        value = self._entries[key][0]
+        del self[key]
+        if self.on_evict:
+            try:
+                self.on_evict(key, value)
+            except Exception as e:
+                logger.error(f"{self.name}: eviction callback failed for {key}: {e}")
+
+    def _expire(self):
+        # LRU order is last-access order, so expired entries sit at the front
+        cutoff = time.monotonic() - self.ttl
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[2] > cutoff:
+                break
+            self._evict(key)
+            self.evictions_ttl += 1
+
+    def _enforce(self, keep: Hashable = None):
+        self._expire()
+        while self.total_bytes > self.max_bytes:
+            key = next(iter(self._entries))
+            if key == keep:
+                # The entry being written is never evicted by its own write
+                break
+            self._evict(key)
+            self.evictions_budget += 1
+            logger.info(f"{self.name}: evicted {key} to stay under {self.max_bytes} bytes")
+
+    def stats(self) -> Dict[str, Any]:
+        self._expire()
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "evictions_ttl": self.evictions_ttl,
+            "evictions_budget": self.evictions_budget,
+        }
@@ -0,0 +1,269 @@
+import asyncio
+import heapq
+import itertools
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+
+class RateLimiter:
+    """
+    Spaces out call starts so at most one begins every `min_interval` seconds.
+    A single instance is shared by all workflows, so concurrent tasks are
+    paced together instead of each sleeping on its own.
+    """
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._next_slot = 0.0
+
+    async def acquire(self):
+        """Wait until the next free slot. Slots are reserved in arrival order."""
+        # No await between reading and reserving the slot, so no lock is needed
+        now = time.monotonic()
+        wait = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self.min_interval
+
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+_current_priority: ContextVar[int] = ContextVar("rate_limit_priority", default=PRIORITY_BACKGROUND)
+
+
+@contextmanager
+def request_priority(priority: int) -> Iterator[None]:
+    """Provider calls made inside this block (same task) queue with `priority`."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for pacing."""
+    return len(text) // 4 + 1
+
+
+# Backoff when a 429 carries no retry hint
+DEFAULT_RATE_LIMIT_DELAY = 60.0
+_RETRY_HINTS = (
+    re.compile(r"retry in ([\d.]+)s", re.IGNORECASE),                  # "Please retry in 38.2s."
+    re.compile(r"retryDelay['\"]?:\s*['\"]?([\d.]+)s", re.IGNORECASE),  # RetryInfo detail
+)
+
+
+def rate_limit_delay(error: Exception) -> Optional[float]:
+    """
+    Seconds to back off if `error` is a real provider rate limit (HTTP 429 or
+    RESOURCE_EXHAUSTED), else None. Uses the provider's retry hint
+    (Retry-After, RetryInfo, "retry in Ns") when there is one.
+    """
+    response = getattr(error, "response", None)
+    code = getattr(error, "code", None) or getattr(response, "status_code", None)
+    status = getattr(error, "status", None)
+    text = str(error)
+    if code is not None or status is not None:
+        limited = code == 429 or status == "RESOURCE_EXHAUSTED"
+    else:
+        # Unstructured error: only an explicit status counts, not words like "rate"
+        limited = re.search(r"\b429\b", text) is not None or "RESOURCE_EXHAUSTED" in text
+    if not limited:
+        return None
+
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        try:
+            return float(headers["retry-after"])
+        except (KeyError, TypeError, ValueError):
+            pass
+    for pattern in _RETRY_HINTS:
+        match = pattern.search(text)
+        if match:
+            return float(match.group(1)) + 1  # Small buffer past the provider's estimate
+    return DEFAULT_RATE_LIMIT_DELAY
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    True if the same request may succeed when sent again: rate limits,
+    timeouts, dropped connections and 5xx. A 4xx (other than 408/429) or a
+    malformed response means the request itself was rejected.
+    """
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if rate_limit_delay(error) is not None:
+        return True
+    if isinstance(error, (ValueError, TypeError)):
+        return False
+
+    code = getattr(error, "code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if not isinstance(code, int):
+        match = re.search(r"\b([45]\d\d)\b", str(error))
+        if not match:
+            # Unknown failure: retrying the batch is cheaper than splitting it
+            return True
+        code = int(match.group(1))
+    return code >= 500 or code == 408
+
+
+class TokenBucket:
+    """
+    Continuously refilling budget of `per_minute` units, with up to one
+    minute's worth available as a burst. `per_minute <= 0` means unlimited.
+    The level may go negative when actual usage exceeds what was reserved.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self):
+        now = time.monotonic()
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60.0)
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (a request bigger than the bucket waits for a full one)."""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        needed = min(amount, self.capacity)
+        return max(0.0, (needed - self.level) * 60.0 / self.capacity)
+
+    def take(self, amount: float):
+        if not self.unlimited:
+            self._refill()
+            self.level = min(self.capacity, self.level - amount)
+
+    def available(self) -> float:
+        self._refill()
+        return self.level
+
+
+class ProviderLimiter:
+    """
+    Client-side requests-per-minute and tokens-per-minute budgets for one
+    kind of provider call, shared by everything in the process.
+    Callers wait in priority order (then arrival order) until both budgets
+    cover them, so bursts are paced before they turn into 429s. A 429 that
+    still gets through can `pause()` every caller at once.
+    """
+
+    def __init__(self, name: str, rpm: int, tpm: int):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._queue: List[list] = []  # heap of [priority, seq]
+        self._seq = itertools.count()
+        self._waiters: List[asyncio.Future] = []
+        self._paused_until = 0.0
+
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.pauses = 0
+
+    async def acquire(self, tokens: int = 0, priority: Optional[int] = None) -> float:
+        """Waits for one request and `tokens` tokens of budget. Returns seconds waited."""
+        if priority is None:
+            priority = _current_priority.get()
+        entry = [priority, next(self._seq)]
+        heapq.heappush(self._queue, entry)
+        start = time.monotonic()
+
+        try:
+            while True:
+                if self._queue[0] is entry:
+                    delay = max(
+                        self._paused_until - time.monotonic(),
+                        self.requests.delay(1),
+                        self.tokens.delay(tokens)
+                    )
+                    if delay <= 0:
+                        heapq.heappop(self._queue)
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        break
+                    await self._wait(delay)
+                else:
+                    await self._wait(None)
+        finally:
+            if entry in self._queue:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+            # The next caller in line may be able to go now
+            self._notify()
+
+        waited = time.monotonic() - start
+        self.acquired += 1
+        if waited > 0.001:
+            self.waited += 1
+            self.wait_seconds += waited
+        return waited
+
+    def settle(self, tokens: int):
+        """Charges tokens that were not known at acquire time (e.g. the response)."""
+        self.tokens.take(tokens)
+
+    def pause(self, seconds: float):
+        """Holds every caller back, e.g. after the provider returned 429."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self.pauses += 1
+
+    async def _wait(self, timeout: Optional[float]):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait([future], timeout=timeout)
+        finally:
+            if future in self._waiters:
+                self._waiters.remove(future)
+
+    def _notify(self):
+        waiters, self._waiters = self._waiters, []
+        for future in waiters:
+            if not future.done():
+                future.set_result(None)
+
+    def stats(self) -> Dict:
+        def usage(bucket: TokenBucket) -> Dict:
+            if bucket.unlimited:
+                return {"limit_per_minute": None}
+            available = bucket.available()
+            return {
+                "limit_per_minute": bucket.capacity,
+                "available": round(available, 1),
+                "utilization": round(1 - max(available, 0) / bucket.capacity, 3),
+            }
+
+        return {
+            "requests": usage(self.requests),
+            "tokens": usage(self.tokens),
+            "queued": len(self._queue),
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "paused_for_seconds": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            "pauses": self.pauses,
+        }
+
+
+# Shared by every LLM / embedding call in the process
+generation_limiter = ProviderLimiter("generation", rpm=settings.LLM_RPM, tpm=settings.LLM_TPM)
+embedding_limiter = ProviderLimiter("embedding", rpm=settings.EMBED_RPM, tpm=settings.EMBED_TPM)
@@ -0,0 +1,122 @@
+import asyncio
+from typing import Any, List, Optional, Sequence
+from urllib.parse import urlparse
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server."""
+
+
+class RespClient:
+    """
+    Minimal asyncio client for the Redis serialization protocol (RESP2).
+    Speaks to Redis, Valkey, KeyDB or any local stand-in without an extra
+    dependency. Commands are sent on one connection, one at a time; the
+    connection is opened lazily and reopened after a failure.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.timeout = timeout
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        if self.password:
+            await self._roundtrip("AUTH", self.password)
+        if self.db:
+            await self._roundtrip("SELECT", self.db)
+
+    async def execute(self, *args: Any) -> Any:
+        reply = (await self.pipeline(args))[0]
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    async def pipeline(self, *commands: Sequence[Any]) -> List[Any]:
+        """
+        Sends several commands in one write and reads their replies in order.
+        An error reply is returned in place (as RespError) rather than raised.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    await self._connect()
+                return await asyncio.wait_for(self._send(commands), self.timeout)
+            except BaseException:
+                # Failed, timed out or cancelled mid-flight: replies may still be
+                # unread, so the connection can't be reused for the next command
+                self._abort()
+                raise
+
+    async def _send(self, commands) -> List[Any]:
+        self._writer.write(b"".join(encode_command(args) for args in commands))
+        await self._writer.drain()
+        replies = []
+        for _ in commands:
+            try:
+                replies.append(await read_reply(self._reader))
+            except RespError as e:
+                replies.append(e)
+        return replies
+
+    async def _roundtrip(self, *args: Any) -> Any:
+        reply = (await self._send([args]))[0]
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def _abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+        self._reader = self._writer = None
+
+
+def encode_command(args) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+        parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    line = (await reader.readuntil(b"\r\n"))[:-2]
+    kind, payload = line[:1], line[1:]
+    if kind == b"+":
+        return payload.decode("utf-8")
+    if kind == b"-":
+        raise RespError(payload.decode("utf-8"))
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        count = int(payload)
+        if count < 0:
+            return None
+        return [await read_reply(reader) for _ in range(count)]
+    raise RespError(f"Unexpected reply type: {line!r}")
@@ -1,15 +1,32 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from app.api.routes import router as api_router
 from app.core.config import settings
+from app.core.llm import llm_client
+from app.services.rag import rag_service
 import os
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the BM25 index in the background (off the event loop) so the first search doesn't pay for it
+    warmup = None
+    if settings.RETRIEVAL_MODE != "dense":
+        warmup = asyncio.create_task(rag_service.ensure_lexical_index())
+    yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+    # Close pooled provider connections
+    await llm_client.aclose()
+
 app = FastAPI(
     title="Autonomous Research Assistant",
     description="Agentic AI Researcher with RAG and FastAPI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # ---------------- CORS ----------------
@@ -0,0 +1,81 @@
+from typing import Callable, List, Tuple
+import numpy as np
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index over L2-normalized rows.
+    Spherical k-means splits the rows into ~sqrt(n) lists; a query scans only
+    the `nprobe` lists whose centroids are closest to it. Row vectors are not
+    kept here: the caller assigns them with `add` and scores candidates itself.
+    New rows are appended to their nearest list without retraining.
+    """
+
+    TRAIN_ITERATIONS = 10
+    TRAIN_SAMPLES_PER_LIST = 64
+    ASSIGN_CHUNK = 8192
+
+    def __init__(self, sample: np.ndarray, n_lists: int, trained_size: int, nprobe: int = 10, seed: int = 0):
+        self.nprobe = nprobe
+        self.trained_size = trained_size
+        self.centroids = self._train(sample, min(n_lists, len(sample)), np.random.default_rng(seed))
+        self.lists: List[np.ndarray] = [np.empty(0, dtype=np.int64) for _ in range(len(self.centroids))]
+
+    @staticmethod
+    def lists_for(n_rows: int) -> int:
+        return max(1, int(np.sqrt(n_rows)))
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def _train(self, sample: np.ndarray, n_lists: int, rng: np.random.Generator) -> np.ndarray:
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+        for _ in range(self.TRAIN_ITERATIONS):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=n_lists)
+            # Empty lists keep their previous centroid
+            filled = counts > 0
+            centroids[filled] = sums[filled]
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1e-10
+            centroids /= norms
+
+        return centroids
+
+    def add(self, rows: np.ndarray, start: int):
+        """Assigns rows (already normalized) whose matrix indexes begin at `start`."""
+        for offset in range(0, len(rows), self.ASSIGN_CHUNK):
+            chunk = rows[offset:offset + self.ASSIGN_CHUNK]
+            assign = np.argmax(chunk @ self.centroids.T, axis=1)
+            ids = np.arange(start + offset, start + offset + len(chunk))
+            order = np.argsort(assign, kind="stable")
+            assign, ids = assign[order], ids[order]
+            bounds = np.flatnonzero(np.diff(assign)) + 1
+            for group in np.split(np.arange(len(ids)), bounds):
+                list_no = assign[group[0]]
+                self.lists[list_no] = np.concatenate([self.lists[list_no], ids[group]])
+
+    def search(self, score: Callable[[np.ndarray], np.ndarray], q: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """
+        Returns up to k (row, score) pairs, best first.
+        `q` must be normalized; `score` maps candidate row indexes to scores.
+        """
+        nprobe = min(self.nprobe, self.n_lists)
+        probe = np.argpartition(self.centroids @ q, -nprobe)[-nprobe:]
+        candidates = np.concatenate([self.lists[i] for i in probe])
+        if len(candidates) == 0:
+            return []
+
+        scores = score(candidates)
+        k = min(k, len(candidates))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(int(candidates[i]), float(scores[i])) for i in top]
+
+    @property
+    def nbytes(self) -> int:
+        return self.centroids.nbytes + sum(ids.nbytes for ids in self.lists)
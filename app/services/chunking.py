@@ -0,0 +1,62 @@
+"""
+CPU-bound read + extract + split stage of ingestion.
+
+Kept free of heavy imports (Chroma, Gemini) so that process-pool workers
+only load what they need.
+"""
+import hashlib
+import logging
+import os
+from functools import lru_cache
+from typing import Dict, Optional
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.services.ingest_manifest import chunk_id
+
+logger = logging.getLogger("uvicorn")
+
+
+@lru_cache(maxsize=None)
+def get_text_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """One splitter per (size, overlap), reused across calls in the same process."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+
+def prepare_file(file_path: str, rel_path: str, entry: Optional[Dict],
+                 chunk_size: int, chunk_overlap: int) -> Optional[Dict]:
+    """
+    Reads and splits one file. Returns None if it can't be read, or a work
+    item whose "chunks" is None if its content hash matches the manifest entry.
+    Runs in a worker process, so everything in and out must be picklable.
+    """
+    try:
+        stat = os.stat(file_path)
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+    except Exception as e:
+        logger.error(f"Failed to read {file_path}: {e}")
+        return None
+
+    work = {
+        "rel_path": rel_path,
+        "source": os.path.basename(file_path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "hash": hashlib.sha256(raw).hexdigest(),
+        "old_ids": set(entry["chunk_ids"]) if entry else set(),
+        "chunks": None
+    }
+    if entry and entry["hash"] == work["hash"]:
+        return work
+
+    text = raw.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+    chunks = {}
+    for chunk in get_text_splitter(chunk_size, chunk_overlap).split_text(text):
+        chunks.setdefault(chunk_id(rel_path, chunk), chunk)
+    work["chunks"] = chunks
+    return work
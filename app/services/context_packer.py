@@ -0,0 +1,155 @@
+"""
+Packs retrieved chunks into a prompt context under a token budget.
+
+Retrieval returns chunks that were split with overlap, so neighbours from
+the same document repeat each other's edges (and the same chunk can come
+back for several queries). Packing turns them into fewer, non-redundant
+blocks before they are sent to the LLM.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from app.core.rate_limit import estimate_tokens
+
+# Sentence / line boundaries, kept as separate items so text can be re-joined as-is
+_SPAN_SPLIT = re.compile(r"((?<=[.!?])\s+|\n+)")
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def overlap_length(left: str, right: str, min_overlap: int) -> int:
+    """
+    Length of the longest suffix of `left` that is also a prefix of
+    `right`, or 0 if it is shorter than `min_overlap`.
+    """
+    if min_overlap <= 0 or len(left) < min_overlap or len(right) < min_overlap:
+        return 0
+    probe = right[:min_overlap]
+    start = max(0, len(left) - len(right))
+    while True:
+        # Earliest match = longest overlap
+        position = left.find(probe, start)
+        if position < 0:
+            return 0
+        if right.startswith(left[position:]):
+            return len(left) - position
+        start = position + 1
+
+
+def _merge_blocks(blocks: List[Dict], min_overlap: int, sources: bool) -> List[Dict]:
+    """Merges contained and edge-overlapping blocks until nothing changes."""
+    merged = True
+    while merged:
+        merged = False
+        for a in blocks:
+            for b in blocks:
+                if a is b or (sources and a["source"] != b["source"]):
+                    continue
+                if b["text"] in a["text"]:
+                    text = a["text"]
+                else:
+                    k = overlap_length(a["text"], b["text"], min_overlap)
+                    if not k:
+                        continue
+                    text = a["text"] + b["text"][k:]
+                a["text"] = text
+                a["rank"] = min(a["rank"], b["rank"])
+                blocks.remove(b)
+                merged = True
+                break
+            if merged:
+                break
+    return blocks
+
+
+def _drop_seen_spans(text: str, seen: set, min_span: int) -> str:
+    """Removes sentences/lines already emitted in a more relevant block."""
+    parts = _SPAN_SPLIT.split(text)
+    kept = []
+    for i in range(0, len(parts), 2):
+        span = parts[i]
+        separator = parts[i + 1] if i + 1 < len(parts) else ""
+        key = _normalize(span)
+        if len(key) >= min_span:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(span + separator)
+    return "".join(kept).strip()
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    # Prefer ending on a sentence, then on a word
+    boundary = max(cut.rfind(". "), cut.rfind("\n"))
+    if boundary < max_chars // 2:
+        boundary = cut.rfind(" ")
+    return cut[:boundary + 1].rstrip() + " ..." if boundary > 0 else cut
+
+
+def pack_context(chunks: List[str], max_tokens: int, min_overlap: int = 50, min_span: int = 40,
+                 sources: Optional[List[str]] = None) -> Tuple[List[str], Dict]:
+    """
+    Packs `chunks` (most relevant first) into blocks that fit `max_tokens`.
+
+    - exact and contained duplicates are dropped;
+    - chunks whose edges overlap by at least `min_overlap` characters are
+      merged into one block (only within the same source, if `sources`
+      is given);
+    - sentences of `min_span`+ characters already present in a more
+      relevant block are removed;
+    - blocks are added in relevance order (a block ranks as its best chunk)
+      until the budget is spent; the block that crosses it is truncated.
+
+    `max_tokens <= 0` means no budget. Returns (blocks, stats). Stats are
+    estimated tokens: `tokens_saved` is what merging and deduplication
+    removed (nothing lost), `tokens_truncated` is what the budget then cut
+    (content the LLM doesn't see).
+    """
+    tokens_before = sum(estimate_tokens(chunk) for chunk in chunks)
+    blocks = []
+    for rank, chunk in enumerate(chunks):
+        text = chunk.strip()
+        if text:
+            blocks.append({
+                "text": text,
+                "rank": rank,
+                "source": sources[rank] if sources is not None else None,
+            })
+
+    blocks = _merge_blocks(blocks, min_overlap, sources is not None)
+    blocks.sort(key=lambda block: block["rank"])
+
+    seen_spans = set()
+    deduped = [_drop_seen_spans(block["text"], seen_spans, min_span) for block in blocks]
+    deduped = [text for text in deduped if text]
+    tokens_deduped = sum(estimate_tokens(text) for text in deduped)
+
+    packed = []
+    remaining = max_tokens
+    truncated = False
+    for text in deduped:
+        tokens = estimate_tokens(text)
+        if max_tokens > 0 and tokens > remaining:
+            if remaining >= 50:
+                packed.append(_truncate(text, remaining))
+            truncated = True
+            break
+        packed.append(text)
+        remaining -= tokens
+
+    tokens_after = sum(estimate_tokens(block) for block in packed)
+    return packed, {
+        "chunks": len(chunks),
+        "blocks": len(packed),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_deduped,
+        "tokens_truncated": tokens_deduped - tokens_after,
+        "truncated": truncated,
+    }
@@ -1,14 +1,20 @@
 import os
+import json
+import asyncio
+import time
 import uuid
 import logging
 from typing import Dict, List, Optional
 from fastapi import UploadFile
 import google.generativeai as genai
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-import numpy as np
 
 from app.core.config import settings
+from app.core.memory_budget import BudgetedLRU
 from app.services.vector_db import vector_db
+from app.services.embeddings import embedding_service
+from app.services.session_index import SessionIndex
+from app.services.session_store import PersistentSessionIndex
 
 logger = logging.getLogger("uvicorn")
 
@@ -23,48 +29,215 @@ class DocumentManager:
             genai.configure(api_key=settings.GEMINI_API_KEY)
         
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
+            chunk_size=settings.CHUNK_SIZE,
+            chunk_overlap=settings.CHUNK_OVERLAP,
             separators=["\n\n", "\n", " ", ""]
         )
         
         # Session storage: session_id -> {vector_db, documents}
-        self.sessions: Dict[str, Dict] = {}
+        # Idle sessions expire, and LRU sessions are evicted past the memory budget
+        self.sessions = BudgetedLRU(
+            name="sessions",
+            max_bytes=settings.SESSION_MEMORY_BUDGET_MB * 1024 * 1024,
+            ttl=settings.SESSION_TTL_SECONDS,
+            sizeof=self._session_size,
+            on_evict=self._on_session_evicted
+        )
+        
+        # Background IVF trainings (referenced so they aren't garbage-collected)
+        self._ann_builds = set()
         
         # Ensure upload directory exists
         self.upload_dir = os.path.join(settings.DATA_DIR, "uploads")
         os.makedirs(self.upload_dir, exist_ok=True)
+        
+        # Durable sessions survive restarts; drop the ones that expired while we were down
+        if settings.SESSION_PERSIST:
+            self._purge_expired_sessions()
     
-    def _create_session_vector_db(self, session_id: str):
+    @staticmethod
+    def _session_size(session: Dict) -> int:
+        """Approximate bytes held by a session: vector matrix plus chunk text."""
+        vdb: SessionIndex = session["vector_db"]
+        return vdb.nbytes + sum(len(m["text"]) for m in vdb.metadata)
+
+    def _on_session_evicted(self, session_id: str, session: Dict):
+        if isinstance(session["vector_db"], PersistentSessionIndex) and not self._session_expired(session_id):
+            # Still live on disk (maybe in another worker): the maps go away with the last reference
+            logger.info(f"Unloading session {session_id} ({len(session['documents'])} documents)")
+            return
+        logger.info(f"Evicting session {session_id} ({len(session['documents'])} documents)")
+        self._delete_session_files(session_id, session)
+
+    def _delete_session_files(self, session_id: str, session: Dict):
+        session["vector_db"].drop()
+        for filename in session["documents"]:
+            file_path = os.path.join(self.upload_dir, f"{session_id}_{filename}")
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                    logger.info(f"Deleted file: {file_path}")
+            except Exception as e:
+                logger.error(f"Error deleting file {file_path}: {e}")
+
+    def _create_session_vector_db(self, session_id: str) -> SessionIndex:
         """Create a new vector database for a session."""
-        # Replacing FAISS with simple in-memory list for transient session storage
-        return {"vectors": [], "metadata": []}
-    
-    def _get_embedding(self, text: str) -> List[float]:
-        """Get embedding for text using Gemini."""
-        try:
-            result = genai.embed_content(
-                model="models/text-embedding-004",
-                content=text,
-                task_type="retrieval_document"
+        # Contiguous matrix (float32, float16 or int8 codes), normalized on insert.
+        # Compact rows are re-ranked from a full-precision file next to the uploads.
+        # Large sessions switch to an IVF index for approximate search.
+        # SESSION_RESCORE_FACTOR=0 turns rescoring (and the full-precision file) off.
+        options = self._index_options()
+        rescore = settings.SESSION_RESCORE_FACTOR > 0
+        if settings.SESSION_PERSIST:
+            # Memory-mapped files under uploads/<session_id>/, reloaded after a restart
+            return PersistentSessionIndex.create(
+                self._session_dir(session_id), dtype=settings.SESSION_VECTOR_DTYPE, rescore=rescore, **options
             )
-            return result['embedding']
-        except Exception as e:
-            logger.error(f"Embedding failed: {e}")
-            return []
-    
-    def _get_query_embedding(self, text: str) -> List[float]:
-        """Get query embedding."""
+        
+        rescore_path = None
+        if rescore:
+            rescore_path = os.path.join(self.upload_dir, f"{session_id}.vectors.f32")
+        return SessionIndex(dtype=settings.SESSION_VECTOR_DTYPE, rescore_path=rescore_path, **options)
+
+    @staticmethod
+    def _index_options() -> Dict:
+        return {
+            "ann_min_size": settings.ANN_MIN_VECTORS,
+            "nprobe": settings.ANN_NPROBE,
+            "recall_sample_every": settings.ANN_RECALL_SAMPLE_EVERY,
+            "rescore_factor": max(settings.SESSION_RESCORE_FACTOR, 1)
+        }
+
+    def _session_dir(self, session_id: str) -> str:
+        return os.path.join(self.upload_dir, session_id)
+
+    @staticmethod
+    def _valid_session_id(session_id: Optional[str]) -> bool:
+        # Session ids become directory names, so only accept our own UUIDs
         try:
-            result = genai.embed_content(
-                model="models/text-embedding-004",
-                content=text,
-                task_type="retrieval_query"
-            )
-            return result['embedding']
+            return bool(session_id) and str(uuid.UUID(session_id)) == session_id
+        except ValueError:
+            return False
+
+    def _write_session_info(self, session_id: str, session: Dict):
+        """Atomically records the document list (its mtime doubles as last access)."""
+        path = os.path.join(self._session_dir(session_id), "session.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"documents": session["documents"]}, f)
+        os.replace(path + ".tmp", path)
+
+    def _session_expired(self, session_id: str) -> bool:
+        path = os.path.join(self._session_dir(session_id), "session.json")
+        try:
+            return time.time() - os.path.getmtime(path) > settings.SESSION_TTL_SECONDS
+        except OSError:
+            return True
+
+    def _load_session(self, session_id: str) -> Optional[Dict]:
+        """Maps a session persisted by an earlier run (or another worker)."""
+        if self._session_expired(session_id):
+            return None
+        vdb = PersistentSessionIndex.open(self._session_dir(session_id), **self._index_options())
+        if vdb is None:
+            return None
+        session = {"vector_db": vdb, "documents": []}
+        self._reload_documents(session_id, session)
+        logger.info(f"Loaded session {session_id} from disk ({len(vdb)} vectors)")
+        return session
+
+    def _reload_documents(self, session_id: str, session: Dict):
+        try:
+            with open(os.path.join(self._session_dir(session_id), "session.json"), encoding="utf-8") as f:
+                session["documents"] = json.load(f)["documents"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _purge_expired_sessions(self):
+        for name in os.listdir(self.upload_dir):
+            if not os.path.isdir(self._session_dir(name)) or not self._valid_session_id(name):
+                continue
+            if self._session_expired(name):
+                session = {"vector_db": PersistentSessionIndex(self._session_dir(name)), "documents": []}
+                self._reload_documents(name, session)
+                logger.info(f"Removing expired session {name}")
+                self._delete_session_files(name, session)
+
+    def _build_ann_in_background(self, session_id: str, vdb: SessionIndex):
+        """Trains the session's IVF index in a worker thread; searches stay exact until it is ready."""
+        if not vdb.ann_pending:
+            return
+        task = asyncio.create_task(self._build_ann(session_id, vdb))
+        self._ann_builds.add(task)
+        task.add_done_callback(self._ann_builds.discard)
+
+    async def _build_ann(self, session_id: str, vdb: SessionIndex):
+        try:
+            start = time.perf_counter()
+            if await asyncio.to_thread(vdb.build_ann):
+                logger.info(f"Built ANN index for session {session_id} ({len(vdb)} vectors, "
+                            f"{time.perf_counter() - start:.1f}s)")
+                # The lists count against the memory budget too
+                self.sessions.touch(session_id)
         except Exception as e:
-            logger.error(f"Query embedding failed: {e}")
-            return []
+            logger.error(f"ANN build failed for session {session_id}: {e}")
+
+    async def get_session(self, session_id: Optional[str]) -> Optional[Dict]:
+        """
+        Returns the session, loading it from disk if this process hasn't seen
+        it yet, and picking up documents other workers added since.
+        The file I/O (locks, maps, metadata replay) runs in a worker thread.
+        """
+        if not self._valid_session_id(session_id):
+            return None
+        
+        session = self.sessions.get(session_id)
+        if session is None and settings.SESSION_PERSIST:
+            session = await asyncio.to_thread(self._load_session, session_id)
+            if session is not None:
+                # Another request may have loaded it while we were reading
+                session = self.sessions.get(session_id) or session
+                self.sessions[session_id] = session
+        if session is None:
+            return None
+        
+        if isinstance(session["vector_db"], PersistentSessionIndex):
+            if await asyncio.to_thread(self._refresh_session, session_id, session):
+                self.sessions.touch(session_id)
+        return session
+
+    def _refresh_session(self, session_id: str, session: Dict) -> bool:
+        """Maps rows other workers appended; returns True if the session grew."""
+        changed = session["vector_db"].refresh()
+        if changed:
+            self._reload_documents(session_id, session)
+        # Mark as used for every worker (and for the next restart)
+        try:
+            os.utime(os.path.join(self._session_dir(session_id), "session.json"))
+        except OSError:
+            pass
+        return changed
+
+    @staticmethod
+    def _write_file(path: str, content: bytes):
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def _new_session(self, session_id: str) -> Dict:
+        session = {
+            "vector_db": self._create_session_vector_db(session_id),
+            "documents": []
+        }
+        if settings.SESSION_PERSIST:
+            self._write_session_info(session_id, session)
+        return session
+
+    def _save_documents(self, session_id: str, session: Dict):
+        with session["vector_db"].lock():
+            # Merge with documents another worker may have added meanwhile
+            documents = session["documents"]
+            self._reload_documents(session_id, session)
+            session["documents"] += [d for d in documents if d not in session["documents"]]
+            self._write_session_info(session_id, session)
     
     async def upload_documents(self, files: List[UploadFile], session_id: Optional[str] = None) -> tuple[str, List[str]]:
         """
@@ -72,14 +245,12 @@ class DocumentManager:
         Returns (session_id, list of uploaded filenames)
         """
         # Create or get session
-        if not session_id or session_id not in self.sessions:
+        session = await self.get_session(session_id)
+        if session is None:
             session_id = str(uuid.uuid4())
-            self.sessions[session_id] = {
-                "vector_db": self._create_session_vector_db(session_id),
-                "documents": []
-            }
+            session = await asyncio.to_thread(self._new_session, session_id)
+            self.sessions[session_id] = session
         
-        session = self.sessions[session_id]
         uploaded_files = []
         
         # Process each file
@@ -98,8 +269,7 @@ class DocumentManager:
                 file_path = os.path.join(self.upload_dir, f"{session_id}_{file.filename}")
                 content = await file.read()
                 
-                with open(file_path, 'wb') as f:
-                    f.write(content)
+                await asyncio.to_thread(self._write_file, file_path, content)
                 
                 # Read text content
                 if ext == '.pdf':
@@ -122,20 +292,24 @@ class DocumentManager:
                 vectors_to_add = []
                 metadata_to_add = []
                 
-                for chunk in chunks:
-                    embedding = self._get_embedding(chunk)
+                embeddings = await embedding_service.embed_documents(chunks)
+                for chunk, embedding in zip(chunks, embeddings):
                     if embedding:
                         vectors_to_add.append(embedding)
                         metadata_to_add.append({
                             "text": chunk,
                             "source": file.filename
                         })
-                
-                # Add to session vector DB
+
+                if chunks and not vectors_to_add:
+                    # Don't report a file as uploaded when none of it is searchable
+                    raise RuntimeError(f"none of its {len(chunks)} chunks could be embedded")
+                if len(vectors_to_add) < len(chunks):
+                    logger.warning(f"{file.filename}: {len(chunks) - len(vectors_to_add)} of {len(chunks)} chunks could not be embedded")
+
+                # Add to session vector DB (file lock and flushes when persistent)
                 if vectors_to_add:
-                    vdb = session["vector_db"]
-                    vdb["vectors"].extend(vectors_to_add)
-                    vdb["metadata"].extend(metadata_to_add)
+                    await asyncio.to_thread(session["vector_db"].add, vectors_to_add, metadata_to_add)
                 
                 session["documents"].append(file.filename)
                 uploaded_files.append(file.filename)
@@ -146,99 +320,80 @@ class DocumentManager:
                 logger.error(f"Error processing {file.filename}: {e}")
                 continue
         
+        if isinstance(session["vector_db"], PersistentSessionIndex):
+            await asyncio.to_thread(self._save_documents, session_id, session)
+        
+        # Re-measure against the memory budget now that the session has grown
+        self.sessions.touch(session_id)
+        self._build_ann_in_background(session_id, session["vector_db"])
+        
         return session_id, uploaded_files
     
-    async def search_documents(self, session_id: str, query: str, k: int = 5) -> tuple[List[str], List[str]]:
+    async def search_documents(self, session_id: str, query: str, k: int = 5,
+                               session: Optional[Dict] = None) -> tuple[List[str], List[str]]:
         """
         Search documents in a session.
+        Pass `session` if the caller already loaded it with get_session().
         Returns (list of text chunks, list of source filenames)
         """
-        if session_id not in self.sessions:
+        if session is None:
+            session = await self.get_session(session_id)
+        if session is None:
             return [], []
         
-        session = self.sessions[session_id]
-        vdb = session["vector_db"]
-        
-        vectors = vdb["vectors"]
-        if not vectors:
+        vdb: SessionIndex = session["vector_db"]
+        if not len(vdb):
             return [], []
+        # Rows other workers added may have made a (re)training due
+        self._build_ann_in_background(session_id, vdb)
         
         # Get query embedding
-        query_vector = self._get_query_embedding(query)
+        query_vector = await embedding_service.embed_query(query)
         if not query_vector:
             return [], []
         
-        # Simple Cosine Similarity using Numpy
-        # 1. Convert to numpy arrays
-        vecs = np.array(vectors)
-        q = np.array(query_vector)
-        
-        # 2. Normalize (Gemini embeddings are usually normalized, but safe to do)
-        vecs_norm = np.linalg.norm(vecs, axis=1)
-        q_norm = np.linalg.norm(q)
-        
-        # Avoid division by zero
-        vecs_norm[vecs_norm == 0] = 1e-10
-        if q_norm == 0:
-            q_norm = 1e-10
-            
-        # 3. Calculate Sim
-        # Dot product
-        dot_product = np.dot(vecs, q)
-        # Cosine sim
-        similarities = dot_product / (vecs_norm * q_norm)
-        
-        # 4. Get top k
-        # argsort returns indices of sorted from low to high, so we reverse
-        top_indices = np.argsort(similarities)[-k:][::-1]
+        # Cosine similarity against pre-normalized rows (exact, or IVF for large sessions)
+        top = vdb.search(query_vector, k)
         
         results = []
         sources = set()
         
-        for idx in top_indices:
-            # We must ensure we don't go out of bounds if k > len
-            if idx < len(vdb["metadata"]):
-                item = vdb["metadata"][idx]
-                results.append(item["text"])
-                sources.add(item["source"])
+        for idx, _score in top:
+            item = vdb.metadata[idx]
+            results.append(item["text"])
+            sources.add(item["source"])
         
         return results, list(sources)
     
-    def get_session_info(self, session_id: str) -> Optional[Dict]:
+    async def get_session_info(self, session_id: str) -> Optional[Dict]:
         """Get information about a session."""
-        if session_id not in self.sessions:
+        session = await self.get_session(session_id)
+        if session is None:
             return None
         
-        session = self.sessions[session_id]
         return {
             "session_id": session_id,
             "document_count": len(session["documents"]),
             "documents": session["documents"],
-            "vector_count": len(session["vector_db"]["vectors"])
+            "vector_count": len(session["vector_db"]),
+            "vector_dtype": session["vector_db"].dtype,
+            "ann": session["vector_db"].ann_stats()
         }
     
-    def delete_session(self, session_id: str) -> bool:
+    async def delete_session(self, session_id: str) -> bool:
         """
         Delete a session and all its associated data.
         Returns True if deleted, False if session not found.
         """
-        if session_id not in self.sessions:
+        session = await self.get_session(session_id)
+        if session is None:
             return False
         
-        session = self.sessions[session_id]
-        
-        # Delete uploaded files
-        for filename in session["documents"]:
-            file_path = os.path.join(self.upload_dir, f"{session_id}_{filename}")
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Deleted file: {file_path}")
-            except Exception as e:
-                logger.error(f"Error deleting file {file_path}: {e}")
+        # Delete uploaded files (and the persisted index)
+        await asyncio.to_thread(self._delete_session_files, session_id, session)
         
         # Remove session from memory
-        del self.sessions[session_id]
+        self.sessions.pop(session_id)
         
         logger.info(f"Deleted session: {session_id}")
         return True
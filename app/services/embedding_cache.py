@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+
+logger = logging.getLogger("uvicorn")
+
+
+class EmbeddingCache:
+    """
+    On-disk, content-addressed embedding cache backed by SQLite.
+    Entries are keyed by (model, task_type, sha256 of text) and stored as
+    float32 blobs. When the cache grows past `max_entries`, the least
+    recently used entries are evicted.
+
+    Calls block on SQLite, so async callers run them with asyncio.to_thread.
+    The database is opened on first use, not at construction (import time).
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # Callers hold self._lock
+        if self._db is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " vector BLOB NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+            conn.commit()
+            self._db = conn
+        return self._db
+
+    @staticmethod
+    def make_key(model: str, task_type: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}|{task_type}|{digest}"
+
+    def get_many(self, model: str, task_type: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Looks up every text. Returns a list aligned with `texts`; misses are None.
+        """
+        keys = [self.make_key(model, task_type, t) for t in texts]
+        found: Dict[str, bytes] = {}
+
+        with self._lock:
+            # SQLite caps bound parameters, so look up in slices
+            for i in range(0, len(keys), 500):
+                part = list(set(keys[i:i + 500]))
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, k) for k in found]
+                )
+                self._conn.commit()
+
+        results = []
+        for key in keys:
+            blob = found.get(key)
+            if blob is None:
+                self.misses += 1
+                results.append(None)
+            else:
+                self.hits += 1
+                results.append(np.frombuffer(blob, dtype=np.float32).tolist())
+        return results
+
+    def put_many(self, model: str, task_type: str, texts: List[str], vectors: List[List[float]]):
+        """Stores embeddings, then evicts LRU entries if over budget."""
+        if not texts:
+            return
+
+        now = time.time()
+        rows = [
+            (self.make_key(model, task_type, t), np.asarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)", (overflow,)
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+import google.generativeai as genai
+
+from app.core.config import settings
+from app.core.rate_limit import (
+    ProviderLimiter, embedding_limiter, estimate_tokens, is_transient_error, rate_limit_delay
+)
+from app.services.embedding_cache import EmbeddingCache
+
+logger = logging.getLogger("uvicorn")
+
+
+def normalize_query(text: str) -> str:
+    """Repeats that differ only in case or spacing share one query embedding."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+# (texts, task_type) -> one embedding per text, in order
+EmbeddingBackend = Callable[[List[str], str], List[List[float]]]
+
+
+def gemini_backend(texts: List[str], task_type: str) -> List[List[float]]:
+    """
+    Embeds a batch of texts in a single Gemini API call.
+    """
+    result = genai.embed_content(
+        model=settings.EMBEDDING_MODEL,
+        content=texts,
+        task_type=task_type
+    )
+    return result['embedding']
+
+
+class EmbeddingService:
+    """
+    Shared embedding client used by ingestion and uploads.
+    Sends texts in batches of `batch_size`, with up to `max_concurrency`
+    batches in flight. A batch that fails transiently (rate limit, timeout,
+    5xx) is resent whole with backoff; a rejected batch is bisected so one
+    bad chunk only loses itself. Texts already in `cache` are never re-sent.
+
+    Query embeddings also go through an in-process LRU of
+    `query_cache_size` entries (persisted to `cache` when
+    `persist_queries`), and concurrent misses for the same query share a
+    single API call. Every API call first takes budget from `limiter`.
+    """
+
+    # First backoff for transient failures without a retry hint (doubles per attempt)
+    RETRY_BASE_DELAY = 1.0
+
+    def __init__(self, backend: EmbeddingBackend = None, batch_size: int = None, max_concurrency: int = None,
+                 cache: Optional[EmbeddingCache] = None, query_cache_size: int = None, persist_queries: bool = False,
+                 limiter: Optional[ProviderLimiter] = None):
+        if backend is None and settings.GEMINI_API_KEY:
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+
+        self.backend = backend or gemini_backend
+        self.model = settings.EMBEDDING_MODEL
+        self.cache = cache
+        self.batch_size = batch_size or settings.EMBED_BATCH_SIZE
+        self.max_concurrency = max_concurrency or settings.EMBED_MAX_CONCURRENCY
+        self.limiter = limiter
+
+        self.query_cache_size = query_cache_size if query_cache_size is not None else settings.QUERY_EMBED_CACHE_SIZE
+        self.persist_queries = persist_queries
+        self._query_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._query_inflight: Dict[str, asyncio.Future] = {}
+        self.query_hits = 0
+        self.query_misses = 0
+        self.query_coalesced = 0
+
+    async def embed_query(self, text: str) -> Optional[List[float]]:
+        """
+        Embeds a search query (task type retrieval_query). Returns None on failure.
+        """
+        return (await self.embed_queries([text]))[0]
+
+    async def embed_queries(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Embeds several search queries, sending all cache misses in one batch.
+        Returns a list aligned with `texts`; failures are None.
+        The normalized query is only the cache key: the model sees the
+        caller's text (casing matters for names and acronyms).
+        """
+        keys = [normalize_query(t) for t in texts]
+        found: Dict[str, Optional[List[float]]] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        owned: Dict[str, asyncio.Future] = {}
+        originals: Dict[str, str] = {}
+
+        for key, text in zip(keys, texts):
+            if not key or key in found or key in waiting or key in owned:
+                continue
+            cached = self._query_cache.get(key)
+            if cached is not None:
+                self._query_cache.move_to_end(key)
+                self.query_hits += 1
+                found[key] = cached
+            elif key in self._query_inflight:
+                self.query_coalesced += 1
+                waiting[key] = self._query_inflight[key]
+            else:
+                self.query_misses += 1
+                originals[key] = text.strip()
+                owned[key] = asyncio.get_running_loop().create_future()
+                self._query_inflight[key] = owned[key]
+
+        if owned:
+            batch = list(owned)
+            batch_texts = [originals[key] for key in batch]
+            fresh: List[Optional[List[float]]] = [None] * len(batch)
+            try:
+                if self.persist_queries and self.cache is not None:
+                    fresh = await self.embed_documents(batch_texts, task_type="retrieval_query")
+                else:
+                    fresh = await self._embed_uncached(batch_texts, "retrieval_query")
+            finally:
+                # Always release waiters, even if we were cancelled
+                for key, embedding in zip(batch, fresh):
+                    del self._query_inflight[key]
+                    owned[key].set_result(embedding)
+                    found[key] = embedding
+                    if embedding is not None and self.query_cache_size > 0:
+                        self._query_cache[key] = embedding
+                while len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
+
+        for key, future in waiting.items():
+            found[key] = await asyncio.shield(future)
+
+        return [found.get(key) for key in keys]
+
+    def query_cache_stats(self) -> Dict:
+        lookups = self.query_hits + self.query_misses + self.query_coalesced
+        return {
+            "entries": len(self._query_cache),
+            "max_entries": self.query_cache_size,
+            "hits": self.query_hits,
+            "misses": self.query_misses,
+            "coalesced": self.query_coalesced,
+            "hit_rate": (self.query_hits + self.query_coalesced) / lookups if lookups else 0.0,
+        }
+
+    async def embed_documents(self, texts: List[str], task_type: str = "retrieval_document") -> List[Optional[List[float]]]:
+        """
+        Embeds all texts. Returns a list aligned with `texts`;
+        entries that could not be embedded are None.
+        """
+        if not texts:
+            return []
+
+        if self.cache is None:
+            return await self._embed_uncached(texts, task_type)
+
+        # SQLite lookups/writes off the event loop
+        embeddings = await asyncio.to_thread(self.cache.get_many, self.model, task_type, texts)
+        missing = [i for i, emb in enumerate(embeddings) if emb is None]
+        if not missing:
+            return embeddings
+
+        fresh = await self._embed_uncached([texts[i] for i in missing], task_type)
+        for i, emb in zip(missing, fresh):
+            embeddings[i] = emb
+
+        done = [i for i, emb in zip(missing, fresh) if emb is not None]
+        await asyncio.to_thread(
+            self.cache.put_many, self.model, task_type, [texts[i] for i in done], [embeddings[i] for i in done]
+        )
+        return embeddings
+
+    async def _embed_uncached(self, texts: List[str], task_type: str) -> List[Optional[List[float]]]:
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+        async def run_batch(batch: List[str]) -> List[Optional[List[float]]]:
+            async with semaphore:
+                return await self._embed_batch(batch, task_type)
+
+        results = await asyncio.gather(*[run_batch(b) for b in batches])
+        return [emb for batch in results for emb in batch]
+
+    async def _embed_batch(self, batch: List[str], task_type: str) -> List[Optional[List[float]]]:
+        max_retries = max(1, settings.MAX_RETRIES)
+        for attempt in range(max_retries):
+            try:
+                if self.limiter is not None:
+                    await self.limiter.acquire(sum(estimate_tokens(t) for t in batch))
+                embeddings = await asyncio.to_thread(self.backend, batch, task_type)
+                if len(embeddings) != len(batch):
+                    raise ValueError(f"Expected {len(batch)} embeddings, got {len(embeddings)}")
+                return embeddings
+            except Exception as e:
+                if not is_transient_error(e):
+                    error = e
+                    break
+                if attempt == max_retries - 1:
+                    logger.error(f"Embedding batch failed after {max_retries} attempts ({len(batch)} chunks): {e}")
+                    return [None] * len(batch)
+
+                # Splitting would only multiply calls that fail the same way: back off and resend
+                delay = rate_limit_delay(e)
+                if delay is not None and self.limiter is not None:
+                    logger.warning(f"Embedding rate limited. Retrying in {delay:.0f} seconds (attempt {attempt + 1}/{max_retries})...")
+                    # Pauses every embedding caller; the retry waits in acquire()
+                    self.limiter.pause(delay)
+                else:
+                    delay = delay if delay is not None else self.RETRY_BASE_DELAY * 2 ** attempt
+                    logger.warning(f"Embedding batch failed ({e}). Retrying in {delay:.1f} seconds (attempt {attempt + 1}/{max_retries})...")
+                    await asyncio.sleep(delay)
+
+        if len(batch) == 1:
+            logger.error(f"Embedding failed: {error}")
+            return [None]
+
+        # Rejected content: bisect to isolate the bad chunks in O(log n) calls each
+        logger.warning(f"Batch embedding rejected ({len(batch)} chunks), splitting: {error}")
+        middle = len(batch) // 2
+        return await self._embed_batch(batch[:middle], task_type) + await self._embed_batch(batch[middle:], task_type)
+
+
+# Singleton
+embedding_service = EmbeddingService(
+    cache=EmbeddingCache(settings.EMBED_CACHE_PATH, settings.EMBED_CACHE_MAX_ENTRIES)
+    if settings.EMBED_CACHE_ENABLED else None,
+    persist_queries=settings.QUERY_EMBED_CACHE_PERSIST,
+    limiter=embedding_limiter
+)
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("uvicorn")
+
+
+def chunk_id(rel_path: str, text: str) -> str:
+    """Stable, content-derived id for a chunk of a given file."""
+    return hashlib.sha256(f"{rel_path}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+
+class IngestManifest:
+    """
+    Records what has been ingested from data/raw:
+    relative path -> {size, mtime, hash, chunk_ids}.
+    Lets ingestion skip unchanged files, diff changed ones and delete
+    the vectors of removed ones.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.files = json.load(f).get("files", {})
+        except Exception as e:
+            # A corrupt manifest only costs a full re-embed (ids are content-derived)
+            logger.error(f"Failed to read ingest manifest {self.path}: {e}")
+            self.files = {}
+
+    def save(self):
+        """Atomically writes the manifest to disk."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": 1, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, rel_path: str) -> Optional[Dict]:
+        return self.files.get(rel_path)
+
+    def set(self, rel_path: str, size: int, mtime: float, content_hash: str, chunk_ids: List[str]):
+        self.files[rel_path] = {
+            "size": size,
+            "mtime": mtime,
+            "hash": content_hash,
+            "chunk_ids": chunk_ids
+        }
+
+    def remove(self, rel_path: str) -> List[str]:
+        """Drops a file and returns the chunk ids it owned."""
+        entry = self.files.pop(rel_path, None)
+        return entry["chunk_ids"] if entry else []
@@ -0,0 +1,102 @@
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens. No stemming, so names and codes match exactly."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    In-process inverted index with Okapi BM25 scoring.
+    Documents are added and removed by id, so the index can follow the
+    vector DB incrementally. Only term statistics are kept here; chunk
+    text stays in the vector DB.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> {doc_id: term frequency}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        # doc_id -> distinct terms (needed to remove a document)
+        self.doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_lengths
+
+    def add(self, doc_id: str, text: str):
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.doc_terms[doc_id] = tuple(counts)
+        length = sum(counts.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+
+    def remove(self, doc_id: str):
+        if doc_id not in self.doc_lengths:
+            return
+        for term in self.doc_terms.pop(doc_id):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def scan_size(self, query: str) -> int:
+        """Number of postings search(query) walks; common words make this large."""
+        return sum(len(self.postings.get(term, ())) for term in set(tokenize(query)))
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Returns up to k (doc_id, BM25 score) pairs, best first.
+        Safe to call from a worker thread while the index is being updated.
+        """
+        n_docs = len(self.doc_lengths)
+        if n_docs == 0:
+            return []
+
+        avg_len = self.total_length / n_docs
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            # Snapshot the postings (a single C-level copy) in case a writer changes them
+            for doc_id, tf in list(docs.items()):
+                length = self.doc_lengths.get(doc_id)
+                if length is None:
+                    continue
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuses several ranked id lists: score(d) = sum over lists of 1 / (k + rank).
+    Returns (id, fused score) pairs, best first.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
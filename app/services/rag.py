@@ -1,12 +1,19 @@
 import os
 import glob
+import asyncio
 import logging
-from typing import List, Dict, Any
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 import google.generativeai as genai
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from app.core.config import settings
 from app.services.vector_db import vector_db
+from app.services.embeddings import embedding_service
+from app.services.ingest_manifest import IngestManifest
+from app.services.chunking import prepare_file
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion
 
 logger = logging.getLogger("uvicorn")
 
@@ -16,106 +23,355 @@ class RAGService:
     1. Reading files (Paper Fetching)
     2. Chunking
     3. Embedding (Via Gemini API)
-    4. Storing in VectorDB
-    5. Searching
+    4. Storing in VectorDB (plus a BM25 index over the same chunks)
+    5. Searching (hybrid dense + lexical)
     """
     
     def __init__(self):
         # Using Gemini for embeddings as per plan
         if settings.GEMINI_API_KEY:
             genai.configure(api_key=settings.GEMINI_API_KEY)
-        
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            separators=["\n\n", "\n", " ", ""]
-        )
-
-    async def ingest_data_folder(self):
+
+        # Built from the vector DB on first use (or at startup), then updated by ingestion.
+        # Ingestion usually runs in another process (ingest_documents.py); the
+        # manifest it saves after every commit tells us when to rebuild.
+        self.lexical_index = BM25Index()
+        self._lexical_loaded = False
+        self._lexical_lock: Optional[asyncio.Lock] = None
+        self._lexical_pending: Optional[List] = None  # Changes made while a build is running
+        self._lexical_stamp: Optional[Tuple[int, int]] = None  # Manifest (mtime, size) the index reflects
+        self._lexical_refresh: Optional[asyncio.Task] = None
+
+    # Lexical searches that walk more postings than this run in a worker thread
+    LEXICAL_INLINE_POSTINGS = 20_000
+
+    @staticmethod
+    def _build_lexical_index() -> BM25Index:
+        index = BM25Index()
+        for ids, metadatas in vector_db.iter_documents():
+            for doc_id, meta in zip(ids, metadatas):
+                index.add(doc_id, meta.get("text", ""))
+        return index
+
+    @staticmethod
+    def _manifest_stamp() -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(settings.INGEST_MANIFEST_PATH)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    async def ensure_lexical_index(self):
         """
-        Reads all TXT/MD files from data/raw and indexes them.
+        Builds the BM25 index from the whole collection once, and again in
+        the background whenever the ingest manifest changes (searches keep
+        using the current index meanwhile). Paging through Chroma and
+        tokenizing every chunk runs in a worker thread, so the event loop
+        keeps serving other requests; concurrent callers wait on the same build.
         """
-        raw_dir = os.path.join(settings.DATA_DIR, "raw")
-        files = glob.glob(os.path.join(raw_dir, "**", "*.*"), recursive=True)
-        
-        documents = []
-        for file_path in files:
-            if file_path.endswith(('.txt', '.md', '.pdf')): # Basic support
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        text = f.read()
-                        documents.append({"path": file_path, "text": text})
-                except Exception as e:
-                    logger.error(f"Failed to read {file_path}: {e}")
+        if not self._lexical_loaded:
+            await self._load_lexical_index()
+        elif self._lexical_refresh is None and self._manifest_stamp() != self._lexical_stamp:
+            self._lexical_refresh = asyncio.create_task(self._refresh_lexical_index())
 
-        if not documents:
-            logger.info("No new documents found to ingest.")
+    async def _refresh_lexical_index(self):
+        try:
+            await self._load_lexical_index(refresh=True)
+        except Exception as e:
+            logger.error(f"Failed to rebuild lexical index: {e}")
+        finally:
+            self._lexical_refresh = None
+
+    async def _load_lexical_index(self, refresh: bool = False):
+        if self._lexical_lock is None:
+            self._lexical_lock = asyncio.Lock()
+        async with self._lexical_lock:
+            if self._lexical_loaded and not refresh:
+                return
+            # Read before the collection: a commit landing mid-build triggers another rebuild
+            stamp = self._manifest_stamp()
+            self._lexical_pending = []
+            try:
+                index = await asyncio.to_thread(self._build_lexical_index)
+                # Ingestion may have changed the collection after the build read it
+                for added, removed in self._lexical_pending:
+                    self._apply_lexical_changes(index, added, removed)
+            finally:
+                self._lexical_pending = None
+            self.lexical_index = index
+            self._lexical_stamp = stamp
+            self._lexical_loaded = True
+        logger.info(f"Built lexical index over {len(self.lexical_index)} chunks.")
+
+    def _update_lexical_index(self, added: Dict[str, str], removed: List[str]):
+        if self._lexical_pending is not None:
+            self._lexical_pending.append((added, removed))
+        # Not loaded yet: the first load reads these changes from the vector DB anyway
+        if not self._lexical_loaded:
             return
+        self._apply_lexical_changes(self.lexical_index, added, removed)
+
+    def _save_manifest(self, manifest: IngestManifest):
+        manifest.save()
+        if self._lexical_loaded and self._lexical_pending is None:
+            # The index already follows this process's own ingestion; no rebuild needed
+            self._lexical_stamp = self._manifest_stamp()
 
-        # Processing documents
-        vectors_to_add = []
-        metadata_to_add = []
-
-        for doc in documents:
-            # 1. Chunking
-            chunks = self.text_splitter.split_text(doc["text"])
-            
-            # 2. Embedding Batching (Gemini has limits, do small batches or one by one)
-            # For simplicity in this demo, we do one by one or small groups.
-            for chunk in chunks:
-                embedding = self._get_embedding(chunk)
-                if embedding:
-                    vectors_to_add.append(embedding)
-                    metadata_to_add.append({
-                        "text": chunk,
-                        "source": os.path.basename(doc["path"])
-                    })
-        
-        # 3. Insertion
-        if vectors_to_add:
-            vector_db.add_vectors(vectors_to_add, metadata_to_add)
-
-    def _get_embedding(self, text: str) -> List[float]:
+    @staticmethod
+    def _apply_lexical_changes(index: BM25Index, added: Dict[str, str], removed: List[str]):
+        for doc_id in removed:
+            index.remove(doc_id)
+        for doc_id, text in added.items():
+            index.add(doc_id, text)
+
+    def _lexical_search_all(self, queries: List[str], k: int) -> List[List[Tuple[str, float]]]:
+        index = self.lexical_index
+        return [index.search(query, k) for query in queries]
+
+    async def ingest_data_folder(self) -> Dict[str, int]:
         """
-        Wraps Gemini Embedding API.
+        Incrementally indexes TXT/MD/PDF files from data/raw.
+
+        Runs as a streaming pipeline (read -> split -> embed -> upsert):
+        a producer prepares files into a bounded queue and the consumer
+        commits every INGEST_COMMIT_BATCH chunks, recording those files in
+        the manifest. Memory stays flat with corpus size, and an interrupted
+        run resumes from the last commit.
         """
+        raw_dir = os.path.join(settings.DATA_DIR, "raw")
+        files = [
+            f for f in glob.glob(os.path.join(raw_dir, "**", "*.*"), recursive=True)
+            if f.endswith(('.txt', '.md', '.pdf')) # Basic support
+        ]
+        manifest = IngestManifest(settings.INGEST_MANIFEST_PATH)
+        stats = {"added": 0, "deleted": 0, "skipped": 0}
+
+        # Removed files
+        seen = {os.path.relpath(f, raw_dir) for f in files}
+        removed_ids = []
+        for rel_path in set(manifest.files) - seen:
+            removed_ids.extend(manifest.remove(rel_path))
+        if removed_ids:
+            vector_db.delete_vectors(removed_ids)
+            self._update_lexical_index({}, removed_ids)
+            stats["deleted"] += len(removed_ids)
+        self._save_manifest(manifest)
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+        stages = [
+            asyncio.create_task(self._produce_files(raw_dir, files, manifest, queue, stats)),
+            asyncio.create_task(self._consume_files(queue, manifest, stats))
+        ]
         try:
-            # 'models/text-embedding-004' is the current efficient model
-            result = genai.embed_content(
-                model="models/text-embedding-004",
-                content=text,
-                task_type="retrieval_document"
-            )
-            return result['embedding']
-        except Exception as e:
-            logger.error(f"Embedding failed: {e}")
-            return []
+            await asyncio.gather(*stages)
+        except BaseException:
+            # Whichever stage failed, stop the other; committed batches are kept
+            for stage in stages:
+                stage.cancel()
+            raise
+
+        # Persist metadata-only updates (touched but unmodified files)
+        self._save_manifest(manifest)
+
+        if not stats["added"] and not stats["deleted"]:
+            logger.info(f"No new documents found to ingest ({stats['skipped']} unchanged).")
+        else:
+            logger.info(f"Ingestion: {stats['added']} chunks added, {stats['deleted']} deleted, {stats['skipped']} files unchanged.")
+        return stats
+
+    async def _produce_files(self, raw_dir: str, files: List[str], manifest: IngestManifest,
+                             queue: asyncio.Queue, stats: Dict[str, int]):
+        """
+        Stage 1: read + split changed files and feed them to the queue.
+        Splitting is CPU-bound, so it runs on a process pool of INGEST_WORKERS
+        (0 = a single background thread) with a bounded window of files in flight.
+        """
+        workers = settings.INGEST_WORKERS
+        # Spawned, not forked: this process holds threads and SQLite connections
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) if workers > 0 else None
+        loop = asyncio.get_running_loop()
+        in_flight = deque()
+
+        async def drain_one():
+            rel_path, entry, future = in_flight.popleft()
+            work = await future
+            if work is None:
+                stats["skipped"] += 1
+            elif work["chunks"] is None:
+                # Touched but not modified
+                manifest.set(rel_path, work["size"], work["mtime"], work["hash"], entry["chunk_ids"])
+                stats["skipped"] += 1
+            else:
+                # Blocks when the consumer falls behind (back-pressure)
+                await queue.put(work)
 
-    def _get_query_embedding(self, text: str) -> List[float]:
         try:
-            result = genai.embed_content(
-                model="models/text-embedding-004",
-                content=text,
-                task_type="retrieval_query" # Important: different task type for queries
-            )
-            return result['embedding']
-        except Exception as e:
-            logger.error(f"Query embedding failed: {e}")
-            return []
+            for file_path in files:
+                rel_path = os.path.relpath(file_path, raw_dir)
+                entry = manifest.get(rel_path)
+
+                # Cheap stat() check in-process; only changed files go to the pool
+                try:
+                    stat = os.stat(file_path)
+                except OSError as e:
+                    logger.error(f"Failed to read {file_path}: {e}")
+                    continue
+                if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                    stats["skipped"] += 1
+                    continue
+
+                future = loop.run_in_executor(
+                    pool, prepare_file, file_path, rel_path, entry,
+                    settings.CHUNK_SIZE, settings.CHUNK_OVERLAP
+                )
+                in_flight.append((rel_path, entry, future))
+                if len(in_flight) >= max(1, workers) * 2:
+                    await drain_one()
+
+            while in_flight:
+                await drain_one()
+        finally:
+            if pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+        await queue.put(None)
+
+    async def _consume_files(self, queue: asyncio.Queue, manifest: IngestManifest, stats: Dict[str, int]):
+        """
+        Stage 2: buffer new chunks and commit them in fixed-size batches.
+        A large file is split across batches; its manifest entry (and the
+        removal of its stale chunks) lands with its last part.
+        """
+        batch_size = max(1, settings.INGEST_COMMIT_BATCH)
+        buffer = []  # parts: {"work", "ids" to embed, "final"}
+        buffered_chunks = 0
+
+        while True:
+            work = await queue.get()
+            if work is None:
+                break
+
+            work["failed"] = set()
+            pending = [cid for cid in work["chunks"] if cid not in work["old_ids"]]
+            while True:
+                take, pending = pending[:batch_size - buffered_chunks], pending[batch_size - buffered_chunks:]
+                buffer.append({"work": work, "ids": take, "final": not pending})
+                buffered_chunks += len(take)
+                if buffered_chunks >= batch_size:
+                    await self._commit_files(buffer, manifest, stats)
+                    buffer, buffered_chunks = [], 0
+                if not pending:
+                    break
+
+        if buffer:
+            await self._commit_files(buffer, manifest, stats)
+
+    async def _commit_files(self, parts: List[Dict], manifest: IngestManifest, stats: Dict[str, int]):
+        """Stage 3: embed, upsert, then record the completed files in the manifest."""
+        to_embed = []  # (chunk_id, text, source)
+        to_delete = []
+        for part in parts:
+            work = part["work"]
+            if part["final"]:
+                to_delete.extend(work["old_ids"] - work["chunks"].keys())
+            to_embed.extend((cid, work["chunks"][cid], work["source"]) for cid in part["ids"])
+
+        embeddings = await embedding_service.embed_documents([text for _, text, _ in to_embed])
+
+        ids, vectors, metadatas, failed = [], [], [], set()
+        for (cid, text, source), embedding in zip(to_embed, embeddings):
+            if embedding:
+                ids.append(cid)
+                vectors.append(embedding)
+                metadatas.append({"text": text, "source": source})
+            else:
+                failed.add(cid)
+
+        # Insertion, then record it. A crash in between is safe: ids are stable.
+        vector_db.delete_vectors(to_delete)
+        vector_db.upsert_vectors(ids, vectors, metadatas)
+        self._update_lexical_index({cid: m["text"] for cid, m in zip(ids, metadatas)}, to_delete)
+
+        for part in parts:
+            work = part["work"]
+            work["failed"].update(cid for cid in part["ids"] if cid in failed)
+            if not part["final"]:
+                continue
+            stored = [cid for cid in work["chunks"] if cid not in work["failed"]]
+            if len(stored) < len(work["chunks"]):
+                # Incomplete: leave size/mtime unset so the next run retries the missing chunks
+                manifest.set(work["rel_path"], -1, -1, "", stored)
+            else:
+                manifest.set(work["rel_path"], work["size"], work["mtime"], work["hash"], stored)
+        self._save_manifest(manifest)
+
+        stats["added"] += len(ids)
+        stats["deleted"] += len(to_delete)
 
     async def search(self, query: str, k: int=5) -> List[str]:
         """
-        End-to-end retrieval.
+        End-to-end retrieval for one query. See search_many.
+        """
+        return (await self.search_many([query], k))[0]
+
+    async def search_many(self, queries: List[str], k: int=5) -> List[List[str]]:
+        """
+        End-to-end retrieval for several queries at once: one batched query
+        embedding call and one multi-vector collection query.
+        In "hybrid" mode (default), dense and BM25 results are fused with
+        reciprocal rank fusion. If the query embedding fails or takes longer
+        than RETRIEVAL_EMBED_TIMEOUT, lexical results are returned alone.
         """
-        # 1. Embed Query
-        query_vector = self._get_query_embedding(query)
-        if not query_vector:
+        if not queries:
             return []
-            
-        # 2. Vector Search
-        results = vector_db.search(query_vector, k)
-        
-        # 3. Extract Text
-        return [res["text"] for res in results]
+
+        mode = settings.RETRIEVAL_MODE
+        n_candidates = k * settings.HYBRID_CANDIDATES_FACTOR if mode == "hybrid" else k
+
+        # 1. Embed Queries (skipped entirely in lexical mode)
+        query_vectors = [None] * len(queries)
+        if mode != "lexical":
+            try:
+                # Shielded so a slow embedding still lands in the query cache for next time
+                query_vectors = await asyncio.wait_for(
+                    asyncio.shield(embedding_service.embed_queries(queries)),
+                    settings.RETRIEVAL_EMBED_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Query embedding timed out; using lexical retrieval only.")
+
+        # 2. Vector Search (one collection query for all embedded queries)
+        embedded = [i for i, v in enumerate(query_vectors) if v]
+        dense_lists = [[] for _ in queries]
+        for i, results in zip(embedded, vector_db.search_many([query_vectors[i] for i in embedded], n_candidates)):
+            dense_lists[i] = results
+        if mode == "dense":
+            return [[res["text"] for res in dense[:k]] for dense in dense_lists]
+
+        # 3. Lexical Search + fusion (common words walk long posting lists: keep those off the loop)
+        await self.ensure_lexical_index()
+        if sum(self.lexical_index.scan_size(query) for query in queries) > self.LEXICAL_INLINE_POSTINGS:
+            lexical_lists = await asyncio.to_thread(self._lexical_search_all, queries, n_candidates)
+        else:
+            lexical_lists = self._lexical_search_all(queries, n_candidates)
+        ranked = []
+        for dense, lexical in zip(dense_lists, lexical_lists):
+            if not dense:
+                ranked.append([doc_id for doc_id, _ in lexical[:k]])
+            else:
+                fused = reciprocal_rank_fusion(
+                    [[res["id"] for res in dense], [doc_id for doc_id, _ in lexical]],
+                    k=settings.RRF_K
+                )
+                ranked.append([doc_id for doc_id, _ in fused[:k]])
+
+        # 4. Extract Text (dense hits carry it; fetch the lexical-only ones in one go)
+        texts = {res["id"]: res["text"] for dense in dense_lists for res in dense}
+        missing = list({doc_id for ids in ranked for doc_id in ids if doc_id not in texts})
+        for doc_id, meta in vector_db.get_documents(missing).items():
+            texts[doc_id] = meta.get("text", "")
+        return [[texts[doc_id] for doc_id in ids if doc_id in texts] for ids in ranked]
 
 rag_service = RAGService()
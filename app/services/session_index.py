@@ -0,0 +1,307 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+from app.services.ann_index import IVFIndex
+
+DTYPES = ("float32", "float16", "int8")
+
+
+def quantize_int8(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-row symmetric int8 codes: row ~= codes * scale."""
+    scales = np.abs(rows).max(axis=1) / 127.0
+    scales[scales == 0] = 1e-10
+    codes = np.round(rows / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class SessionIndex:
+    """
+    In-memory vector index for one upload session.
+    Vectors live in a single preallocated matrix that grows by doubling.
+    Rows are L2-normalized at insert time, so a query is one
+    matrix-vector product plus an argpartition for the top k.
+    The dimension is taken from the first insert unless given.
+
+    `dtype` picks the in-memory row format: float32, float16 (2x smaller) or
+    int8 codes with a per-row scale (4x smaller). Compact rows are scored in
+    float32 blocks. If `rescore_path` is given, full-precision rows are also
+    appended to that file, and the top `k * rescore_factor` candidates are
+    re-ranked exactly from a memory map of it.
+
+    Once the index holds `ann_min_size` rows, `build_ann()` trains an IVF
+    index over the matrix and searches become approximate. Training is
+    slow, so `add()` never does it: callers run `build_ann()` in a worker
+    thread, and searches stay exact until the new index is swapped in.
+    Every `recall_sample_every`-th approximate search is also run exactly,
+    and recall@k is tracked.
+    """
+
+    INITIAL_CAPACITY = 256
+    # Rows converted to float32 at a time when scoring compact storage (fits in cache)
+    SCORE_BLOCK = 2048
+    # Retrain the ANN lists once the index has grown this much since training
+    ANN_RETRAIN_GROWTH = 4
+
+    def __init__(self, dimension: Optional[int] = None, ann_min_size: int = 0,
+                 nprobe: int = 10, recall_sample_every: int = 0, dtype: str = "float32",
+                 rescore_path: Optional[str] = None, rescore_factor: int = 4):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}; expected one of {DTYPES}")
+
+        self.dimension = dimension
+        self.dtype = dtype
+        self._matrix = np.empty((0, dimension or 0), dtype=dtype)
+        self._scales = np.empty(0, dtype=np.float32)  # int8 only
+        self._size = 0
+        self.metadata: List[Dict[str, Any]] = []
+
+        # Full-precision copy on disk, only needed when rows are compact
+        self.rescore_path = rescore_path if dtype != "float32" else None
+        self.rescore_factor = rescore_factor
+        self._full: Optional[np.memmap] = None
+
+        self.ann_min_size = ann_min_size
+        self.nprobe = nprobe
+        self.recall_sample_every = recall_sample_every
+        self.ann: Optional[IVFIndex] = None
+        self._ann_building = False
+        # Guards appends against a concurrent ANN build (and other threads)
+        self._lock = threading.RLock()
+        self._ann_searches = 0
+        self._recall_checks = 0
+        self._recall_sum = 0.0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """View of the filled rows, in storage format (no copy)."""
+        return self._matrix[:self._size]
+
+    @property
+    def nbytes(self) -> int:
+        return self._matrix.nbytes + self._scales.nbytes + (self.ann.nbytes if self.ann else 0)
+
+    def add(self, vectors: List[List[float]], metadata: List[Dict[str, Any]]):
+        """Normalizes and appends vectors, growing the matrix if needed."""
+        if not vectors:
+            return
+        with self._lock:
+            self._append(vectors, metadata)
+
+    def _append(self, vectors: List[List[float]], metadata: List[Dict[str, Any]]):
+        rows = np.array(vectors, dtype=np.float32)
+        if self.dimension is None and rows.ndim == 2:
+            self.dimension = rows.shape[1]
+            self._matrix = np.empty((0, self.dimension), dtype=self.dtype)
+        if rows.ndim != 2 or rows.shape[1] != self.dimension:
+            raise ValueError(f"Expected vectors of dimension {self.dimension}, got shape {rows.shape}")
+
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        norms[norms == 0] = 1e-10
+        rows /= norms
+
+        needed = self._size + len(rows)
+        if needed > len(self._matrix):
+            capacity = max(self.INITIAL_CAPACITY, len(self._matrix))
+            while capacity < needed:
+                capacity *= 2
+            self._grow(capacity)
+
+        start = self._size
+        if self.dtype == "int8":
+            self._matrix[start:needed], self._scales[start:needed] = quantize_int8(rows)
+        else:
+            self._matrix[start:needed] = rows
+        if self.rescore_path:
+            with open(self.rescore_path, "ab") as f:
+                f.write(rows.tobytes())
+        # Metadata first: a concurrent search may return any row below _size
+        self.metadata.extend(metadata)
+        self._size = needed
+        self._update_ann(rows, start)
+
+    def _grow(self, capacity: int):
+        """Reallocates row storage (and int8 scales) with room for `capacity` rows."""
+        grown = np.empty((capacity, self.dimension), dtype=self.dtype)
+        grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+        if self.dtype == "int8":
+            scales = np.empty(capacity, dtype=np.float32)
+            scales[:self._size] = self._scales[:self._size]
+            self._scales = scales
+
+    def _snapshot(self) -> Tuple[int, np.ndarray, np.ndarray]:
+        """
+        (size, matrix, scales) for a search that runs without the lock while
+        another thread appends. The size is read first: rows are written
+        before it is published, and growing copies them, so both arrays read
+        afterwards hold at least `size` valid rows.
+        """
+        size = self._size
+        return size, self._matrix, self._scales
+
+    def _rows(self, index, view: Optional[Tuple[int, np.ndarray, np.ndarray]] = None) -> np.ndarray:
+        """Stored rows as float32 (a view when storage is already float32)."""
+        _, matrix, scales = view or self._snapshot()
+        rows = matrix[index].astype(np.float32, copy=False)
+        if self.dtype == "int8":
+            rows *= scales[index][:, None]
+        return rows
+
+    def _scores(self, q: np.ndarray, view: Tuple[int, np.ndarray, np.ndarray],
+                candidates: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate cosine scores for the given rows (all rows of the snapshot if None)."""
+        size, matrix, scales = view
+        if candidates is not None:
+            # The ANN lists may already hold rows appended after the snapshot
+            scores = np.full(len(candidates), -np.inf, dtype=np.float32)
+            known = candidates < size
+            scores[known] = self._rows(candidates[known], view) @ q
+            return scores
+        if self.dtype == "float32":
+            return matrix[:size] @ q
+
+        scores = np.empty(size, dtype=np.float32)
+        for start in range(0, size, self.SCORE_BLOCK):
+            stop = min(start + self.SCORE_BLOCK, size)
+            scores[start:stop] = matrix[start:stop].astype(np.float32) @ q
+        if self.dtype == "int8":
+            # Scale after the product: one multiply per row instead of per value
+            scores *= scales[:size]
+        return scores
+
+    def _full_rows(self, candidates: np.ndarray, size: int) -> np.ndarray:
+        full = self._full
+        if full is None or len(full) < size:
+            full = np.memmap(self.rescore_path, dtype=np.float32, mode="r", shape=(size, self.dimension))
+            self._full = full
+        return np.asarray(full[candidates])
+
+    def _update_ann(self, rows: np.ndarray, start: int):
+        # Keep the current lists complete until a retrained index replaces them
+        if self.ann is not None:
+            self.ann.add(rows, start)
+
+    @property
+    def ann_pending(self) -> bool:
+        """True if `build_ann()` would (re)train: first build, or grown past ANN_RETRAIN_GROWTH."""
+        if not self.ann_min_size or self._size < self.ann_min_size or self._ann_building:
+            return False
+        return self.ann is None or self._size > self.ann.trained_size * self.ANN_RETRAIN_GROWTH
+
+    def build_ann(self) -> bool:
+        """
+        Trains an IVF index if one is due and swaps it in. Blocking (k-means
+        over the whole matrix), so async callers run it in a worker thread;
+        rows appended meanwhile are added before the swap.
+        Returns True if a new index was built.
+        """
+        with self._lock:
+            if not self.ann_pending:
+                return False
+            self._ann_building = True
+            size = self._size
+        try:
+            rng = np.random.default_rng(0)
+            n_lists = IVFIndex.lists_for(size)
+            n_samples = min(size, n_lists * IVFIndex.TRAIN_SAMPLES_PER_LIST)
+            sample = self._rows(np.sort(rng.choice(size, n_samples, replace=False)))
+
+            ann = IVFIndex(sample, n_lists, trained_size=size, nprobe=self.nprobe)
+            for start in range(0, size, self.SCORE_BLOCK):
+                stop = min(start + self.SCORE_BLOCK, size)
+                ann.add(self._rows(slice(start, stop)), start)
+
+            with self._lock:
+                if self._size > size:
+                    ann.add(self._rows(slice(size, self._size)), size)
+                self.ann = ann
+            return True
+        finally:
+            self._ann_building = False
+
+    def search(self, query_vector: List[float], k: int = 5, exact: bool = False) -> List[Tuple[int, float]]:
+        """
+        Returns up to k (row, cosine similarity) pairs, best first.
+        Uses the ANN index when one is built, unless `exact` is set.
+        """
+        # One consistent view of the rows: uploads may append from a worker thread meanwhile
+        view = self._snapshot()
+        size = view[0]
+        if size == 0 or k <= 0:
+            return []
+
+        q = np.asarray(query_vector, dtype=np.float32)
+        q_norm = np.linalg.norm(q)
+        if q_norm == 0:
+            q_norm = 1e-10
+        q = q / q_norm
+
+        n_candidates = k * self.rescore_factor if self.rescore_path and self.rescore_factor > 1 else k
+
+        ann = self.ann
+        if ann is None or exact:
+            return self._rescore(q, self._flat_search(q, n_candidates, view), k, size)
+
+        candidates = ann.search(lambda ids: self._scores(q, view, ids), q, n_candidates)
+        results = self._rescore(q, [(i, score) for i, score in candidates if i < size], k, size)
+        self._ann_searches += 1
+        if self.recall_sample_every and self._ann_searches % self.recall_sample_every == 0:
+            expected = self._rescore(q, self._flat_search(q, n_candidates, view), k, size)
+            self._recall_checks += 1
+            self._recall_sum += recall_at_k(results, expected)
+        return results
+
+    def _flat_search(self, q: np.ndarray, k: int,
+                     view: Tuple[int, np.ndarray, np.ndarray]) -> List[Tuple[int, float]]:
+        scores = self._scores(q, view)
+        size = view[0]
+
+        k = min(k, size)
+        if k < size:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(size)
+        top = top[np.argsort(scores[top])[::-1]]
+
+        return [(int(i), float(scores[i])) for i in top]
+
+    def _rescore(self, q: np.ndarray, candidates: List[Tuple[int, float]], k: int,
+                 size: int) -> List[Tuple[int, float]]:
+        """Re-ranks candidates with full-precision rows, if they are kept."""
+        if not self.rescore_path or not candidates:
+            return candidates[:k]
+
+        ids = np.array([i for i, _ in candidates])
+        scores = self._full_rows(ids, size) @ q
+        order = np.argsort(scores)[::-1][:k]
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+    def drop(self):
+        """Deletes the on-disk full-precision rows, if any."""
+        self._full = None
+        if self.rescore_path and os.path.exists(self.rescore_path):
+            os.remove(self.rescore_path)
+
+    def ann_stats(self) -> Optional[Dict[str, Any]]:
+        if self.ann is None:
+            return None
+        return {
+            "lists": self.ann.n_lists,
+            "nprobe": self.ann.nprobe,
+            "searches": self._ann_searches,
+            "recall_checks": self._recall_checks,
+            "recall_at_k": self._recall_sum / self._recall_checks if self._recall_checks else None,
+        }
+
+
+def recall_at_k(results: List[Tuple[int, float]], expected: List[Tuple[int, float]]) -> float:
+    """Fraction of the exact top-k rows that the approximate search returned."""
+    if not expected:
+        return 1.0
+    found = {i for i, _ in results}
+    return sum(1 for i, _ in expected if i in found) / len(expected)
@@ -0,0 +1,161 @@
+import json
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+
+from app.services.session_index import SessionIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+
+class PersistentSessionIndex(SessionIndex):
+    """
+    SessionIndex whose rows live in memory-mapped files in `directory`:
+
+        index.json       dtype, dimension and whether full.f32 is kept
+        vectors.npy      stored rows (float32, float16 or int8 codes), preallocated capacity
+        scales.npy       per-row int8 scales
+        full.f32         full-precision rows for rescoring (compact dtypes, unless `rescore` is off)
+        metadata.jsonl   one line per row; its line count is the number of valid rows
+
+    Rows are written and flushed before their metadata line is appended, so
+    a crash never exposes a half-written row. Reads go straight to the page
+    cache, which is shared by every worker process that maps the same files.
+    Appends take an exclusive file lock; other processes pick up new rows
+    on their next `refresh()`.
+    """
+
+    def __init__(self, directory: str, rescore: bool = True, **kwargs):
+        self.directory = directory
+        kwargs.setdefault("dtype", "float32")
+        if kwargs["dtype"] != "float32" and rescore:
+            kwargs["rescore_path"] = os.path.join(directory, "full.f32")
+        super().__init__(**kwargs)
+        self._log_offset = 0
+
+    @classmethod
+    def create(cls, directory: str, **kwargs) -> "PersistentSessionIndex":
+        os.makedirs(directory, exist_ok=True)
+        index = cls(directory, **kwargs)
+        with open(index._path("index.json"), "w") as f:
+            json.dump({"dtype": index.dtype, "dimension": index.dimension,
+                       "rescore": index.rescore_path is not None}, f)
+        return index
+
+    @classmethod
+    def open(cls, directory: str, **kwargs) -> Optional["PersistentSessionIndex"]:
+        """Maps an existing session directory, or returns None if there is none."""
+        try:
+            with open(os.path.join(directory, "index.json")) as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # The file layout was fixed when the session was created
+        kwargs["dtype"] = info["dtype"]
+        kwargs["rescore"] = info.get("rescore", True)
+        index = cls(directory, dimension=info.get("dimension"), **kwargs)
+        with index.lock():
+            index.refresh()
+            index._truncate_full()
+        return index
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Exclusive across processes on this host (and within this one)."""
+        with open(self._path("lock"), "a") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def add(self, vectors: List[List[float]], metadata: List[Dict[str, Any]]):
+        if not vectors:
+            return
+        with self._lock, self.lock():
+            # Another worker may have appended since we last looked
+            self._refresh()
+            start = self._size
+            self._append(vectors, metadata)
+            if isinstance(self._matrix, np.memmap):
+                self._matrix.flush()
+            if isinstance(self._scales, np.memmap):
+                self._scales.flush()
+
+            with open(self._path("metadata.jsonl"), "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(m) + "\n" for m in self.metadata[start:]))
+            self._log_offset = os.path.getsize(self._path("metadata.jsonl"))
+
+    def _grow(self, capacity: int):
+        # Write the larger file aside and swap it in; readers keep the old inode until they refresh
+        self._matrix = self._grow_file("vectors.npy", self._matrix, (capacity, self.dimension), self.dtype)
+        if self.dtype == "int8":
+            self._scales = self._grow_file("scales.npy", self._scales, (capacity,), np.float32)
+
+    def _grow_file(self, name: str, current: np.ndarray, shape, dtype) -> np.ndarray:
+        tmp = self._path(name + ".tmp")
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=shape)
+        grown[:self._size] = current[:self._size]
+        grown.flush()
+        os.replace(tmp, self._path(name))
+        return grown
+
+    def refresh(self) -> bool:
+        """
+        Maps rows appended by other processes since the last call.
+        Returns True if anything changed.
+        """
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> bool:
+        log_path = self._path("metadata.jsonl")
+        if not os.path.exists(log_path) or os.path.getsize(log_path) == self._log_offset:
+            return False
+
+        with open(log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        # Ignore a trailing line that is still being written
+        complete = data[:data.rfind(b"\n") + 1]
+        if not complete:
+            return False
+        new_metadata = [json.loads(line) for line in complete.splitlines()]
+
+        start = self._size
+        self._matrix = np.load(self._path("vectors.npy"), mmap_mode="r+")
+        if self.dtype == "int8":
+            self._scales = np.load(self._path("scales.npy"), mmap_mode="r+")
+        self.dimension = self._matrix.shape[1]
+        self.metadata.extend(new_metadata)
+        self._size = start + len(new_metadata)
+        self._log_offset += len(complete)
+        self._full = None
+
+        self._update_ann(self._rows(slice(start, self._size)), start)
+        return True
+
+    def _truncate_full(self):
+        """Drops rescoring rows left behind by an append that never got its metadata line."""
+        if self.rescore_path and os.path.exists(self.rescore_path):
+            expected = self._size * (self.dimension or 0) * 4
+            if os.path.getsize(self.rescore_path) > expected:
+                os.truncate(self.rescore_path, expected)
+
+    def drop(self):
+        """Deletes the session directory."""
+        self._full = None
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            os.remove(self._path(name))
+        if os.path.isdir(self.directory):
+            os.rmdir(self.directory)
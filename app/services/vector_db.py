@@ -1,7 +1,8 @@
 import os
+import uuid
 
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
 from app.core.config import settings
 import logging
 
@@ -17,6 +18,8 @@ class VectorDB:
     Keeps the same public interface as the FAISS version.
     """
 
+    MAX_BATCH = 5000  # Chroma rejects writes above its max batch size (~5.4k)
+
     def __init__(self):
         self.persist_dir = os.path.join(settings.DATA_DIR, "vector_store")
         self.dimension = 768  # Gemini embedding dimension
@@ -36,7 +39,9 @@ class VectorDB:
 
     def save(self):
         """Persist ChromaDB state to disk."""
-        self.client.persist()
+        # Chroma >= 0.4 persists automatically and no longer has persist()
+        if hasattr(self.client, "persist"):
+            self.client.persist()
 
     def add_vectors(self, vectors: List[List[float]], metadatas: List[Dict[str, Any]]):
         """
@@ -45,36 +50,89 @@ class VectorDB:
         if not vectors:
             return
 
-        ids = [str(self.collection.count() + i) for i in range(len(vectors))]
+        # Random ids: count()-based ids collide once anything has been deleted
+        ids = [uuid.uuid4().hex for _ in vectors]
+        self.upsert_vectors(ids, vectors, metadatas)
 
-        self.collection.add(
-            embeddings=vectors,
-            metadatas=metadatas,
-            ids=ids
-        )
+    def upsert_vectors(self, ids: List[str], vectors: List[List[float]], metadatas: List[Dict[str, Any]]):
+        """
+        Insert or overwrite vectors under caller-supplied ids.
+        Re-upserting the same id is a no-op in effect, which keeps ingestion idempotent.
+        """
+        if not ids:
+            return
+
+        for i in range(0, len(ids), self.MAX_BATCH):
+            self.collection.upsert(
+                ids=ids[i:i + self.MAX_BATCH],
+                embeddings=vectors[i:i + self.MAX_BATCH],
+                metadatas=metadatas[i:i + self.MAX_BATCH]
+            )
+
+        self.save()
+        logger.info(f"Upserted {len(ids)} chunks to Vector DB.")
+
+    def delete_vectors(self, ids: List[str]):
+        """Remove vectors by id. Unknown ids are ignored."""
+        if not ids:
+            return
+
+        for i in range(0, len(ids), self.MAX_BATCH):
+            self.collection.delete(ids=ids[i:i + self.MAX_BATCH])
 
         self.save()
-        logger.info(f"Added {len(vectors)} chunks to Vector DB.")
+        logger.info(f"Deleted {len(ids)} chunks from Vector DB.")
 
     def search(self, query_vector: List[float], k: int = 5) -> List[Dict[str, Any]]:
         """
         Search for top-k similar vectors.
         """
-        if self.collection.count() == 0:
+        return self.search_many([query_vector], k)[0]
+
+    def search_many(self, query_vectors: List[List[float]], k: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        Top-k search for several query vectors in a single collection query.
+        Returns one result list per query vector, in order.
+        """
+        if not query_vectors:
             return []
+        if self.collection.count() == 0:
+            return [[] for _ in query_vectors]
 
         results = self.collection.query(
-            query_embeddings=[query_vector],
+            query_embeddings=query_vectors,
             n_results=k
         )
 
-        output = []
-        for i in range(len(results["ids"][0])):
-            item = results["metadatas"][0][i]
-            item["score"] = float(results["distances"][0][i])  # lower = better
-            output.append(item)
-
-        return output
+        outputs = []
+        for q in range(len(query_vectors)):
+            output = []
+            for i in range(len(results["ids"][q])):
+                item = results["metadatas"][q][i]
+                item["id"] = results["ids"][q][i]
+                item["score"] = float(results["distances"][q][i])  # lower = better
+                output.append(item)
+            outputs.append(output)
+
+        return outputs
+
+    def get_documents(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch metadata (text, source) for the given ids. Missing ids are skipped."""
+        if not ids:
+            return {}
+
+        results = self.collection.get(ids=ids, include=["metadatas"])
+        return dict(zip(results["ids"], results["metadatas"]))
+
+    def iter_documents(self, batch_size: int = MAX_BATCH) -> Iterator[Tuple[List[str], List[Dict[str, Any]]]]:
+        """Page through every stored (ids, metadatas), without embeddings."""
+        offset = 0
+        while True:
+            results = self.collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+            if not results["ids"]:
+                return
+            yield results["ids"], results["metadatas"]
+            offset += len(results["ids"])
 
 
 # Singleton
@@ -0,0 +1,60 @@
+"""
+Latency and recall@k of the IVF session index vs exact search, for a few
+nprobe values, on clustered synthetic embeddings.
+
+    python benchmarks/bench_ann.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.session_index import SessionIndex, recall_at_k
+
+DIM = 768
+K = 10
+QUERIES = 100
+CLUSTERS = 200
+NOISE = 1.5  # Relative to unit-variance centers; higher = harder for IVF
+
+
+def clustered(rng, centers, n):
+    return (centers[rng.integers(len(centers), size=n)] + NOISE * rng.normal(size=(n, DIM))).astype(np.float32)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(CLUSTERS, DIM))
+    queries = clustered(rng, centers, QUERIES)
+
+    print(f"{'chunks':>8}  {'nprobe':>6}  {'build s':>8}  {'exact ms/q':>11}  {'ann ms/q':>9}  {'speedup':>8}  {f'recall@{K}':>9}")
+    print("-" * 72)
+    for n in [20_000, 100_000]:
+        data = clustered(rng, centers, n)
+        index = SessionIndex()
+        for start in range(0, n, 5000):
+            index.add(data[start:start + 5000].tolist(), [{}] * len(data[start:start + 5000]))
+
+        start = time.perf_counter()
+        exact = [index.search(q, K) for q in queries]
+        exact_ms = (time.perf_counter() - start) / QUERIES * 1000
+
+        for nprobe in [4, 10, 32]:
+            index.ann = None
+            index.ann_min_size, index.nprobe = 1, nprobe
+            start = time.perf_counter()
+            index.build_ann()
+            build_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            approx = [index.search(q, K) for q in queries]
+            ann_ms = (time.perf_counter() - start) / QUERIES * 1000
+            recall = np.mean([recall_at_k(a, e) for a, e in zip(approx, exact)])
+            print(f"{n:>8}  {nprobe:>6}  {build_s:8.2f}  {exact_ms:11.2f}  {ann_ms:9.2f}  {exact_ms / ann_ms:7.1f}x  {recall:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
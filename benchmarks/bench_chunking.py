@@ -0,0 +1,86 @@
+"""
+Scaling benchmark for the read + split stage of ingestion.
+Builds a synthetic corpus and runs ingest_data_folder with embedding and
+the vector DB stubbed out, for 1..N worker processes.
+
+    python benchmarks/bench_chunking.py [n_files] [kb_per_file]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.rag import rag_service
+
+WORDS = "agent research vector embedding retrieval model context report planner analysis".split()
+
+
+class NullBackend:
+    """Stands in for both the embedding service and the vector DB."""
+
+    async def embed_documents(self, texts):
+        return [[0.0] for _ in texts]
+
+    def upsert_vectors(self, ids, vectors, metadatas):
+        pass
+
+    def delete_vectors(self, ids):
+        pass
+
+
+def build_corpus(raw_dir: str, n_files: int, kb_per_file: int):
+    rng = random.Random(0)
+    os.makedirs(raw_dir)
+    for i in range(n_files):
+        paragraphs = []
+        size = 0
+        while size < kb_per_file * 1024:
+            p = " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120)))
+            paragraphs.append(p)
+            size += len(p) + 2
+        with open(os.path.join(raw_dir, f"doc_{i:05d}.txt"), "w") as f:
+            f.write("\n\n".join(paragraphs))
+
+
+def run(data_dir: str, workers: int) -> float:
+    manifest = os.path.join(data_dir, f"manifest_{workers}.json")
+    null = NullBackend()
+    with patch.object(settings, "DATA_DIR", data_dir), \
+         patch.object(settings, "INGEST_MANIFEST_PATH", manifest), \
+         patch.object(settings, "INGEST_WORKERS", workers), \
+         patch("app.services.rag.vector_db", null), \
+         patch("app.services.rag.embedding_service", null):
+        start = time.perf_counter()
+        asyncio.run(rag_service.ingest_data_folder())
+        return time.perf_counter() - start
+
+
+def main():
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    kb_per_file = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    cores = os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        build_corpus(os.path.join(data_dir, "raw"), n_files, kb_per_file)
+        print(f"{n_files} files x {kb_per_file}KB, {cores} cores")
+        print("-" * 50)
+
+        baseline = None
+        workers = 1
+        while True:
+            elapsed = run(data_dir, workers)
+            baseline = baseline or elapsed
+            print(f"workers={workers:<3} {elapsed:7.2f}s  {n_files / elapsed:8.1f} files/s  x{baseline / elapsed:.2f}")
+            if workers >= cores:
+                break
+            workers = min(cores, workers * 2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+HuggingFace provider client benchmark against a local stand-in server.
+Compares the old blocking requests.post-per-call path (run in a thread pool)
+with the pooled keep-alive httpx.AsyncClient used by HuggingFaceProvider.
+The server counts TCP connections so connection reuse is visible.
+
+    python benchmarks/bench_hf_client.py
+"""
+import asyncio
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.hf_provider import HuggingFaceProvider
+
+N_CALLS = 200
+CONCURRENCY = 16
+SERVER_LATENCY = 0.05  # Simulated generation time per request
+HANDSHAKE_LATENCY = 0.06  # Simulated TCP + TLS setup to a remote endpoint, paid per new connection
+PORT = 8765
+BODY = json.dumps([{"generated_text": "ok"}]).encode()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes
+    connections = None  # multiprocessing.Value shared with the benchmark process
+
+    def setup(self):
+        super().setup()
+        with self.connections.get_lock():
+            self.connections.value += 1
+        time.sleep(HANDSHAKE_LATENCY)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(SERVER_LATENCY)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # Room for every client connecting at once
+
+
+def serve(port, connections):
+    StandInHandler.connections = connections
+    StandInServer(("127.0.0.1", port.value), StandInHandler).serve_forever()
+
+
+def report(label: str, elapsed: float, latencies, connections):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(0.95 * (len(latencies) - 1))] * 1000
+    print(f"{label:<30} {elapsed:6.2f}s  {N_CALLS / elapsed:7.0f} req/s  "
+          f"p50 {p50:6.1f}ms  p95 {p95:6.1f}ms  connections {connections.value}")
+
+
+async def bench_requests(url: str, connections):
+    executor = ThreadPoolExecutor(max_workers=CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    payload = {"inputs": "hi", "parameters": {"max_new_tokens": 16, "return_full_text": False}}
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+
+    async def call():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await loop.run_in_executor(executor, functools.partial(requests.post, url, json=payload))
+            response.raise_for_status()
+            response.json()[0]["generated_text"]
+            latencies.append(time.perf_counter() - start)
+
+    connections.value = 0
+    start = time.perf_counter()
+    await asyncio.gather(*[call() for _ in range(N_CALLS)])
+    report("requests.post per call (old)", time.perf_counter() - start, latencies, connections)
+    executor.shutdown()
+
+
+async def bench_pooled(url: str, connections):
+    provider = HuggingFaceProvider(url=url, token="", max_connections=CONCURRENCY)
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+
+    async def call():
+        async with semaphore:
+            start = time.perf_counter()
+            await provider.generate("hi", max_new_tokens=16)
+            latencies.append(time.perf_counter() - start)
+
+    connections.value = 0
+    start = time.perf_counter()
+    await asyncio.gather(*[call() for _ in range(N_CALLS)])
+    report("pooled httpx.AsyncClient", time.perf_counter() - start, latencies, connections)
+    await provider.aclose()
+
+
+async def main():
+    # Separate process so the server does not compete with the client for the GIL
+    connections = multiprocessing.Value("i", 0)
+    port = multiprocessing.Value("i", PORT)
+    server = multiprocessing.Process(target=serve, args=(port, connections), daemon=True)
+    server.start()
+    time.sleep(0.5)
+    url = f"http://127.0.0.1:{PORT}/models/{{model}}"
+
+    print(f"{N_CALLS} calls, {CONCURRENCY} in flight, {SERVER_LATENCY * 1000:.0f}ms server time, "
+          f"{HANDSHAKE_LATENCY * 1000:.0f}ms connection setup")
+    print("-" * 100)
+    await bench_requests(url.format(model="m"), connections)
+    await bench_pooled(url, connections)
+    server.terminate()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
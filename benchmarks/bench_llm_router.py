@@ -0,0 +1,87 @@
+"""
+Tail-latency benchmark for LLMRouter hedging against fake providers.
+The primary is usually fast but occasionally stalls (a degraded backend);
+compares it alone with a router that hedges to an alternate after the
+primary's p95 latency.
+
+    python benchmarks/bench_llm_router.py
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.llm_router import Backend, CircuitBreaker, LLMRouter
+
+N_CALLS = 400
+CONCURRENCY = 20
+BASE_LATENCY = 0.05  # Typical call
+STALL_LATENCY = 1.0  # Degraded call
+STALL_RATE = 0.08
+
+
+class FakeProvider:
+    def __init__(self, name: str, seed: int):
+        self.name = name
+        self.limiter = None
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    def _cache_namespace(self, system_prompt: str) -> str:
+        return self.name
+
+    async def generate_text(self, system_prompt: str, user_prompt: str) -> str:
+        self.calls += 1
+        stalled = self.random.random() < STALL_RATE
+        await asyncio.sleep((STALL_LATENCY if stalled else BASE_LATENCY) * self.random.uniform(0.8, 1.2))
+        return f"{self.name} answer"
+
+    async def aclose(self):
+        pass
+
+
+async def bench(label: str, generate, providers):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+
+    async def call(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await generate("sys", f"question {i}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[call(i) for i in range(N_CALLS)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def pct(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+
+    total_calls = sum(p.calls for p in providers)
+    print(f"{label:<26} {elapsed:6.2f}s  p50 {pct(0.5):6.0f}ms  p95 {pct(0.95):6.0f}ms  "
+          f"p99 {pct(0.99):6.0f}ms  provider calls {total_calls} (+{100 * (total_calls / N_CALLS - 1):.0f}%)")
+
+
+async def main():
+    print(f"{N_CALLS} calls, {CONCURRENCY} in flight, {STALL_RATE:.0%} of calls stall for {STALL_LATENCY * 1000:.0f}ms")
+    print("-" * 100)
+
+    primary = FakeProvider("primary", seed=1)
+    await bench("primary only", primary.generate_text, [primary])
+
+    primary, alternate = FakeProvider("primary", seed=1), FakeProvider("alternate", seed=2)
+    router = LLMRouter(
+        [Backend(p.name, p, CircuitBreaker(5, 30.0)) for p in (primary, alternate)],
+        hedge_quantile=0.9, hedge_min_delay=0.05, hedge_default_delay=0.2, hedge_min_samples=20
+    )
+    await bench("hedged (p90 delay)", router.generate_text, [primary, alternate])
+    print(f"hedges {router.hedges}, hedge wins {router.hedge_wins}, "
+          f"hedge delay {router.hedge_delay(router.primary) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Memory, latency and recall@k of session storage modes: float32 rows,
+float16 rows, and int8 codes with per-row scales, each with and without
+rescoring the top candidates from full-precision rows on disk.
+
+    python benchmarks/bench_quantization.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.session_index import SessionIndex, recall_at_k
+
+DIM = 768
+N = 100_000
+K = 10
+QUERIES = 100
+CLUSTERS = 200
+NOISE = 1.5
+RESCORE_FACTOR = 4
+# Python float lists cost ~32 bytes per value (8-byte pointer + 24-byte float)
+LIST_BYTES_PER_CHUNK = DIM * 32
+
+
+def clustered(rng, centers, n):
+    return (centers[rng.integers(len(centers), size=n)] + NOISE * rng.normal(size=(n, DIM))).astype(np.float32)
+
+
+def build(data, **kwargs) -> SessionIndex:
+    index = SessionIndex(**kwargs)
+    for start in range(0, len(data), 5000):
+        index.add(data[start:start + 5000].tolist(), [{}] * len(data[start:start + 5000]))
+    return index
+
+
+def main():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(CLUSTERS, DIM))
+    data = clustered(rng, centers, N)
+    queries = clustered(rng, centers, QUERIES)
+
+    baseline = build(data)
+    expected = [baseline.search(q, K) for q in queries]
+
+    print(f"{N} chunks x {DIM} dims, k={K}, rescore factor {RESCORE_FACTOR}")
+    print(f"{'mode':>16}  {'bytes/chunk':>11}  {'vs lists':>8}  {'ms/q':>7}  {f'recall@{K}':>9}")
+    print("-" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in ["float32", "float16", "int8"]:
+            for rescore in ([False] if dtype == "float32" else [False, True]):
+                path = os.path.join(tmp, f"{dtype}.f32") if rescore else None
+                index = baseline if dtype == "float32" else build(
+                    data, dtype=dtype, rescore_path=path, rescore_factor=RESCORE_FACTOR
+                )
+
+                start = time.perf_counter()
+                results = [index.search(q, K) for q in queries]
+                ms = (time.perf_counter() - start) / QUERIES * 1000
+                recall = np.mean([recall_at_k(r, e) for r, e in zip(results, expected)])
+
+                per_chunk = index.nbytes / N
+                name = dtype + (" + rescore" if rescore else "")
+                print(f"{name:>16}  {per_chunk:11.0f}  {LIST_BYTES_PER_CHUNK / per_chunk:7.1f}x  {ms:7.2f}  {recall:9.3f}")
+                if index is not baseline:
+                    index.drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Per-query latency of session search: the old Python-list implementation
+(np.array + norms + full argsort on every query) vs SessionIndex.
+
+    python benchmarks/bench_session_search.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.session_index import SessionIndex
+
+DIM = 768
+K = 5
+QUERIES = 20
+# Python float lists cost ~32 bytes per value; 100k x 768 would need ~2.4GB
+LIST_BASELINE_MAX = 10_000
+
+
+def list_search(vectors, query, k):
+    vecs = np.array(vectors)
+    q = np.array(query)
+    vecs_norm = np.linalg.norm(vecs, axis=1)
+    vecs_norm[vecs_norm == 0] = 1e-10
+    sims = np.dot(vecs, q) / (vecs_norm * np.linalg.norm(q))
+    return np.argsort(sims)[-k:][::-1]
+
+
+def time_per_query(fn, queries) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    queries = rng.normal(size=(QUERIES, DIM)).astype(np.float32).tolist()
+
+    print(f"{'chunks':>8}  {'lists ms/q':>11}  {'index ms/q':>11}  {'speedup':>8}  {'lists MB':>9}  {'index MB':>9}")
+    print("-" * 66)
+    for n in [1_000, 10_000, 100_000]:
+        data = rng.normal(size=(n, DIM)).astype(np.float32)
+
+        index = SessionIndex()
+        for start in range(0, n, 1000):
+            index.add(data[start:start + 1000].tolist(), [{}] * len(data[start:start + 1000]))
+        index_ms = time_per_query(lambda q: index.search(q, K), queries)
+        index_mb = index.vectors.nbytes / 1e6
+
+        if n <= LIST_BASELINE_MAX:
+            vectors = data.tolist()
+            lists_ms = time_per_query(lambda q: list_search(vectors, q, K), queries)
+            lists_mb = n * DIM * 32 / 1e6  # 8-byte pointer + 24-byte float object
+            row = f"{lists_ms:11.2f}  {index_ms:11.2f}  {lists_ms / index_ms:7.1f}x  {lists_mb:9.1f}"
+        else:
+            row = f"{'skipped':>11}  {index_ms:11.2f}  {'-':>8}  {'-':>9}"
+        print(f"{n:>8}  {row}  {index_mb:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -57,7 +57,7 @@ async def main():
     
     try:
         # Ingest documents
-        await rag_service.ingest_data_folder()
+        stats = await rag_service.ingest_data_folder()
         
         # Save the vector database
         vector_db.save()
@@ -67,7 +67,8 @@ async def main():
         print("✅ Ingestion completed successfully!")
         print("=" * 60)
         print()
-        print(f"   Documents indexed: {len(files)}")
+        print(f"   Documents found: {len(files)} ({stats['skipped']} unchanged)")
+        print(f"   Chunks added: {stats['added']}, removed: {stats['deleted']}")
         print(f"   Vector database saved to: data/vector_store/")
         print()
         print("   Your documents are now ready to be searched during research!")
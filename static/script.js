@@ -69,6 +69,7 @@ const reportContent = document.getElementById('report-content');
 const backBtn = document.getElementById('back-btn');
 
 let pollInterval;
+let eventSource;
 
 // Log Management
 function addLog(log) {
@@ -119,35 +120,60 @@ async function startResearch(e) {
     }
 }
 
-function pollProgress(taskId) {
+function handleLog(log, taskId) {
+    addLog(log);
+
+    // Update status
+    if (statusTitle) {
+        statusTitle.textContent = log.status + "...";
+    }
+
+    // Check if completed
+    if (log.status === 'Completed') {
+        stopProgress();
+        fetchResult(taskId);
+    }
+}
+
+// Live preview of the report while the writer is still generating it
+let draftHtml = '';
+function handleReportDelta(data) {
+    draftHtml = data.replace ? data.delta : draftHtml + data.delta;
+    if (reportContent) reportContent.innerHTML = draftHtml;
+    showSection('result');
+}
+
+function stopProgress() {
     if (pollInterval) clearInterval(pollInterval);
-    
+    if (eventSource) eventSource.close();
+    pollInterval = null;
+    eventSource = null;
+}
+
+function pollProgress(taskId) {
+    stopProgress();
+    draftHtml = '';
+    if (logsContainer) logsContainer.innerHTML = '';
+
+    // Preferred: server pushes each log (reconnects resume via Last-Event-ID)
+    if (window.EventSource) {
+        eventSource = new EventSource(`${API_BASE}/stream/${taskId}/events`);
+        eventSource.addEventListener('log', (e) => handleLog(JSON.parse(e.data), taskId));
+        eventSource.addEventListener('report', (e) => handleReportDelta(JSON.parse(e.data)));
+        eventSource.addEventListener('end', stopProgress);
+        return;
+    }
+
+    // Fallback: poll, asking only for logs we haven't seen yet
+    let seen = 0;
     pollInterval = setInterval(async () => {
         try {
-            const res = await fetch(`${API_BASE}/stream/${taskId}`);
+            const res = await fetch(`${API_BASE}/stream/${taskId}?since=${seen}`);
             if (!res.ok) throw new Error('Failed to fetch progress');
             
             const logs = await res.json();
-            
-            // Clear and rebuild logs
-            if (logsContainer) {
-                logsContainer.innerHTML = '';
-                logs.forEach(addLog);
-            }
-
-            // Update status
-            const lastLog = logs[logs.length - 1];
-            if (lastLog) {
-                if (statusTitle) {
-                    statusTitle.textContent = lastLog.status + "...";
-                }
-                
-                // Check if completed
-                if (lastLog.status === 'Completed') {
-                    clearInterval(pollInterval);
-                    fetchResult(taskId);
-                }
-            }
+            seen += logs.length;
+            logs.forEach(log => handleLog(log, taskId));
 
         } catch (err) {
             console.error("Polling error", err);
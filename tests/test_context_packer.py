@@ -0,0 +1,105 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from app.agents.analyzer import AnalyzerAgent
+from app.services.chunking import get_text_splitter
+from app.services.context_packer import overlap_length, pack_context
+
+
+def _document(n_sentences: int, tag: str = "doc") -> str:
+    return " ".join(
+        f"Sentence {i} of {tag} explains a distinct detail about topic number {i}." for i in range(n_sentences)
+    )
+
+
+def test_overlap_length_finds_longest_shared_edge():
+    assert overlap_length("alpha beta gamma delta", "gamma delta epsilon", 5) == len("gamma delta")
+    assert overlap_length("alpha beta", "gamma delta", 3) == 0
+    # Shorter than the minimum doesn't count
+    assert overlap_length("abc xy", "xy def", 3) == 0
+
+
+def test_adjacent_splitter_chunks_merge_back_into_source_text():
+    text = _document(40)
+    chunks = get_text_splitter(1000, 200).split_text(text)
+    assert len(chunks) > 3
+
+    blocks, stats = pack_context(chunks, max_tokens=0)
+
+    assert blocks == [text]
+    assert stats["blocks"] == 1
+    assert stats["tokens_saved"] > 0
+    assert stats["tokens_truncated"] == 0
+    assert not stats["truncated"]
+
+
+def test_duplicates_and_contained_chunks_are_dropped():
+    chunk = _document(5)
+    blocks, stats = pack_context([chunk, chunk, chunk[20:200], "  "], max_tokens=0)
+
+    assert blocks == [chunk]
+    assert stats["chunks"] == 4
+
+
+def test_repeated_sentences_across_sources_are_removed_from_later_blocks():
+    shared = "This boilerplate disclaimer sentence appears in every single report."
+    first = f"Report A finds strong growth in the northern region. {shared}"
+    second = f"Report B finds weak demand in the southern region. {shared}"
+
+    blocks, _ = pack_context([first, second], max_tokens=0)
+
+    assert blocks[0] == first
+    assert blocks[1] == "Report B finds weak demand in the southern region."
+
+
+def test_budget_is_filled_in_relevance_order():
+    top, middle, low = _document(10, "top"), _document(10, "middle"), _document(10, "low")
+    budget = 200 + 200 + 100  # Roughly two documents and a half
+
+    blocks, stats = pack_context([top, middle, low], max_tokens=budget)
+
+    assert blocks[0] == top and blocks[1] == middle
+    assert blocks[2].endswith("...") and low.startswith(blocks[2][:-4].rstrip())
+    assert stats["tokens_after"] <= budget + 2
+    assert stats["truncated"]
+    # Nothing was redundant: everything removed was cut by the budget, not saved
+    assert stats["tokens_saved"] == 0
+    assert stats["tokens_truncated"] == stats["tokens_before"] - stats["tokens_after"]
+
+
+def test_merged_block_keeps_best_rank():
+    text = _document(40)
+    chunks = get_text_splitter(1000, 200).split_text(text)
+    other = _document(3, "other")
+
+    # The tail of the document is the best hit, so the merged document comes first
+    blocks, _ = pack_context([chunks[-1], other] + chunks[:-1], max_tokens=0)
+
+    assert blocks == [text, other]
+
+
+def test_sources_prevent_merging_across_documents():
+    left = "Intro text. " + "The shared middle sentence is long enough to merge."
+    right = "The shared middle sentence is long enough to merge." + " Outro text."
+
+    merged, _ = pack_context([left, right], max_tokens=0, min_overlap=20)
+    separate, _ = pack_context([left, right], max_tokens=0, min_overlap=20, sources=["a.pdf", "b.pdf"])
+
+    assert len(merged) == 1
+    assert len(separate) == 2
+
+
+def test_analyzer_sends_packed_context_and_reports_savings():
+    chunks = get_text_splitter(1000, 200).split_text(_document(40))
+    agent = AnalyzerAgent()
+
+    with patch("app.agents.analyzer.llm_client.generate_text", new_callable=AsyncMock) as generate:
+        generate.return_value = "insight"
+        assert asyncio.run(agent.analyze("What?", chunks)) == "insight"
+
+    prompt = generate.call_args.kwargs["user_prompt"]
+    assert "[Chunk 1]" in prompt and "[Chunk 2]" not in prompt
+    stats = agent.stats()
+    assert stats["calls"] == 1
+    assert stats["context_tokens_saved"] > 0
+    assert stats["context_tokens_truncated"] == 0
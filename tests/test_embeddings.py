@@ -0,0 +1,192 @@
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+from app.services.embeddings import EmbeddingService
+from app.services.embedding_cache import EmbeddingCache
+
+
+def test_batches_preserve_order_and_size():
+    calls = []
+
+    def backend(texts, task_type):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    service = EmbeddingService(backend=backend, batch_size=4, max_concurrency=2)
+    texts = ["x" * i for i in range(1, 11)]
+    embeddings = asyncio.run(service.embed_documents(texts))
+
+    assert embeddings == [[float(i)] for i in range(1, 11)]
+    assert [len(c) for c in calls] == [4, 4, 2]
+
+
+def test_one_bad_chunk_does_not_drop_its_batch():
+    def backend(texts, task_type):
+        if "bad" in texts:
+            raise RuntimeError("400 invalid content")
+        return [[1.0] for _ in texts]
+
+    service = EmbeddingService(backend=backend, batch_size=5, max_concurrency=1)
+    texts = ["a", "b", "bad", "c", "d", "e"]
+    embeddings = asyncio.run(service.embed_documents(texts))
+
+    assert embeddings == [[1.0], [1.0], None, [1.0], [1.0], [1.0]]
+
+
+def test_cache_skips_backend_for_repeated_content(tmp_path):
+    calls = []
+
+    def backend(texts, task_type):
+        calls.append(list(texts))
+        return [[0.5, float(len(t))] for t in texts]
+
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=100)
+    service = EmbeddingService(backend=backend, batch_size=10, cache=cache)
+
+    first = asyncio.run(service.embed_documents(["alpha", "beta"]))
+    second = asyncio.run(service.embed_documents(["beta", "alpha", "gamma"]))
+
+    assert calls == [["alpha", "beta"], ["gamma"]]
+    assert second == [first[1], first[0], [0.5, 5.0]]
+    # A different task type is a different key
+    asyncio.run(service.embed_documents(["alpha"], task_type="retrieval_query"))
+    assert calls[-1] == ["alpha"]
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 4
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put_many("m", "t", ["a"], [[1.0]])
+    cache.put_many("m", "t", ["b"], [[2.0]])
+    cache.get_many("m", "t", ["a"])  # "a" is now more recent than "b"
+    cache.put_many("m", "t", ["c"], [[3.0]])
+
+    assert cache.get_many("m", "t", ["a", "b", "c"]) == [[1.0], None, [3.0]]
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["entries"] == 2
+
+
+def test_query_cache_and_concurrent_miss_coalescing():
+    calls = []
+
+    def backend(texts, task_type):
+        calls.append((list(texts), task_type))
+        time.sleep(0.05)
+        return [[1.0, 2.0] for _ in texts]
+
+    service = EmbeddingService(backend=backend, query_cache_size=10)
+
+    async def run():
+        concurrent = await asyncio.gather(*[service.embed_query("What is RAG?") for _ in range(5)])
+        repeat = await service.embed_query("  what is   rag? ")
+        return concurrent, repeat
+
+    concurrent, repeat = asyncio.run(run())
+
+    # Embedded as the caller wrote it; the normalized form is only the cache key
+    assert calls == [(["What is RAG?"], "retrieval_query")]
+    assert concurrent == [[1.0, 2.0]] * 5
+    assert repeat == [1.0, 2.0]
+    stats = service.query_cache_stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 4, 1)
+
+
+def test_query_embeddings_keep_original_casing():
+    calls = []
+
+    def backend(texts, task_type):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    service = EmbeddingService(backend=backend, query_cache_size=10)
+
+    async def run():
+        first = await service.embed_queries(["  AIDS research ", "GO language", "aids  research"])
+        again = await service.embed_query("go LANGUAGE")
+        return first, again
+
+    first, again = asyncio.run(run())
+
+    assert calls == [["AIDS research", "GO language"]]
+    assert first[0] == first[2]
+    assert again == first[1]
+
+
+def test_cache_opens_database_lazily_and_off_the_event_loop(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    cache = EmbeddingCache(str(path), max_entries=100)
+    assert not path.exists()
+
+    threads = []
+    get_many = cache.get_many
+
+    def recording_get_many(*args):
+        threads.append(threading.current_thread())
+        return get_many(*args)
+
+    cache.get_many = recording_get_many
+    service = EmbeddingService(backend=lambda texts, task_type: [[1.0] for _ in texts], cache=cache)
+    asyncio.run(service.embed_documents(["alpha"]))
+
+    assert path.exists()
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_transient_failure_retries_the_whole_batch():
+    calls = []
+
+    def backend(texts, task_type):
+        calls.append(list(texts))
+        if len(calls) == 1:
+            raise RuntimeError("503 Service Unavailable")
+        return [[1.0] for _ in texts]
+
+    service = EmbeddingService(backend=backend, batch_size=4, max_concurrency=1)
+    with patch.object(EmbeddingService, "RETRY_BASE_DELAY", 0.0):
+        embeddings = asyncio.run(service.embed_documents(["a", "b", "c", "d"]))
+
+    # Resent as one batch instead of four single-item calls
+    assert calls == [["a", "b", "c", "d"]] * 2
+    assert embeddings == [[1.0]] * 4
+
+
+def test_rejected_batch_is_bisected_around_the_bad_chunk():
+    calls = []
+
+    def backend(texts, task_type):
+        calls.append(list(texts))
+        if "bad" in texts:
+            raise RuntimeError("400 invalid content")
+        return [[1.0] for _ in texts]
+
+    service = EmbeddingService(backend=backend, batch_size=8, max_concurrency=1)
+    texts = ["a", "b", "c", "d", "e", "bad", "f", "g"]
+    embeddings = asyncio.run(service.embed_documents(texts))
+
+    assert embeddings == [[1.0]] * 5 + [None] + [[1.0]] * 2
+    # 8 -> 4 + 4 -> 2 + 2 -> 1 + 1, instead of 1 + 8 single-item calls
+    assert len(calls) == 7
+
+
+def test_metrics_reads_embedding_cache_stats_off_the_event_loop(tmp_path):
+    from app.api import routes
+
+    threads = []
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=10)
+    stats = cache.stats
+
+    def recording_stats():
+        threads.append(threading.current_thread())
+        return stats()
+
+    cache.stats = recording_stats
+    with patch.object(routes.embedding_service, "cache", cache):
+        metrics = asyncio.run(routes.get_metrics())
+
+    assert threads and threads[0] is not threading.main_thread()
+    assert metrics["embedding_cache"]["entries"] == 0
@@ -0,0 +1,147 @@
+import asyncio
+import os
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from app.core.config import settings
+from app.services.rag import rag_service
+
+
+class FakeStore:
+    def __init__(self):
+        self.vectors = {}
+        self.embedded = []
+
+    def upsert_vectors(self, ids, vectors, metadatas):
+        for cid, meta in zip(ids, metadatas):
+            self.vectors[cid] = meta
+
+    def delete_vectors(self, ids):
+        for cid in ids:
+            self.vectors.pop(cid, None)
+
+    async def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[0.1, 0.2] for _ in texts]
+
+
+@contextmanager
+def fake_environment(tmp_path):
+    store = FakeStore()
+    os.makedirs(tmp_path / "raw", exist_ok=True)
+    with patch.object(settings, "DATA_DIR", str(tmp_path)), \
+         patch.object(settings, "INGEST_MANIFEST_PATH", str(tmp_path / "manifest.json")), \
+         patch("app.services.rag.vector_db", store), \
+         patch("app.services.rag.embedding_service", store):
+        yield store
+
+
+def write(tmp_path, name, text):
+    with open(tmp_path / "raw" / name, "w") as f:
+        f.write(text)
+
+
+def test_ingestion_is_incremental_and_idempotent(tmp_path):
+    with fake_environment(tmp_path) as store:
+        write(tmp_path, "a.txt", "Alpha document.")
+        write(tmp_path, "b.md", "Beta document.")
+
+        stats = asyncio.run(rag_service.ingest_data_folder())
+        assert stats == {"added": 2, "deleted": 0, "skipped": 0}
+        ids_after_first = set(store.vectors)
+
+        # Unchanged corpus: nothing is re-read or re-embedded
+        stats = asyncio.run(rag_service.ingest_data_folder())
+        assert stats == {"added": 0, "deleted": 0, "skipped": 2}
+        assert set(store.vectors) == ids_after_first
+        assert len(store.embedded) == 2
+
+        # Changed file replaces its chunk, removed file loses its vectors
+        write(tmp_path, "a.txt", "Alpha document, revised.")
+        os.remove(tmp_path / "raw" / "b.md")
+        stats = asyncio.run(rag_service.ingest_data_folder())
+
+        assert stats == {"added": 1, "deleted": 2, "skipped": 0}
+        assert [m["text"] for m in store.vectors.values()] == ["Alpha document, revised."]
+
+
+def test_chunk_ids_are_content_derived(tmp_path):
+    with fake_environment(tmp_path) as store:
+        write(tmp_path, "a.txt", "Same text.")
+        asyncio.run(rag_service.ingest_data_folder())
+        first_ids = set(store.vectors)
+
+    with fake_environment(tmp_path / "other") as store:
+        write(tmp_path / "other", "a.txt", "Same text.")
+        asyncio.run(rag_service.ingest_data_folder())
+        assert set(store.vectors) == first_ids
+
+
+def test_ingestion_commits_in_batches_and_resumes(tmp_path):
+    with fake_environment(tmp_path) as store, patch.object(settings, "INGEST_COMMIT_BATCH", 2):
+        for i in range(6):
+            write(tmp_path, f"doc{i}.txt", f"Document number {i}.")
+
+        upserts = []
+        real_upsert = store.upsert_vectors
+
+        def crashing_upsert(ids, vectors, metadatas):
+            if len(upserts) == 2:
+                raise RuntimeError("worker killed")
+            upserts.append(len(ids))
+            real_upsert(ids, vectors, metadatas)
+
+        with patch.object(store, "upsert_vectors", side_effect=crashing_upsert):
+            try:
+                asyncio.run(rag_service.ingest_data_folder())
+            except RuntimeError:
+                pass
+
+        # Each commit is a fixed-size batch, and committed files are in the manifest
+        assert upserts == [2, 2]
+        assert len(store.vectors) == 4
+
+        store.embedded.clear()
+        stats = asyncio.run(rag_service.ingest_data_folder())
+        assert stats == {"added": 2, "deleted": 0, "skipped": 4}
+        assert len(store.embedded) == 2
+        assert len(store.vectors) == 6
+
+
+def test_large_file_is_split_across_commit_batches(tmp_path):
+    with fake_environment(tmp_path) as store, patch.object(settings, "INGEST_COMMIT_BATCH", 3), \
+            patch.object(settings, "CHUNK_SIZE", 40), patch.object(settings, "CHUNK_OVERLAP", 0):
+        write(tmp_path, "big.txt", " ".join(f"Sentence number {i} of the big file." for i in range(10)))
+        write(tmp_path, "small.txt", "Small file.")
+
+        upserts = []
+        real_upsert = store.upsert_vectors
+
+        def recording_upsert(ids, vectors, metadatas):
+            upserts.append(len(ids))
+            real_upsert(ids, vectors, metadatas)
+
+        with patch.object(store, "upsert_vectors", side_effect=recording_upsert):
+            stats = asyncio.run(rag_service.ingest_data_folder())
+
+        assert stats["added"] == 11
+        # No commit is bigger than the batch, even for the 10-chunk file
+        assert max(upserts) == 3 and sum(upserts) == 11
+
+        stats = asyncio.run(rag_service.ingest_data_folder())
+        assert stats == {"added": 0, "deleted": 0, "skipped": 2}
+
+
+def test_process_pool_matches_in_process_splitting(tmp_path):
+    text = "\n\n".join(f"Paragraph {i}. " + "Some filler words here. " * 20 for i in range(12))
+    results = {}
+    for workers in (0, 2):
+        root = tmp_path / f"workers{workers}"
+        with fake_environment(root) as store, patch.object(settings, "INGEST_WORKERS", workers):
+            write(root, "a.txt", text)
+            write(root, "b.md", "Beta document.")
+            asyncio.run(rag_service.ingest_data_folder())
+            results[workers] = dict(store.vectors)
+
+    assert len(results[0]) > 2
+    assert results[2] == results[0]
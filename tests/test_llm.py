@@ -0,0 +1,168 @@
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+
+from app.core.hf_provider import HuggingFaceProvider
+from app.core.llm import LLMClient, StreamInterruptedError
+
+N_TASKS = 10
+CALL_LATENCY = 0.3
+
+
+def _gemini_client_with_latency():
+    async def fake_generate_content(model, contents):
+        await asyncio.sleep(CALL_LATENCY)
+        return MagicMock(text=f"answer to {contents[-5:]}")
+
+    client = LLMClient(provider="gemini")
+    client.client = MagicMock()
+    client.client.aio.models.generate_content = fake_generate_content
+    return client
+
+
+def test_gemini_calls_overlap_on_event_loop():
+    client = _gemini_client_with_latency()
+
+    async def run():
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            client.generate_text("sys", f"question {i}") for i in range(N_TASKS)
+        ])
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(run())
+
+    assert len(results) == N_TASKS
+    # N overlapping calls should take about as long as one, not N times as long
+    assert elapsed < CALL_LATENCY * 2
+
+
+def _huggingface_client_with_latency(requests_seen):
+    async def handler(request):
+        requests_seen.append(request)
+        await asyncio.sleep(CALL_LATENCY)
+        return httpx.Response(200, json=[{"generated_text": "ok"}])
+
+    client = LLMClient(provider="huggingface")
+    client.hf = HuggingFaceProvider(
+        url="http://hf.test/models/{model}", token="t", transport=httpx.MockTransport(handler)
+    )
+    return client
+
+
+def test_huggingface_calls_do_not_block_event_loop():
+    requests_seen = []
+    client = _huggingface_client_with_latency(requests_seen)
+
+    async def heartbeat(ticks):
+        # Keeps ticking only if the loop stays free while requests run
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.02)
+
+    async def run():
+        ticks = []
+        beat = asyncio.create_task(heartbeat(ticks))
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            client.generate_text("sys", f"question {i}") for i in range(N_TASKS)
+        ])
+        elapsed = time.perf_counter() - start
+        beat.cancel()
+        pooled = client.hf.client
+        await client.aclose()
+        return results, elapsed, ticks, pooled
+
+    results, elapsed, ticks, pooled = asyncio.run(run())
+
+    assert results == ["ok"] * N_TASKS
+    assert elapsed < CALL_LATENCY * 2
+    assert len(ticks) >= int(CALL_LATENCY / 0.02) // 2
+    # Every call went through the one shared client
+    assert len(requests_seen) == N_TASKS
+    assert pooled.is_closed
+    assert requests_seen[0].headers["Authorization"] == "Bearer t"
+    assert str(requests_seen[0].url).startswith("http://hf.test/models/")
+
+
+def test_huggingface_provider_uses_configured_endpoint_and_limits():
+    provider = HuggingFaceProvider(
+        url="http://localhost:9000/{model}", model="m", timeout=7, connect_timeout=2,
+        max_connections=3, http2=False
+    )
+
+    assert provider.url == "http://localhost:9000/m"
+    assert provider.timeout.read == 7
+    assert provider.timeout.connect == 2
+    assert provider.limits.max_connections == 3
+    assert provider.http2 is False
+
+
+def test_huggingface_http_errors_surface_to_retry_logic():
+    async def handler(request):
+        return httpx.Response(503, json={"error": "loading"})
+
+    provider = HuggingFaceProvider(url="http://hf.test/{model}", transport=httpx.MockTransport(handler))
+
+    async def run():
+        try:
+            await provider.generate("hi")
+        finally:
+            await provider.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
+
+
+def test_stream_text_yields_deltas_and_falls_back():
+    client = LLMClient(provider="gemini")
+    client.client = MagicMock()
+
+    async def fake_stream(model, contents):
+        async def gen():
+            for piece in ["<h1>", "Title", "</h1>"]:
+                yield MagicMock(text=piece)
+        return gen()
+
+    async def collect():
+        return [d async for d in client.stream_text("sys", "user")]
+
+    client.client.aio.models.generate_content_stream = fake_stream
+    assert asyncio.run(collect()) == ["<h1>", "Title", "</h1>"]
+
+    async def broken_stream(model, contents):
+        raise RuntimeError("stream unavailable")
+
+    async def fake_generate(model, contents):
+        return MagicMock(text="whole answer")
+
+    client.client.aio.models.generate_content_stream = broken_stream
+    client.client.aio.models.generate_content = fake_generate
+    assert asyncio.run(collect()) == ["whole answer"]
+
+
+def test_stream_text_raises_when_stream_breaks_after_partial_output():
+    client = LLMClient(provider="gemini")
+    client.client = MagicMock()
+
+    async def breaking_stream(model, contents):
+        async def gen():
+            yield MagicMock(text="<h1>")
+            yield MagicMock(text="Tit")
+            raise RuntimeError("connection reset")
+        return gen()
+
+    client.client.aio.models.generate_content_stream = breaking_stream
+    received = []
+
+    async def collect():
+        async for delta in client.stream_text("sys", "user"):
+            received.append(delta)
+
+    with pytest.raises(StreamInterruptedError) as excinfo:
+        asyncio.run(collect())
+    assert received == ["<h1>", "Tit"]
+    assert excinfo.value.partial == "<h1>Tit"
@@ -0,0 +1,136 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.core.llm import LLMClient
+from app.core.llm_cache import InMemoryResponseCache, ResponseCache
+
+
+def test_exact_hits_ignore_whitespace_and_track_metrics():
+    cache = InMemoryResponseCache(max_entries=10, ttl=60)
+
+    async def run():
+        await cache.set("ns", "What is   AI?\n", "answer", latency=2.5)
+        return (
+            await cache.get("ns", "  What is AI? "),
+            await cache.get("other-ns", "What is AI?"),
+        )
+
+    assert asyncio.run(run()) == ("answer", None)
+    stats = cache.stats()
+    assert stats["exact_hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["saved_latency_seconds"] == 2.5
+
+
+def test_ttl_and_size_eviction():
+    cache = InMemoryResponseCache(max_entries=2, ttl=60)
+
+    async def run():
+        with patch("app.core.llm_cache.time.monotonic", return_value=0.0):
+            for p in ["a", "b", "c"]:
+                await cache.set("ns", p, p.upper(), latency=1.0)
+            evicted = await cache.get("ns", "a")
+        with patch("app.core.llm_cache.time.monotonic", return_value=61.0):
+            expired = await cache.get("ns", "c")
+        return evicted, expired
+
+    assert asyncio.run(run()) == (None, None)
+
+
+def test_semantic_hits_within_threshold():
+    vectors = {
+        "How does solar power work?": [1.0, 0.0, 0.05],
+        "How does solar power work": [1.0, 0.0, 0.06],
+        "History of the Roman Empire": [0.0, 1.0, 0.0],
+    }
+
+    async def embed(text):
+        return vectors[text]
+
+    cache = InMemoryResponseCache(max_entries=10, ttl=60, embed=embed, similarity_threshold=0.99)
+
+    async def run():
+        await cache.set("ns", "How does solar power work?", "solar answer", latency=1.0)
+        return (
+            await cache.get("ns", "How does solar power work"),
+            await cache.get("ns", "History of the Roman Empire"),
+        )
+
+    assert asyncio.run(run()) == ("solar answer", None)
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_llm_client_serves_repeated_prompts_from_cache():
+    client = LLMClient(provider="gemini", cache=InMemoryResponseCache(max_entries=10, ttl=60))
+    client.client = MagicMock()
+    calls = []
+
+    async def fake_generate(model, contents):
+        calls.append(contents)
+        if "fail" in contents:
+            raise RuntimeError("500 internal")
+        return MagicMock(text="fresh answer")
+
+    client.client.aio.models.generate_content = fake_generate
+
+    async def run():
+        first = await client.generate_text("sys", "question")
+        second = await client.generate_text("sys", "question")
+        other_agent = await client.generate_text("other sys", "question")
+        await client.generate_text("sys", "fail")
+        await client.generate_text("sys", "fail")
+        return first, second, other_agent
+
+    assert asyncio.run(run()) == ("fresh answer",) * 3
+    # Second identical call is cached; errors are never cached
+    assert len(calls) == 4
+
+
+def test_semantic_miss_embeds_prompt_once():
+    embedded = []
+
+    async def embed(text):
+        embedded.append(text)
+        return [1.0, float(len(embedded))]
+
+    cache = InMemoryResponseCache(max_entries=10, ttl=60, embed=embed, similarity_threshold=0.9999)
+
+    async def run():
+        await cache.set("ns", "first prompt", "one", latency=1.0)
+        assert await cache.get("ns", "second prompt") is None
+        await cache.set("ns", "second prompt", "two", latency=1.0)
+
+    asyncio.run(run())
+    # One embedding for "first prompt", one shared by get+set of "second prompt"
+    assert embedded == ["first prompt", "second prompt"]
+
+
+def test_semantic_index_drops_evicted_entries_and_reuses_rows():
+    async def embed(text):
+        return {"a": [1.0, 0.0], "b": [0.0, 1.0], "c": [0.7, 0.7], "d": [0.1, 0.9], "a?": [1.0, 0.01]}[text]
+
+    cache = InMemoryResponseCache(max_entries=2, ttl=60, embed=embed, similarity_threshold=0.99)
+
+    async def run():
+        for prompt in ["a", "b", "c"]:
+            await cache.set("ns", prompt, prompt.upper(), latency=1.0)
+        # "a" was evicted, so its near-duplicate no longer matches it
+        miss = await cache.get("ns", "a?")
+        await cache.set("ns", "d", "D", latency=1.0)
+        return miss
+
+    assert asyncio.run(run()) is None
+    vectors = cache._vectors["ns"]
+    # Three rows were ever used at once; evicted rows are recycled, not appended
+    assert len(vectors.rows) == 2 and len(vectors.keys) == 3
+
+
+def test_response_cache_interface_is_abstract():
+    class Incomplete(ResponseCache):
+        async def get(self, namespace, prompt):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
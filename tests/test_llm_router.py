@@ -0,0 +1,170 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+from app.core.llm import build_llm_client, LLMClient
+from app.core.llm_cache import InMemoryResponseCache
+from app.core.llm_router import Backend, CircuitBreaker, LLMRouter
+
+
+class FakeClient:
+    """Stands in for LLMClient: fixed latency and answer per backend."""
+
+    def __init__(self, answer: str, latency: float = 0.0):
+        self.answer = answer
+        self.latency = latency
+        self.limiter = None
+        self.calls = 0
+        self.cancelled = 0
+
+    def _cache_namespace(self, system_prompt: str) -> str:
+        return f"fake|{system_prompt}"
+
+    async def generate_text(self, system_prompt: str, user_prompt: str) -> str:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self.answer
+
+    async def stream_text(self, system_prompt: str, user_prompt: str):
+        yield await self.generate_text(system_prompt, user_prompt)
+
+    async def aclose(self):
+        pass
+
+
+def _router(*clients, **options):
+    backends = [
+        Backend(f"b{i}", client, CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+        for i, client in enumerate(clients)
+    ]
+    options.setdefault("hedge_default_delay", 0.05)
+    options.setdefault("hedge_min_delay", 0.01)
+    return LLMRouter(backends, **options)
+
+
+def test_hedge_to_alternate_when_primary_is_slow():
+    slow, fast = FakeClient("slow", latency=1.0), FakeClient("fast", latency=0.01)
+    router = _router(slow, fast)
+
+    start = time.perf_counter()
+    answer = asyncio.run(router.generate_text("sys", "q"))
+    elapsed = time.perf_counter() - start
+
+    assert answer == "fast"
+    assert elapsed < 0.5
+    assert router.hedges == 1 and router.hedge_wins == 1
+    # The loser was cancelled, not left running
+    assert slow.cancelled == 1
+
+
+def test_no_hedge_when_primary_answers_in_time():
+    primary, alternate = FakeClient("primary", latency=0.0), FakeClient("alternate")
+    router = _router(primary, alternate)
+
+    assert asyncio.run(router.generate_text("sys", "q")) == "primary"
+    assert alternate.calls == 0
+    assert router.hedges == 0
+
+
+def test_hedge_delay_follows_recent_latency_quantile():
+    router = _router(FakeClient("a"), FakeClient("b"), hedge_min_samples=5, hedge_default_delay=9.0)
+    primary = router.primary
+    assert router.hedge_delay(primary) == 9.0
+
+    for seconds in [0.1, 0.2, 0.3, 0.4, 2.0]:
+        primary.latency.add(seconds)
+    assert router.hedge_delay(primary) == 2.0
+
+
+def test_failover_on_error_and_circuit_opens():
+    broken, healthy = FakeClient("Error generating response: boom"), FakeClient("ok")
+    router = _router(broken, healthy, hedge=False)
+
+    async def run():
+        return [await router.generate_text("sys", f"q{i}") for i in range(4)]
+
+    assert asyncio.run(run()) == ["ok"] * 4
+    # Two consecutive failures open the circuit; later calls skip the broken backend
+    assert broken.calls == 2
+    assert router.primary.breaker.state == CircuitBreaker.OPEN
+    assert router.failovers == 2
+
+
+def test_half_open_trial_closes_circuit_on_success():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()  # The single trial call
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_trial_failure_reopens_circuit():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.trips == 2
+
+
+def test_all_circuits_open_returns_error_without_calls():
+    client = FakeClient("Error generating response: boom")
+    router = _router(client, hedge=False)
+
+    async def run():
+        return [await router.generate_text("sys", "q") for _ in range(3)]
+
+    answers = asyncio.run(run())
+    assert answers[-1].startswith("Error: No LLM provider available")
+    assert client.calls == 2
+    assert router.rejected == 1
+
+
+def test_router_caches_answers_from_any_backend():
+    slow, fast = FakeClient("slow", latency=1.0), FakeClient("fast", latency=0.0)
+    router = _router(slow, fast, cache=InMemoryResponseCache(max_entries=10, ttl=60))
+
+    async def run():
+        return await router.generate_text("sys", "q"), await router.generate_text("sys", "q")
+
+    assert asyncio.run(run()) == ("fast", "fast")
+    assert fast.calls == 1
+
+
+def test_stream_falls_over_when_backend_fails_before_first_delta():
+    broken, healthy = FakeClient("Error generating response: boom"), FakeClient("ok")
+    router = _router(broken, healthy)
+
+    async def run():
+        return [delta async for delta in router.stream_text("sys", "q")]
+
+    assert asyncio.run(run()) == ["ok"]
+    assert healthy.calls == 1
+
+
+def test_build_llm_client_without_fallbacks_is_single_provider():
+    with patch("app.core.llm.settings.LLM_FALLBACKS", ""):
+        assert isinstance(build_llm_client(), LLMClient)
+
+
+def test_build_llm_client_routes_across_configured_fallbacks():
+    with patch("app.core.llm.settings.LLM_FALLBACKS", "gemini:gemini-2.0-flash-lite, huggingface"):
+        router = build_llm_client()
+
+    assert isinstance(router, LLMRouter)
+    assert len(router.backends) == 3
+    assert router.backends[1].client.model_name == "gemini-2.0-flash-lite"
+    assert router.backends[2].client.provider == "huggingface"
+    # Alternates get quotas of their own
+    assert router.backends[1].client.limiter is not router.backends[0].client.limiter
@@ -0,0 +1,57 @@
+import os
+from unittest.mock import patch
+
+from app.core.memory_budget import BudgetedLRU
+from app.services.document_manager import DocumentManager
+from app.services.session_index import SessionIndex
+
+
+def test_lru_eviction_under_budget():
+    evicted = []
+    store = BudgetedLRU("test", max_bytes=10, ttl=60, sizeof=len,
+                        on_evict=lambda k, v: evicted.append(k))
+    store["a"] = "xxxx"
+    store["b"] = "xxxx"
+    store["a"]  # "b" is now least recently used
+    store["c"] = "xxxx"
+
+    assert "b" not in store
+    assert evicted == ["b"]
+    assert store.total_bytes == 8
+    assert store.stats()["evictions_budget"] == 1
+
+
+def test_touch_remeasures_grown_entry():
+    store = BudgetedLRU("test", max_bytes=10, ttl=60, sizeof=len)
+    store["a"] = [1, 2]
+    store["b"] = [1, 2]
+    store["b"].extend(range(7))
+    store.touch("b")
+
+    assert list(store) == ["b"]
+    assert store.total_bytes == 9
+
+
+def test_idle_entries_expire():
+    store = BudgetedLRU("test", max_bytes=100, ttl=60, sizeof=len)
+    with patch("app.core.memory_budget.time.monotonic", return_value=1000.0):
+        store["a"] = "x"
+    with patch("app.core.memory_budget.time.monotonic", return_value=1061.0):
+        assert "a" not in store
+    assert store.stats()["evictions_ttl"] == 1
+
+
+def test_evicted_session_deletes_upload_files(tmp_path):
+    manager = DocumentManager()
+    manager.upload_dir = str(tmp_path)
+    manager.sessions.max_bytes = 5000
+
+    for session_id in ["old", "new"]:
+        index = SessionIndex()
+        index.add([[1.0] * 256], [{"text": "chunk", "source": "doc.txt"}])
+        (tmp_path / f"{session_id}_doc.txt").write_text("content")
+        manager.sessions[session_id] = {"vector_db": index, "documents": ["doc.txt"]}
+
+    assert "old" not in manager.sessions
+    assert not os.path.exists(tmp_path / "old_doc.txt")
+    assert os.path.exists(tmp_path / "new_doc.txt")
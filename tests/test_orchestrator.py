@@ -0,0 +1,81 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+from app.agents.orchestrator import orchestrator, subquestion_limiter
+from app.core.config import settings
+
+PLAN = [f"Question {i}?" for i in range(6)]
+
+
+def _run_workflow(prefetch=False):
+    logs = []
+
+    async def log_callback(t_id, status, details, step):
+        logs.append((status, details, step))
+
+    async def fake_research(sub_question):
+        await asyncio.sleep(0.1)
+        return [f"chunk for {sub_question}"]
+
+    async def fake_research_many(sub_questions):
+        await asyncio.sleep(0.1)
+        return [[f"chunk for {q}"] for q in sub_questions]
+
+    async def fake_analyze(sub_question, chunks):
+        # Earlier questions finish last, to prove ordering isn't completion order
+        await asyncio.sleep(0.05 * (len(PLAN) - PLAN.index(sub_question)))
+        return f"insight for {sub_question}"
+
+    async def fake_write(topic, insights, on_delta=None):
+        return insights
+
+    async def fake_plan(topic):
+        return PLAN
+
+    with patch("app.agents.orchestrator.planner.plan", side_effect=fake_plan), \
+         patch("app.agents.orchestrator.researcher.research", side_effect=fake_research) as research, \
+         patch("app.agents.orchestrator.researcher.research_many", side_effect=fake_research_many) as research_many, \
+         patch.object(settings, "RESEARCH_PREFETCH", prefetch), \
+         patch("app.agents.orchestrator.analyzer.analyze", side_effect=fake_analyze), \
+         patch("app.agents.orchestrator.writer.write_report", side_effect=fake_write), \
+         patch.object(subquestion_limiter, "min_interval", 0):
+        start = time.perf_counter()
+        insights = asyncio.run(orchestrator.run_workflow("task", "topic", log_callback))
+        elapsed = time.perf_counter() - start
+
+    if prefetch:
+        assert research_many.call_count == 1 and research.call_count == 0
+    return insights, logs, elapsed
+
+
+def test_parallel_execution_keeps_plan_order():
+    with patch.object(settings, "RESEARCH_CONCURRENCY", len(PLAN)):
+        insights, logs, elapsed = _run_workflow()
+
+    assert insights == [f"insight for {q}" for q in PLAN]
+    # Serial would be ~0.6s research + ~1.05s analysis
+    assert elapsed < 0.6
+
+    research_logs = [d for s, d, _ in logs if s == "Exec: Research"]
+    analyze_logs = [d for s, d, _ in logs if s == "Exec: Analyze"]
+    assert len(research_logs) == len(analyze_logs) == len(PLAN)
+    assert all(f"Step {i+1}/{len(PLAN)}: " in " ".join(research_logs) for i in range(len(PLAN)))
+
+
+def test_sequential_mode():
+    with patch.object(settings, "RESEARCH_CONCURRENCY", 1):
+        insights, logs, _ = _run_workflow()
+
+    assert insights == [f"insight for {q}" for q in PLAN]
+    exec_logs = [s for s, _, _ in logs if s.startswith("Exec")]
+    assert exec_logs == ["Exec: Research", "Exec: Analyze"] * len(PLAN)
+
+
+def test_prefetch_retrieves_whole_plan_once():
+    with patch.object(settings, "RESEARCH_CONCURRENCY", 1):
+        insights, logs, _ = _run_workflow(prefetch=True)
+
+    assert insights == [f"insight for {q}" for q in PLAN]
+    exec_logs = [s for s, _, _ in logs if s.startswith("Exec")]
+    assert exec_logs == ["Exec: Research"] + ["Exec: Analyze"] * len(PLAN)
@@ -0,0 +1,130 @@
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+
+import httpx
+from google.genai import errors
+
+from app.core.config import settings
+from app.core.llm import LLMClient
+from app.core.rate_limit import (
+    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, ProviderLimiter, RateLimiter, rate_limit_delay, request_priority
+)
+
+
+def test_rate_limiter_spaces_out_starts():
+    limiter = RateLimiter(min_interval=0.05)
+
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*[limiter.acquire() for _ in range(4)])
+        return time.perf_counter() - start
+
+    assert asyncio.run(run()) >= 0.15
+
+
+def test_requests_per_minute_are_paced():
+    # 600 RPM = one request every 0.1s once the burst is spent
+    limiter = ProviderLimiter("test", rpm=600, tpm=0)
+    limiter.requests.level = 0
+
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*[limiter.acquire() for _ in range(3)])
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    assert 0.25 <= elapsed < 0.6
+    assert limiter.stats()["waited"] == 3
+
+
+def test_token_budget_and_interactive_priority():
+    limiter = ProviderLimiter("test", rpm=0, tpm=6000)  # 100 tokens/s
+    limiter.tokens.level = 0
+    order = []
+
+    async def call(name, tokens, priority):
+        with request_priority(priority):
+            await limiter.acquire(tokens)
+        order.append(name)
+
+    async def run():
+        background = [asyncio.create_task(call(f"bg{i}", 10, PRIORITY_BACKGROUND)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(call("qa", 10, PRIORITY_INTERACTIVE))
+        await asyncio.gather(*background, interactive)
+
+    asyncio.run(run())
+    # bg0 was already first in line; the interactive call jumps the rest
+    assert order.index("qa") <= 1
+    assert order[-1] == "bg2"
+
+
+def test_quota_error_pauses_shared_limiter():
+    limiter = ProviderLimiter("test", rpm=0, tpm=0)
+    client = LLMClient(provider="gemini", limiter=limiter)
+    client.client = MagicMock()
+    calls = []
+
+    async def flaky_generate(model, contents):
+        calls.append(time.perf_counter())
+        if len(calls) == 1:
+            raise RuntimeError("429 quota exceeded, retry in 0s")
+        return MagicMock(text="ok")
+
+    client.client.aio.models.generate_content = flaky_generate
+    # "retry in 0s" + 1s buffer would be too slow for a test; shrink it
+    limiter.pause = lambda seconds, pause=limiter.pause: pause(0.1)
+
+    assert asyncio.run(client.generate_text("sys", "user")) == "ok"
+    assert calls[1] - calls[0] >= 0.09
+    assert limiter.stats()["pauses"] == 1
+
+
+def test_only_real_rate_limits_pause_generation():
+    limiter = ProviderLimiter("test", rpm=0, tpm=0)
+    client = LLMClient(provider="gemini", limiter=limiter)
+    client.client = MagicMock()
+
+    async def wrong_model(model, contents):
+        # Contains "rate" (generateContent) but is a 404
+        raise errors.ClientError(404, {"error": {"code": 404, "status": "NOT_FOUND",
+                                                 "message": "models/x is not supported for generateContent"}})
+
+    client.client.aio.models.generate_content = wrong_model
+    response = asyncio.run(client.generate_text("sys", "user"))
+
+    assert response.startswith("Error generating response")
+    assert limiter.stats()["pauses"] == 0
+
+
+def test_rate_limit_delay_uses_provider_hint_without_growth():
+    exhausted = errors.ClientError(429, {"error": {
+        "code": 429, "status": "RESOURCE_EXHAUSTED", "message": "Quota exceeded.",
+        "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "38s"}],
+    }})
+    assert rate_limit_delay(exhausted) == 39.0
+
+    response = httpx.Response(429, headers={"Retry-After": "7"}, request=httpx.Request("POST", "http://hf.test"))
+    assert rate_limit_delay(httpx.HTTPStatusError("Too Many Requests", request=response.request, response=response)) == 7.0
+    assert rate_limit_delay(RuntimeError("upstream rate estimator failed")) is None
+
+    limiter = ProviderLimiter("test", rpm=0, tpm=0)
+    client = LLMClient(provider="gemini", limiter=limiter)
+    client.client = MagicMock()
+    waits = []
+    calls = []
+
+    async def limited_twice(model, contents):
+        calls.append(1)
+        if len(calls) <= 2:
+            raise exhausted
+        return MagicMock(text="ok")
+
+    client.client.aio.models.generate_content = limited_twice
+    limiter.pause = lambda seconds, pause=limiter.pause: (waits.append(seconds), pause(0.01))
+    with patch.object(settings, "MAX_RETRIES", 3):
+        assert asyncio.run(client.generate_text("sys", "user")) == "ok"
+
+    # The provider's hint each time, not multiplied per attempt
+    assert waits == [39.0, 39.0]
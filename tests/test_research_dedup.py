@@ -0,0 +1,37 @@
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+from app.api.topic_registry import TopicRegistry, normalize_topic
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_normalize_topic():
+    assert normalize_topic("  Quantum   Computing? ") == normalize_topic("quantum computing")
+
+
+def test_registry_coalesces_running_and_reuses_fresh_results():
+    registry = TopicRegistry(freshness_seconds=60)
+    registry.start("Solar energy", "task-1")
+    assert registry.lookup("solar ENERGY!") == ("task-1", "running")
+
+    registry.finish("Solar energy", "task-1", success=True)
+    assert registry.lookup("Solar energy") == ("task-1", "completed")
+
+    registry.start("Wind power", "task-2")
+    registry.finish("Wind power", "task-2", success=False)
+    assert registry.lookup("Wind power") == (None, None)
+
+
+@patch('app.api.routes.orchestrator.run_workflow', new_callable=AsyncMock)
+def test_duplicate_topic_reuses_completed_report(mock_workflow):
+    mock_workflow.return_value = "<h1>Report</h1>"
+
+    first = client.post("/api/v1/research", json={"topic": "Dedup test topic"}).json()
+    second = client.post("/api/v1/research", json={"topic": "dedup   TEST topic?"}).json()
+
+    assert second["task_id"] == first["task_id"]
+    assert mock_workflow.await_count == 1
+    assert client.get(f"/api/v1/result/{second['task_id']}").json()["content_html"] == "<h1>Report</h1>"
@@ -0,0 +1,229 @@
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+from app.core.config import settings
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion
+from app.services.embeddings import EmbeddingService
+from app.services.rag import RAGService
+
+DOCS = {
+    "d1": "The XJ-9 reactor uses molten salt cooling.",
+    "d2": "Solar panels convert sunlight into electricity.",
+    "d3": "Wind turbines and solar farms feed the grid.",
+}
+
+
+class FakeVectorDB:
+    def __init__(self, dense_order):
+        self.dense_order = dense_order
+        self.query_calls = 0
+
+    def search_many(self, query_vectors, k):
+        self.query_calls += 1
+        return [
+            [{"id": d, "text": DOCS[d], "score": 0.1} for d in self.dense_order[:k]]
+            for _ in query_vectors
+        ]
+
+    def get_documents(self, ids):
+        return {d: {"text": DOCS[d]} for d in ids if d in DOCS}
+
+    def iter_documents(self):
+        yield list(DOCS), [{"text": t} for t in DOCS.values()]
+
+
+def test_bm25_exact_terms_and_incremental_updates():
+    index = BM25Index()
+    for doc_id, text in DOCS.items():
+        index.add(doc_id, text)
+
+    assert index.search("xj 9 reactor", k=1)[0][0] == "d1"
+    assert [d for d, _ in index.search("solar", k=3)] in (["d2", "d3"], ["d3", "d2"])
+
+    index.remove("d1")
+    assert index.search("reactor") == []
+    assert len(index) == 2
+
+
+def test_rrf_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"]])
+    assert fused[0][0] == "b"
+
+
+def _search(service, query, embed):
+    with patch("app.services.rag.embedding_service.embed_queries", side_effect=embed):
+        return asyncio.run(service.search(query, k=2))
+
+
+def test_hybrid_search_fuses_dense_and_lexical():
+    async def embed(queries):
+        return [[0.1, 0.2] for _ in queries]
+
+    service = RAGService()
+    # Dense retrieval misses the exact code; BM25 finds it
+    with patch("app.services.rag.vector_db", FakeVectorDB(["d2", "d3"])):
+        results = _search(service, "XJ-9 reactor", embed)
+
+    assert DOCS["d1"] in results
+    assert len(results) == 2
+
+
+def test_lexical_fast_path_when_embedding_is_slow():
+    async def slow_embed(queries):
+        await asyncio.sleep(1)
+        return [[0.1, 0.2] for _ in queries]
+
+    service = RAGService()
+    with patch("app.services.rag.vector_db", FakeVectorDB(["d2", "d3"])), \
+         patch.object(settings, "RETRIEVAL_EMBED_TIMEOUT", 0.05):
+        results = _search(service, "molten salt reactor", slow_embed)
+
+    assert results == [DOCS["d1"]]
+
+
+def test_search_many_batches_embedding_and_vector_query():
+    embed_calls = []
+
+    async def embed(queries):
+        embed_calls.append(list(queries))
+        return [[0.1, 0.2] for _ in queries]
+
+    service = RAGService()
+    fake_db = FakeVectorDB(["d2", "d3"])
+    queries = ["XJ-9 reactor", "solar power", "wind grid"]
+    with patch("app.services.rag.vector_db", fake_db), \
+         patch("app.services.rag.embedding_service.embed_queries", side_effect=embed):
+        results = asyncio.run(service.search_many(queries, k=2))
+
+    assert embed_calls == [queries]
+    assert fake_db.query_calls == 1
+    assert len(results) == len(queries)
+    assert DOCS["d1"] in results[0]
+
+
+def test_search_many_embeds_original_query_text_in_one_batch():
+    calls = []
+
+    def backend(texts, task_type):
+        calls.append(list(texts))
+        return [[0.1, 0.2] for _ in texts]
+
+    service = RAGService()
+    fake_db = FakeVectorDB(["d2", "d3"])
+    queries = ["XJ-9 Reactor", "US solar power", "us SOLAR   power"]
+    with patch("app.services.rag.vector_db", fake_db), \
+         patch("app.services.rag.embedding_service", EmbeddingService(backend=backend, query_cache_size=10)):
+        results = asyncio.run(service.search_many(queries, k=2))
+
+    # One call, as written; the third query shares the second's cache key
+    assert calls == [["XJ-9 Reactor", "US solar power"]]
+    assert len(results) == len(queries)
+
+
+def test_lexical_index_builds_once_off_the_event_loop():
+    build_threads = []
+
+    class SlowVectorDB(FakeVectorDB):
+        def iter_documents(self):
+            build_threads.append(threading.current_thread())
+            time.sleep(0.2)
+            yield from super().iter_documents()
+
+    service = RAGService()
+
+    async def run():
+        ticks = []
+
+        async def heartbeat():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        beat = asyncio.create_task(heartbeat())
+        await asyncio.gather(service.ensure_lexical_index(), service.ensure_lexical_index())
+        beat.cancel()
+        return ticks
+
+    with patch("app.services.rag.vector_db", SlowVectorDB([])):
+        ticks = asyncio.run(run())
+
+    assert len(build_threads) == 1 and build_threads[0] is not threading.main_thread()
+    # The loop kept running while the index was built
+    assert len(ticks) >= 5
+    assert len(service.lexical_index) == len(DOCS)
+
+
+def test_ingestion_changes_during_lexical_build_are_applied():
+    service = RAGService()
+
+    class SlowVectorDB(FakeVectorDB):
+        def iter_documents(self):
+            time.sleep(0.1)
+            yield from super().iter_documents()
+
+    async def run():
+        build = asyncio.create_task(service.ensure_lexical_index())
+        await asyncio.sleep(0.02)
+        service._update_lexical_index({"d4": "Tidal energy from ocean currents."}, ["d1"])
+        await build
+        return service.lexical_index.search("tidal ocean", 5), service.lexical_index.search("XJ-9 reactor", 5)
+
+    with patch("app.services.rag.vector_db", SlowVectorDB([])):
+        tidal, reactor = asyncio.run(run())
+
+    assert [doc_id for doc_id, _ in tidal] == ["d4"]
+    assert reactor == []
+
+
+def test_lexical_index_rebuilds_after_ingestion_in_another_process(tmp_path):
+    manifest = tmp_path / "ingest_manifest.json"
+    manifest.write_text("{}")
+    fake_db = FakeVectorDB([])
+    service = RAGService()
+
+    async def run():
+        await service.ensure_lexical_index()
+        before = service.lexical_index.search("tidal ocean", 5)
+
+        # ingest_documents.py commits a new chunk and saves its manifest
+        DOCS["d4"] = "Tidal energy from ocean currents."
+        manifest.write_text('{"files": {}}')
+        await service.ensure_lexical_index()
+        # Searches don't wait for the rebuild...
+        assert service._lexical_refresh is not None
+        await service._lexical_refresh
+        # ...and an unchanged manifest doesn't start another one
+        await service.ensure_lexical_index()
+        assert service._lexical_refresh is None
+        return before, service.lexical_index.search("tidal ocean", 5)
+
+    try:
+        with patch("app.services.rag.vector_db", fake_db), \
+                patch.object(settings, "INGEST_MANIFEST_PATH", str(manifest)):
+            before, after = asyncio.run(run())
+    finally:
+        DOCS.pop("d4", None)
+
+    assert before == []
+    assert [doc_id for doc_id, _ in after] == ["d4"]
+
+
+def test_large_lexical_scans_run_off_the_event_loop():
+    threads = []
+    service = RAGService()
+    search_all = service._lexical_search_all
+
+    def recording_search_all(queries, k):
+        threads.append(threading.current_thread())
+        return search_all(queries, k)
+
+    service._lexical_search_all = recording_search_all
+    with patch("app.services.rag.vector_db", FakeVectorDB([])), \
+            patch.object(settings, "RETRIEVAL_MODE", "lexical"), \
+            patch.object(RAGService, "LEXICAL_INLINE_POSTINGS", 1):
+        results = asyncio.run(service.search_many(["solar grid", "molten salt"], k=2))
+
+    assert threads and threads[0] is not threading.main_thread()
+    assert results[1] == [DOCS["d1"]]
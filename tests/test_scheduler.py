@@ -0,0 +1,150 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.api.scheduler import QueueFullError, TicketCancelledError, WorkflowScheduler
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_bounded_queue_runs_in_order_and_reports_positions():
+    async def run():
+        scheduler = WorkflowScheduler(max_concurrent=1, max_queue=2)
+        order, positions = [], {"b": [], "c": []}
+
+        assert scheduler.admit("a") == 0
+        assert scheduler.admit("b") == 1
+        assert scheduler.admit("c") == 2
+        with pytest.raises(QueueFullError):
+            scheduler.admit("d")
+
+        def job(name):
+            async def work():
+                order.append(name)
+                await asyncio.sleep(0.02)
+            return work
+
+        def reporter(name):
+            async def report(position):
+                positions[name].append(position)
+            return report
+
+        await asyncio.gather(
+            scheduler.run("a", job("a")),
+            scheduler.run("b", job("b"), reporter("b")),
+            scheduler.run("c", job("c"), reporter("c")),
+        )
+        return scheduler, order, positions
+
+    scheduler, order, positions = asyncio.run(run())
+    assert order == ["a", "b", "c"]
+    assert positions == {"b": [1], "c": [2, 1]}
+
+    stats = scheduler.stats()
+    assert stats["rejected"] == 1 and stats["completed"] == 3
+    assert stats["running"] == 0 and stats["queued"] == 0
+    assert stats["queue_wait_max_seconds"] >= 0.03
+    assert scheduler.retry_after() >= 1
+
+
+def test_cancelled_waiter_frees_its_queue_slot():
+    async def run():
+        scheduler = WorkflowScheduler(max_concurrent=1, max_queue=1)
+        scheduler.admit("a")
+        scheduler.admit("b")
+        release = asyncio.Event()
+
+        async def hold():
+            await release.wait()
+
+        running = asyncio.create_task(scheduler.run("a", hold))
+        waiting = asyncio.create_task(scheduler.run("b", hold))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.sleep(0)
+        position = scheduler.admit("c")
+        release.set()
+        await running
+        return position
+
+    assert asyncio.run(run()) == 1
+
+
+def test_full_queue_returns_429_with_retry_after():
+    with patch("app.api.routes.scheduler.admit", side_effect=QueueFullError("x")), \
+         patch("app.api.routes.scheduler.retry_after", return_value=12):
+        response = client.post("/api/v1/research", json={"topic": "Overloaded topic"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "12"
+
+
+def test_cancel_frees_admitted_slots_before_run():
+    scheduler = WorkflowScheduler(max_concurrent=1, max_queue=2)
+    scheduler.admit("a")
+    scheduler.admit("b")
+    assert scheduler.position("b") == 1
+
+    # "a" never runs: its slot passes to "b"
+    assert scheduler.cancel("a")
+    assert scheduler.position("b") == 0
+    assert scheduler.stats()["running"] == 1
+
+    scheduler.admit("c")
+    assert scheduler.cancel("c")
+    assert not scheduler.cancel("c")
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_slots_of_workflows_that_never_start_are_reclaimed():
+    scheduler = WorkflowScheduler(max_concurrent=1, max_queue=0, start_timeout=60)
+    now = [1000.0]
+
+    with patch("app.api.scheduler.time.monotonic", side_effect=lambda: now[0]):
+        scheduler.admit("lost")
+        with pytest.raises(QueueFullError):
+            scheduler.admit("next")
+
+        now[0] += 61
+        assert scheduler.admit("next") == 0
+        assert scheduler.stats()["reclaimed"] == 1
+
+
+def test_failed_task_creation_releases_the_slot():
+    running = routes.scheduler.stats()["running"]
+    with patch("app.api.routes.task_store.create", side_effect=RuntimeError("database is locked")):
+        with pytest.raises(RuntimeError):
+            client.post("/api/v1/research", json={"topic": "Unlucky topic"})
+
+    assert routes.scheduler.stats()["running"] == running
+    assert routes.scheduler.stats()["queued"] == 0
+
+
+def test_reclaimed_workflow_is_closed_out():
+    topic = "Topic whose workflow never starts"
+
+    async def run():
+        scheduler = WorkflowScheduler(max_concurrent=1, max_queue=0, start_timeout=60)
+        now = [1000.0]
+        with patch("app.api.scheduler.time.monotonic", side_effect=lambda: now[0]):
+            scheduler.admit("lost-task", on_cancel=routes._workflow_cancelled(topic))
+            await routes.task_store.create("lost-task")
+            routes.topic_registry.start(topic, "lost-task")
+
+            now[0] += 61
+            scheduler.stats()
+        await asyncio.gather(*routes._cancel_logs)
+
+        # A background task that finally shows up doesn't run a dead workflow
+        with pytest.raises(TicketCancelledError):
+            await scheduler.run("lost-task", lambda: asyncio.sleep(0))
+        return await routes.task_store.get_logs("lost-task")
+
+    logs = asyncio.run(run())
+    assert logs[-1]["status"] == "Error"
+    # Duplicates of the topic start a new workflow instead of joining the dead one
+    assert routes.topic_registry.lookup(topic) == (None, None)
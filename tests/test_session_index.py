@@ -0,0 +1,153 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from app.services.session_index import SessionIndex
+
+
+def test_search_matches_brute_force_cosine():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(1000, 32))
+    query = rng.normal(size=32)
+
+    index = SessionIndex()
+    # Insert in uneven slices to exercise growth
+    for start, stop in [(0, 10), (10, 300), (300, 1000)]:
+        index.add(vectors[start:stop].tolist(), [{"i": i} for i in range(start, stop)])
+
+    sims = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    expected = list(np.argsort(sims)[::-1][:5])
+
+    results = index.search(query.tolist(), k=5)
+    assert [i for i, _ in results] == expected
+    assert np.allclose([s for _, s in results], sims[expected], atol=1e-5)
+    assert [index.metadata[i]["i"] for i, _ in results] == expected
+    assert len(index) == 1000
+    assert index.vectors.dtype == np.float32
+
+
+def test_k_larger_than_index():
+    index = SessionIndex()
+    index.add([[1.0, 0.0], [0.0, 1.0]], [{}, {}])
+    assert [i for i, _ in index.search([1.0, 0.2], k=10)] == [0, 1]
+    assert SessionIndex().search([1.0, 0.0]) == []
+
+
+def _clustered(rng, centers, n):
+    return centers[rng.integers(len(centers), size=n)] + 0.3 * rng.normal(size=(n, centers.shape[1]))
+
+
+def test_ann_index_builds_above_threshold_with_high_recall():
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(50, 32))
+    vectors = _clustered(rng, centers, 4000)
+
+    index = SessionIndex(ann_min_size=2000, nprobe=8, recall_sample_every=1)
+    index.add(vectors[:1000].tolist(), [{}] * 1000)
+    assert index.ann is None
+    index.add(vectors[1000:3000].tolist(), [{}] * 2000)
+    # Training is left to the caller (a worker thread in the app)
+    assert index.ann is None and index.ann_pending
+    assert index.build_ann()
+    assert index.ann is not None and not index.ann_pending
+
+    # Incremental insert: new rows are findable without a rebuild
+    lists = index.ann.n_lists
+    index.add(vectors[3000:].tolist(), [{}] * 1000)
+    assert index.ann.n_lists == lists
+    assert index.search(vectors[3500].tolist(), k=1)[0][0] == 3500
+
+    for q in _clustered(rng, centers, 50):
+        index.search(q.tolist(), k=10)
+    stats = index.ann_stats()
+    assert stats["recall_checks"] == 51
+    assert stats["recall_at_k"] >= 0.9
+
+    exact = index.search(vectors[0].tolist(), k=5, exact=True)
+    assert exact[0][0] == 0
+
+
+def test_rows_appended_during_ann_build_are_indexed():
+    rng = np.random.default_rng(3)
+    centers = rng.normal(size=(20, 16))
+    vectors = _clustered(rng, centers, 2100)
+
+    index = SessionIndex(ann_min_size=1000)
+    index.add(vectors[:2000].tolist(), [{}] * 2000)
+
+    rows = index._rows
+
+    def rows_with_concurrent_append(i, view=None):
+        if len(index) == 2000:
+            # Another request appends while the lists are being trained
+            index.add(vectors[2000:].tolist(), [{}] * 100)
+        return rows(i, view)
+
+    index._rows = rows_with_concurrent_append
+    assert index.build_ann()
+
+    assert index.ann.trained_size == 2000
+    assert len(index) == 2100
+    assert index.search(vectors[2050].tolist(), k=1)[0][0] == 2050
+
+
+@pytest.mark.parametrize("dtype,bytes_per_value", [("float16", 2), ("int8", 1)])
+def test_compact_storage_with_rescoring(tmp_path, dtype, bytes_per_value):
+    rng = np.random.default_rng(2)
+    centers = rng.normal(size=(50, 64))
+    vectors = _clustered(rng, centers, 3000)
+    rescore_path = str(tmp_path / "vectors.f32")
+
+    exact = SessionIndex()
+    compact = SessionIndex(dtype=dtype, rescore_path=rescore_path, rescore_factor=4)
+    for index in (exact, compact):
+        index.add(vectors[:1000].tolist(), [{}] * 1000)
+        index.add(vectors[1000:].tolist(), [{}] * 2000)
+
+    assert compact.vectors.dtype == np.dtype(dtype)
+    assert compact.vectors.nbytes == 3000 * 64 * bytes_per_value
+
+    for q in _clustered(rng, centers, 20):
+        expected = exact.search(q.tolist(), k=10)
+        results = compact.search(q.tolist(), k=10)
+        # Rescored from full-precision rows: same neighbours, exact scores
+        assert [i for i, _ in results] == [i for i, _ in expected]
+        assert np.allclose([s for _, s in results], [s for _, s in expected], atol=1e-5)
+
+    compact.drop()
+    assert not os.path.exists(rescore_path)
+
+
+def test_int8_without_rescoring_stays_close():
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(500, 64))
+    index = SessionIndex(dtype="int8")
+    index.add(vectors.tolist(), [{}] * 500)
+
+    results = index.search(vectors[7].tolist(), k=3)
+    assert results[0][0] == 7
+    assert abs(results[0][1] - 1.0) < 0.01
+
+
+def test_search_during_concurrent_appends(tmp_path):
+    rng = np.random.default_rng(4)
+    vectors = rng.normal(size=(6000, 32))
+    index = SessionIndex(dtype="int8", rescore_path=str(tmp_path / "vectors.f32"))
+    index.add(vectors[:100].tolist(), [{}] * 100)
+
+    def upload():
+        # Uneven batches cross several capacity doublings
+        for start in range(100, 6000, 190):
+            index.add(vectors[start:start + 190].tolist(), [{}] * len(vectors[start:start + 190]))
+
+    writer = threading.Thread(target=upload)
+    writer.start()
+    searches = 0
+    while writer.is_alive() or searches < 50:
+        results = index.search(vectors[searches % 100].tolist(), k=3)
+        assert results[0][0] == searches % 100
+        searches += 1
+    writer.join()
+    assert len(index) == 6000
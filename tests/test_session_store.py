@@ -0,0 +1,177 @@
+import asyncio
+import io
+import os
+import threading
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+from fastapi import UploadFile
+
+from app.api import routes
+from app.api.models import DocumentQnARequest
+from app.core.config import settings
+from app.services.document_manager import DocumentManager
+from app.services.session_store import PersistentSessionIndex
+
+DIM = 16
+
+
+def _fake_embed(texts):
+    rng = np.random.default_rng(abs(hash(texts[0])) % 2**32)
+    return rng.normal(size=(len(texts), DIM)).tolist()
+
+
+def _manager(upload_dir):
+    manager = DocumentManager()
+    manager.upload_dir = str(upload_dir)
+    return manager
+
+
+def _upload(manager, name, text, session_id=None):
+    async def embed_documents(texts):
+        return _fake_embed(texts)
+
+    file = UploadFile(file=io.BytesIO(text.encode()), filename=name)
+    with patch("app.services.document_manager.embedding_service.embed_documents", side_effect=embed_documents):
+        return asyncio.run(manager.upload_documents([file], session_id))
+
+
+def test_index_survives_reopen_and_sees_other_writers(tmp_path):
+    rows = np.random.default_rng(0).normal(size=(300, DIM))
+    writer = PersistentSessionIndex.create(str(tmp_path / "s"), dtype="int8")
+    writer.add(rows[:200].tolist(), [{"i": i} for i in range(200)])
+
+    reader = PersistentSessionIndex.open(str(tmp_path / "s"))
+    assert len(reader) == 200
+    assert isinstance(reader.vectors, np.memmap)
+    assert reader.search(rows[5].tolist(), k=1)[0][0] == 5
+
+    # Appends past the initial capacity swap in a bigger file
+    writer.add(rows[200:].tolist(), [{"i": i} for i in range(200, 300)])
+    assert reader.refresh()
+    assert len(reader) == 300
+    assert reader.search(rows[250].tolist(), k=1)[0][0] == 250
+    assert reader.metadata[250] == {"i": 250}
+    assert not reader.refresh()
+
+
+def test_session_reloads_after_restart(tmp_path):
+    with patch.object(settings, "SESSION_PERSIST", True):
+        first = _manager(tmp_path)
+        session_id, uploaded = _upload(first, "notes.txt", "Reactor notes. " * 20)
+        assert uploaded == ["notes.txt"]
+
+        # A new process (or another worker) finds the session lazily
+        second = _manager(tmp_path)
+        assert session_id not in second.sessions
+        info = asyncio.run(second.get_session_info(session_id))
+        assert info["documents"] == ["notes.txt"]
+        assert info["vector_count"] == len(first.sessions[session_id]["vector_db"])
+
+        _upload(second, "more.txt", "Solar notes. " * 20, session_id)
+        assert asyncio.run(first.get_session_info(session_id))["documents"] == ["notes.txt", "more.txt"]
+
+        assert asyncio.run(second.delete_session(session_id))
+        assert not os.path.exists(tmp_path / session_id)
+        assert asyncio.run(first.get_session("../" + session_id)) is None
+
+
+def test_expired_sessions_are_purged_on_startup(tmp_path):
+    with patch.object(settings, "SESSION_PERSIST", True):
+        session_id, _ = _upload(_manager(tmp_path), "notes.txt", "Some text. " * 20)
+        old = os.path.getmtime(tmp_path / session_id / "session.json") - settings.SESSION_TTL_SECONDS - 1
+        os.utime(tmp_path / session_id / "session.json", (old, old))
+
+        manager = DocumentManager.__new__(DocumentManager)
+        manager.upload_dir = str(tmp_path)
+        manager._purge_expired_sessions()
+
+    assert not os.path.exists(tmp_path / session_id)
+    assert not os.path.exists(tmp_path / f"{session_id}_notes.txt")
+
+
+def test_upload_trains_ann_in_a_worker_thread(tmp_path):
+    threads = []
+    build_ann = PersistentSessionIndex.build_ann
+
+    def recording_build_ann(self):
+        threads.append(threading.current_thread())
+        return build_ann(self)
+
+    async def embed_documents(texts):
+        return _fake_embed(texts)
+
+    async def run(manager):
+        file = UploadFile(file=io.BytesIO(("Reactor notes. " * 400).encode()), filename="notes.txt")
+        session_id, _ = await manager.upload_documents([file])
+        vdb = manager.sessions[session_id]["vector_db"]
+        # Searches stay exact until the background build is swapped in
+        assert vdb.ann is None
+        await asyncio.gather(*manager._ann_builds)
+        return vdb
+
+    with patch.object(settings, "SESSION_PERSIST", True), patch.object(settings, "ANN_MIN_VECTORS", 4), \
+            patch.object(PersistentSessionIndex, "build_ann", recording_build_ann), \
+            patch("app.services.document_manager.embedding_service.embed_documents", side_effect=embed_documents):
+        vdb = asyncio.run(run(_manager(tmp_path)))
+
+    assert vdb.ann is not None
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_rescore_factor_zero_keeps_no_full_precision_rows(tmp_path):
+    with patch.object(settings, "SESSION_PERSIST", True), patch.object(settings, "SESSION_VECTOR_DTYPE", "int8"), \
+            patch.object(settings, "SESSION_RESCORE_FACTOR", 0):
+        session_id, _ = _upload(_manager(tmp_path), "notes.txt", "Reactor notes. " * 200)
+
+    assert not os.path.exists(tmp_path / session_id / "full.f32")
+    # Reopened with rescoring on, the session still uses the layout it was created with
+    reopened = PersistentSessionIndex.open(str(tmp_path / session_id), rescore_factor=4)
+    assert reopened.rescore_path is None
+    assert reopened.search(_fake_embed(["x"])[0], k=1)
+
+
+def test_session_file_io_runs_off_the_event_loop(tmp_path):
+    threads = []
+
+    def recording(method):
+        def wrapper(self, *args):
+            threads.append((method.__name__, threading.current_thread()))
+            return method(self, *args)
+        return wrapper
+
+    with patch.object(settings, "SESSION_PERSIST", True), \
+            patch.object(PersistentSessionIndex, "add", recording(PersistentSessionIndex.add)), \
+            patch.object(PersistentSessionIndex, "refresh", recording(PersistentSessionIndex.refresh)):
+        session_id, _ = _upload(_manager(tmp_path), "notes.txt", "Reactor notes. " * 20)
+        # Another worker maps the session from disk
+        assert asyncio.run(_manager(tmp_path).get_session(session_id)) is not None
+
+    assert {name for name, _ in threads} == {"add", "refresh"}
+    assert all(thread is not threading.main_thread() for _, thread in threads)
+
+
+def test_question_loads_the_session_once(tmp_path):
+    with patch.object(settings, "SESSION_PERSIST", True):
+        manager = _manager(tmp_path)
+        session_id, _ = _upload(manager, "notes.txt", "Reactor notes. " * 20)
+
+        async def embed_query(query):
+            return _fake_embed([query])[0]
+
+        get_session = manager.get_session
+        calls = []
+
+        async def counting_get_session(sid):
+            calls.append(sid)
+            return await get_session(sid)
+
+        with patch.object(routes, "document_manager", manager), \
+                patch.object(manager, "get_session", side_effect=counting_get_session), \
+                patch("app.services.document_manager.embedding_service.embed_query", side_effect=embed_query), \
+                patch("app.api.routes.llm_client.generate_text", new_callable=AsyncMock) as generate:
+            generate.return_value = "answer"
+            response = asyncio.run(routes.ask_question(DocumentQnARequest(session_id=session_id, question="Reactor?")))
+
+    assert response.answer == "answer"
+    assert calls == [session_id]
@@ -0,0 +1,102 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.api.models import StreamLog
+from app.api.streaming import LogNotifier
+from app.api.task_store import task_store
+from app.core.config import settings
+from app.main import app
+
+client = TestClient(app)
+
+
+def _seed_task(task_id, statuses):
+    async def seed():
+        await task_store.create(task_id)
+        for i, s in enumerate(statuses):
+            log = StreamLog(task_id=task_id, status=s, details=f"log {i}", step="step")
+            await task_store.append_log(task_id, log.model_dump())
+
+    asyncio.run(seed())
+
+
+def _read_events(response):
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        events.append(fields)
+    return events
+
+
+def test_sse_replays_and_resumes_from_last_event_id():
+    _seed_task("sse-task", ["Started", "Planning", "Writing", "Completed"])
+
+    response = client.get("/api/v1/stream/sse-task/events")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _read_events(response)
+    assert [e.get("id") for e in events] == ["0", "1", "2", "3", None]
+    assert events[-1]["event"] == "end"
+    assert json.loads(events[3]["data"])["status"] == "Completed"
+
+    resumed = _read_events(client.get("/api/v1/stream/sse-task/events", headers={"Last-Event-ID": "1"}))
+    assert [e.get("id") for e in resumed] == ["2", "3", None]
+
+
+def test_polling_since_offset():
+    _seed_task("poll-task", ["Started", "Planning", "Exec: Research"])
+
+    assert len(client.get("/api/v1/stream/poll-task").json()) == 3
+    newer = client.get("/api/v1/stream/poll-task", params={"since": 2}).json()
+    assert [log["status"] for log in newer] == ["Exec: Research"]
+
+
+def test_notifier_wakes_waiters():
+    async def run():
+        notifier = LogNotifier()
+        waiter = asyncio.create_task(notifier.wait("t", timeout=5))
+        await asyncio.sleep(0)
+        notifier.notify("t")
+        woke = await waiter
+        timed_out = await notifier.wait("t", timeout=0.01)
+        return woke, timed_out
+
+    assert asyncio.run(run()) == (True, False)
+
+
+def test_sse_for_unknown_task_is_404():
+    assert client.get("/api/v1/stream/no-such-task/events").status_code == 404
+
+
+def test_sse_ends_when_task_is_evicted_mid_stream():
+    _seed_task("evicted-task", ["Started"])
+    real_get_logs = task_store.get_logs
+    calls = []
+
+    async def get_logs(task_id, since=0):
+        calls.append(since)
+        # First read sees the task; then it is evicted
+        return await real_get_logs(task_id, since) if len(calls) == 1 else None
+
+    with patch.object(task_store, "get_logs", get_logs), \
+            patch.object(settings, "SSE_POLL_INTERVAL", 0.01):
+        events = _read_events(client.get("/api/v1/stream/evicted-task/events"))
+
+    assert [e.get("event") for e in events] == ["log", "end"]
+
+
+def test_notifier_forgets_tasks_without_waiters():
+    async def run():
+        notifier = LogNotifier()
+        await asyncio.gather(notifier.wait("t", timeout=0.01), notifier.wait("t", timeout=0.02))
+        after_timeouts = dict(notifier._events)
+
+        waiter = asyncio.create_task(notifier.wait("u", timeout=5))
+        await asyncio.sleep(0)
+        notifier.notify("u")
+        await waiter
+        return after_timeouts, notifier._events, notifier._waiters
+
+    assert asyncio.run(run()) == ({}, {}, {})
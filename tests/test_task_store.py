@@ -0,0 +1,176 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.api.task_store import MemoryTaskStore, RedisTaskStore, SQLiteTaskStore, TaskStore
+from app.core.resp import RespClient, encode_command, read_reply
+
+
+class StandInRedis:
+    """Just enough of a Redis server (RESP over TCP) for RedisTaskStore."""
+
+    def __init__(self):
+        self.data = {}
+
+    def handle(self, cmd, *args):
+        cmd = cmd.decode().upper()
+        if cmd == "SET":
+            self.data[args[0]] = args[1]
+            return "+OK"
+        if cmd == "GET":
+            return self.data.get(args[0])
+        if cmd == "EXISTS":
+            return sum(1 for key in args if key in self.data)
+        if cmd == "DEL":
+            return sum(1 for key in args if self.data.pop(key, None) is not None)
+        if cmd == "EXPIRE":
+            return int(args[0] in self.data)
+        if cmd == "RPUSH":
+            self.data.setdefault(args[0], []).extend(args[1:])
+            return len(self.data[args[0]])
+        if cmd == "LRANGE":
+            items = self.data.get(args[0], [])
+            start, stop = int(args[1]), int(args[2])
+            return items[start:] if stop == -1 else items[start:stop + 1]
+        return ValueError(f"unknown command {cmd}")
+
+    @staticmethod
+    def encode(reply) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, ValueError):
+            return f"-ERR {reply}\r\n".encode()
+        if isinstance(reply, str):
+            return reply.encode() + b"\r\n"
+        if isinstance(reply, int):
+            return f":{reply}\r\n".encode()
+        if isinstance(reply, list):
+            return f"*{len(reply)}\r\n".encode() + b"".join(StandInRedis.encode(r) for r in reply)
+        return f"${len(reply)}\r\n".encode() + reply + b"\r\n"
+
+    async def serve(self, reader, writer):
+        try:
+            while True:
+                command = await read_reply(reader)
+                writer.write(self.encode(self.handle(*command)))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+
+async def _exercise(store):
+    assert await store.get_logs("t1") is None
+    await store.create("t1")
+    assert await store.exists("t1")
+    assert await store.get_logs("t1") == []
+
+    for i in range(5):
+        await store.append_log("t1", {"status": f"s{i}", "details": "x"})
+    assert [log["status"] for log in await store.get_logs("t1", since=3)] == ["s3", "s4"]
+
+    await store.append_draft("t1", "<h1>")
+    await store.append_draft("t1", "Title</h1>")
+    assert await store.get_drafts("t1", since=1) == ["Title</h1>"]
+    await store.clear_drafts("t1")
+    assert await store.get_drafts("t1") == []
+
+    assert not await store.has_result("t1")
+    await store.set_result("t1", {"task_id": "t1", "topic": "t", "content_html": "<p>ok</p>"})
+    assert (await store.get_result("t1"))["content_html"] == "<p>ok</p>"
+    assert await store.has_result("t1")
+    assert "backend" in await store.stats()
+
+
+def test_memory_store():
+    asyncio.run(_exercise(MemoryTaskStore(logs_budget=10**6, results_budget=10**6, ttl=60)))
+
+
+def test_sqlite_store_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "tasks.sqlite3")
+    asyncio.run(_exercise(SQLiteTaskStore(path, ttl=60)))
+
+    # A second worker process would open its own connection to the same file
+    other = SQLiteTaskStore(path, ttl=60)
+    logs = asyncio.run(other.get_logs("t1"))
+    assert [log["status"] for log in logs] == [f"s{i}" for i in range(5)]
+
+
+def test_sqlite_store_queries_run_off_the_event_loop(tmp_path):
+    store = SQLiteTaskStore(str(tmp_path / "tasks.sqlite3"), ttl=60)
+    threads = []
+    get_logs = store._get_logs
+
+    def recording_get_logs(*args):
+        threads.append(threading.current_thread())
+        return get_logs(*args)
+
+    store._get_logs = recording_get_logs
+    asyncio.run(store.create("t1"))
+    assert asyncio.run(store.get_logs("t1")) == []
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_task_store_interface_is_abstract():
+    class Partial(TaskStore):
+        async def create(self, task_id):
+            pass
+
+    with pytest.raises(TypeError):
+        TaskStore()
+    # A backend missing any method fails at construction, not on first use
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_redis_store_against_stand_in_server():
+    async def run():
+        server = StandInRedis()
+        tcp = await asyncio.start_server(server.serve, "127.0.0.1", 0)
+        port = tcp.sockets[0].getsockname()[1]
+        client = RespClient(f"redis://127.0.0.1:{port}/0")
+        try:
+            await _exercise(RedisTaskStore(client, ttl=60))
+            assert len(server.data[b"ragentic:task:t1:logs"]) == 5
+        finally:
+            await client.close()
+            tcp.close()
+
+    asyncio.run(run())
+
+
+def test_cancelled_command_does_not_leak_its_reply_to_the_next_one():
+    class SlowRedis(StandInRedis):
+        async def serve(self, reader, writer):
+            try:
+                while True:
+                    command = await read_reply(reader)
+                    if command[1:] == [b"a"]:
+                        await asyncio.sleep(0.05)
+                    writer.write(self.encode(self.handle(*command)))
+                    await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                writer.close()
+
+    async def run():
+        server = SlowRedis()
+        server.data = {b"a": b"AAA", b"b": b"BBB"}
+        tcp = await asyncio.start_server(server.serve, "127.0.0.1", 0)
+        client = RespClient(f"redis://127.0.0.1:{tcp.sockets[0].getsockname()[1]}/0")
+        try:
+            in_flight = asyncio.create_task(client.execute("GET", "a"))
+            await asyncio.sleep(0.01)
+            in_flight.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await in_flight
+            await asyncio.sleep(0.06)
+            return await client.execute("GET", "b")
+        finally:
+            await client.close()
+            tcp.close()
+
+    assert asyncio.run(run()) == b"BBB"
+
+
+def test_resp_encoding():
+    assert encode_command(("SET", "k", 1)) == b"*3\r\n$3\r\nSET\r\n$1\r\nk\r\n$1\r\n1\r\n"
@@ -0,0 +1,71 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.agents.writer import FenceStripper, writer
+from app.core.llm import StreamInterruptedError
+
+RAW = "  ```html\n<h1>Report</h1>\n<p>Use `code` here.</p>\n```  "
+
+
+def _split_every(text, n):
+    return [text[i:i + n] for i in range(0, len(text), n)]
+
+
+def test_fence_stripper_matches_batch_cleanup_for_any_split():
+    expected = RAW.replace("```html", "").replace("```", "").strip()
+    for n in range(1, len(RAW) + 1):
+        stripper = FenceStripper()
+        out = "".join(stripper.feed(d) for d in _split_every(RAW, n)) + stripper.flush()
+        assert out.strip() == expected, n
+
+
+def test_write_report_streams_deltas():
+    async def fake_stream(system_prompt, user_prompt):
+        for delta in _split_every(RAW, 3):
+            yield delta
+
+    received = []
+
+    async def on_delta(delta):
+        received.append(delta)
+
+    with patch("app.agents.writer.llm_client.stream_text", side_effect=fake_stream):
+        html = asyncio.run(writer.write_report("topic", ["insight"], on_delta=on_delta))
+
+    assert html == "<h1>Report</h1>\n<p>Use `code` here.</p>"
+    assert len(received) > 1
+    assert "".join(received).strip() == html
+
+
+def test_write_report_regenerates_when_stream_breaks_midway():
+    async def broken_stream(system_prompt, user_prompt):
+        yield "<h1>Rep"
+        raise StreamInterruptedError("<h1>Rep", RuntimeError("connection reset"))
+
+    async def on_delta(delta):
+        pass
+
+    with patch("app.agents.writer.llm_client.stream_text", side_effect=broken_stream), \
+            patch("app.agents.writer.llm_client.generate_text", new_callable=AsyncMock) as generate:
+        generate.return_value = "```html\n<h1>Report</h1>\n```"
+        html = asyncio.run(writer.write_report("topic", ["insight"], on_delta=on_delta))
+
+    assert html == "<h1>Report</h1>"
+    generate.assert_awaited_once()
+
+
+def test_write_report_fails_when_stream_breaks_and_fallback_errors():
+    async def broken_stream(system_prompt, user_prompt):
+        yield "<h1>Rep"
+        raise StreamInterruptedError("<h1>Rep", RuntimeError("connection reset"))
+
+    async def on_delta(delta):
+        pass
+
+    with patch("app.agents.writer.llm_client.stream_text", side_effect=broken_stream), \
+            patch("app.agents.writer.llm_client.generate_text", new_callable=AsyncMock) as generate:
+        generate.return_value = "Error generating response: quota"
+        with pytest.raises(RuntimeError):
+            asyncio.run(writer.write_report("topic", ["insight"], on_delta=on_delta))